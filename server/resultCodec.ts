@@ -0,0 +1,149 @@
+// Decoder for the binary result frames written by server/services/resultCodec.py.
+// Layout (little-endian) comes from shared/resultSchema.json:
+//   frame:   magic(4) | type u8 | schema version u16 | payload length u32 | payload
+//   devices: row count u32 | per column: block length u32 | block
+import resultSchema from "@shared/resultSchema.json";
+
+type ColumnType = "str" | "json" | "strlist" | "u16list" | "f64" | "ts" | "i32" | "bool";
+
+export interface DeviceRecord {
+  ip_address: string;
+  mac_address: string | null;
+  hostname: string | null;
+  open_ports: number[];
+  scan_time: Date | null;
+  is_miner: boolean | null;
+  confidence_score: number | null;
+  device_type: string | null;
+  detection_methods: string[];
+  mining_software: string | null;
+  hash_rate: string | null;
+  power_consumption: number | null;
+  threat_level: string | null;
+  latitude: number | null;
+  longitude: number | null;
+  city: string | null;
+  // Remaining detection evidence, kept as the JSON text Python produced
+  details: string | null;
+}
+
+export interface ResultFrame {
+  type: number;
+  payload: Buffer;
+}
+
+export const FRAME_DEVICES = resultSchema.frames.devices;
+export const FRAME_RESULT = resultSchema.frames.result;
+
+const MAGIC = Buffer.from(resultSchema.magic, "ascii");
+const HEADER_SIZE = 11;
+const NULL_LENGTH = 0xffffffff;
+const NULL_I32 = -(2 ** 31);
+const NULL_BOOL = 255;
+const columns = resultSchema.columns as { name: keyof DeviceRecord; type: ColumnType }[];
+
+// Splits a byte stream into complete frames, however the chunks happen to be cut
+export class FrameReader {
+  private buffer = Buffer.alloc(0);
+
+  push(chunk: Buffer): ResultFrame[] {
+    this.buffer = this.buffer.length ? Buffer.concat([this.buffer, chunk]) : chunk;
+    const frames: ResultFrame[] = [];
+
+    while (this.buffer.length >= HEADER_SIZE) {
+      if (!this.buffer.subarray(0, 4).equals(MAGIC)) {
+        throw new Error("Corrupt result stream: bad frame magic");
+      }
+      const version = this.buffer.readUInt16LE(5);
+      if (version !== resultSchema.version) {
+        throw new Error(`Result schema version ${version} does not match ${resultSchema.version}`);
+      }
+      const end = HEADER_SIZE + this.buffer.readUInt32LE(7);
+      if (this.buffer.length < end) break;
+
+      frames.push({ type: this.buffer.readUInt8(4), payload: this.buffer.subarray(HEADER_SIZE, end) });
+      this.buffer = this.buffer.subarray(end);
+    }
+    return frames;
+  }
+
+  get pending(): number {
+    return this.buffer.length;
+  }
+}
+
+function readStrings(block: Buffer, count: number, offset = 0): (string | null)[] {
+  const values: (string | null)[] = new Array(count);
+  let pos = offset + 4 * count;
+  for (let i = 0; i < count; i++) {
+    const length = block.readUInt32LE(offset + 4 * i);
+    if (length === NULL_LENGTH) {
+      values[i] = null;
+    } else {
+      values[i] = block.toString("utf8", pos, pos + length);
+      pos += length;
+    }
+  }
+  return values;
+}
+
+function readColumn(type: ColumnType, block: Buffer, count: number): unknown[] {
+  switch (type) {
+    case "str":
+    case "json":
+      return readStrings(block, count);
+    case "strlist":
+    case "u16list": {
+      const counts = Array.from({ length: count }, (_, i) => block.readUInt16LE(2 * i));
+      const total = counts.reduce((sum, n) => sum + n, 0);
+      const flat = type === "strlist"
+        ? readStrings(block, total, 2 * count)
+        : Array.from({ length: total }, (_, i) => block.readUInt16LE(2 * count + 2 * i));
+      const values: unknown[] = new Array(count);
+      let pos = 0;
+      for (let i = 0; i < count; i++) {
+        values[i] = flat.slice(pos, pos + counts[i]);
+        pos += counts[i];
+      }
+      return values;
+    }
+    case "f64":
+    case "ts":
+      return Array.from({ length: count }, (_, i) => {
+        const value = block.readDoubleLE(8 * i);
+        if (Number.isNaN(value)) return null;
+        return type === "ts" ? new Date(value) : value;
+      });
+    case "i32":
+      return Array.from({ length: count }, (_, i) => {
+        const value = block.readInt32LE(4 * i);
+        return value === NULL_I32 ? null : value;
+      });
+    case "bool":
+      return Array.from({ length: count }, (_, i) => (block[i] === NULL_BOOL ? null : block[i] === 1));
+  }
+}
+
+export function decodeDevices(payload: Buffer): DeviceRecord[] {
+  const count = payload.readUInt32LE(0);
+  const decoded: Record<string, unknown[]> = {};
+  let pos = 4;
+  for (const column of columns) {
+    const length = payload.readUInt32LE(pos);
+    pos += 4;
+    decoded[column.name] = readColumn(column.type, payload.subarray(pos, pos + length), count);
+    pos += length;
+  }
+
+  const records: DeviceRecord[] = new Array(count);
+  for (let i = 0; i < count; i++) {
+    const record: Record<string, unknown> = {};
+    for (const column of columns) record[column.name] = decoded[column.name][i];
+    records[i] = record as unknown as DeviceRecord;
+  }
+  return records;
+}
+
+export function decodeResult(payload: Buffer): any {
+  return JSON.parse(payload.toString("utf8"));
+}
@@ -9,8 +9,11 @@ import {
   insertScanSessionSchema, 
   insertActivitySchema,
   insertRfSignalSchema,
-  insertNetworkTrafficSchema
+  insertNetworkTrafficSchema,
+  type InsertPlcAnalysis,
+  type InsertAcousticSignature
 } from "@shared/schema";
+import { FrameReader, FRAME_DEVICES, FRAME_RESULT, decodeDevices, decodeResult, type DeviceRecord } from "./resultCodec";
 import { spawn } from "child_process";
 import path from "path";
 import { scrypt, randomBytes } from "crypto";
@@ -18,6 +21,65 @@ import { promisify } from "util";
 
 const scryptAsync = promisify(scrypt);
 
+// Only the tail of a scanner's stderr is kept for error reports; long sweeps log continuously
+const MAX_ERROR_OUTPUT = 64 * 1024;
+
+function appendTail(buffer: string, text: string, limit = MAX_ERROR_OUTPUT): string {
+  const combined = buffer + text;
+  return combined.length > limit ? combined.slice(combined.length - limit) : combined;
+}
+
+const PACING_RATES = ['rate', 'burst', 'subnet_rate', 'subnet_burst'];
+
+// Whitelists a request's probe pacing envelope; throws on unknown keys or non-positive rates
+function parsePacing(pacing: any): Record<string, unknown> {
+  if (typeof pacing !== 'object' || pacing === null || Array.isArray(pacing)) {
+    throw new Error('pacing must be an object');
+  }
+  const positive = (value: unknown, name: string) => {
+    if (typeof value !== 'number' || !Number.isFinite(value) || value <= 0) {
+      throw new Error(`${name} must be a positive number`);
+    }
+    return value;
+  };
+  const parsed: Record<string, unknown> = {};
+  for (const [key, value] of Object.entries(pacing)) {
+    if (PACING_RATES.includes(key)) {
+      parsed[key] = positive(value, `pacing.${key}`);
+    } else if (key === 'adaptive') {
+      parsed.adaptive = Boolean(value);
+    } else if (key === 'loss_target') {
+      const target = positive(value, 'pacing.loss_target');
+      if (target >= 1) throw new Error('pacing.loss_target must be below 1');
+      parsed.loss_target = target;
+    } else if (key === 'upstreams') {
+      if (typeof value !== 'object' || value === null || Array.isArray(value)) {
+        throw new Error('pacing.upstreams must be an object');
+      }
+      const upstreams: Record<string, unknown> = {};
+      for (const [name, spec] of Object.entries(value as Record<string, any>)) {
+        const networks = spec?.networks;
+        if (!Array.isArray(networks) || networks.length === 0 || !networks.every((n) => typeof n === 'string')) {
+          throw new Error(`pacing.upstreams.${name}.networks must be a list of CIDRs or ranges`);
+        }
+        // Upstreams are routed per /24 (probePacing.py); narrower prefixes would split one
+        if (networks.some((n: string) => Number(n.split('/')[1] ?? 0) > 24)) {
+          throw new Error(`pacing.upstreams.${name}.networks must cover whole /24s`);
+        }
+        upstreams[name] = {
+          networks,
+          rate: positive(spec.rate, `pacing.upstreams.${name}.rate`),
+          ...(spec.burst !== undefined ? { burst: positive(spec.burst, `pacing.upstreams.${name}.burst`) } : {})
+        };
+      }
+      parsed.upstreams = upstreams;
+    } else {
+      throw new Error(`Unknown pacing option: ${key}`);
+    }
+  }
+  return parsed;
+}
+
 async function hashPassword(password: string) {
   const salt = randomBytes(16).toString("hex");
   const buf = (await scryptAsync(password, salt, 64)) as Buffer;
@@ -159,7 +221,14 @@ export async function registerRoutes(app: Express): Promise<Server> {
   // Start comprehensive scan
   app.post("/api/scan/comprehensive", async (req, res) => {
     try {
-      const { ipRange, ports, timeout } = req.body;
+      const { ipRange, ports, timeout, incremental, rotationRate, pacing } = req.body;
+
+      let pacingConfig: Record<string, unknown> | undefined;
+      try {
+        pacingConfig = pacing ? parsePacing(pacing) : undefined;
+      } catch (error) {
+        return res.status(400).json({ error: error instanceof Error ? error.message : 'Invalid pacing' });
+      }
       
       // Create scan session
       const session = await storage.createScanSession({
@@ -181,24 +250,100 @@ export async function registerRoutes(app: Express): Promise<Server> {
         stdio: ['pipe', 'pipe', 'pipe']
       });
 
-      // Send scan configuration to Python script
+      // Send scan configuration to Python script; devices come back as binary columnar frames
       const scanConfig = {
         ip_range: ipRange || '192.168.1.0/24',
         ports: Array.isArray(ports) ? ports : (ports ? ports.split(',').map((p: string) => parseInt(p.trim())) : [22, 80, 443, 4028, 8080, 9999]),
-        timeout: timeout || 3
+        timeout: timeout || 3,
+        incremental: Boolean(incremental),
+        rotation_rate: rotationRate ?? 0.1,
+        // An interrupted full sweep resumes from its checkpoint when the same scan is started again
+        checkpoint: 'scan_checkpoint.db',
+        // Confirmed miners are registered here for `telemetryPoller.py run` (same default --db),
+        // and measured power from it feeds back into later scans' estimates
+        telemetry_db: 'miner_telemetry.db',
+        // Optional probe pacing envelope: { rate, subnet_rate, upstreams: { name: { networks, rate } } }
+        ...(pacingConfig ? { pacing: pacingConfig } : {}),
+        emit_batches: 500,
+        output: 'binary'
       };
 
       pythonProcess.stdin.write(JSON.stringify(scanConfig));
       pythonProcess.stdin.end();
 
-      let output = '';
+      const frames = new FrameReader();
+      let stderrBuffered = '';
+      let results: any = null;
       let errorOutput = '';
+      let minersStored = 0;
+      // Batches are ingested one after another, overlapping with the rest of the scan
+      let ingestion: Promise<void> = Promise.resolve();
+      // First ingestion failure; the scan is stopped and the session marked failed
+      let ingestError: unknown = null;
+
+      const ingestDevices = async (devices: DeviceRecord[]) => {
+        const batch = devices
+          .filter((device) => device.is_miner)
+          .map((device) => ({
+            miner: {
+              ipAddress: device.ip_address,
+              macAddress: device.mac_address,
+              hostname: device.hostname,
+              latitude: device.latitude,
+              longitude: device.longitude,
+              city: device.city,
+              detectionMethod: device.detection_methods.join(','),
+              powerConsumption: device.power_consumption,
+              hashRate: device.hash_rate,
+              deviceType: device.device_type || 'unknown',
+              processName: device.mining_software,
+              confidenceScore: device.confidence_score ?? 0,
+              threatLevel: device.threat_level || 'medium',
+              notes: device.details
+            },
+            openPorts: device.open_ports
+          }));
+        if (batch.length === 0) return;
+
+        const miners = await storage.ingestScanResults(batch);
+        minersStored += miners.length;
+
+        // One frame per batch instead of one per miner
+        broadcast({
+          type: 'miners_detected',
+          data: { sessionId: session.id, miners }
+        });
+      };
 
-      pythonProcess.stdout.on('data', (data) => {
-        output += data.toString();
-        
-        // Try to parse progress updates
-        const lines = data.toString().split('\n');
+      pythonProcess.stdout.on('data', (data: Buffer) => {
+        try {
+          for (const frame of frames.push(data)) {
+            if (frame.type === FRAME_DEVICES) {
+              const devices = decodeDevices(frame.payload);
+              // Every link is handled, so a DB error cannot surface as an unhandled rejection
+              ingestion = ingestion
+                .then(() => (ingestError ? undefined : ingestDevices(devices)))
+                .catch((error) => {
+                  ingestError = error;
+                  pythonProcess.kill();
+                });
+            } else if (frame.type === FRAME_RESULT) {
+              results = decodeResult(frame.payload);
+            }
+          }
+        } catch (error) {
+          errorOutput = appendTail(errorOutput, `${error}\n`);
+          pythonProcess.kill();
+        }
+      });
+
+      // Logging goes to stderr, so progress lines are picked up there
+      pythonProcess.stderr.on('data', (data) => {
+        const text = data.toString();
+        errorOutput = appendTail(errorOutput, text);
+        stderrBuffered += text;
+        const lines = stderrBuffered.split('\n');
+        stderrBuffered = lines.pop() ?? '';
         for (const line of lines) {
           if (line.includes('Progress:')) {
             broadcast({
@@ -209,59 +354,14 @@ export async function registerRoutes(app: Express): Promise<Server> {
         }
       });
 
-      pythonProcess.stderr.on('data', (data) => {
-        errorOutput += data.toString();
-      });
-
       pythonProcess.on('close', async (code) => {
         try {
-          if (code === 0 && output) {
-            const results = JSON.parse(output);
-            
-            // Process detected devices
-            for (const device of results.detected_devices || []) {
-              if (device.detection_results?.is_miner) {
-                // Store confirmed miner
-                const minerData = {
-                  ipAddress: device.ip_address,
-                  macAddress: device.mac_address || null,
-                  hostname: device.hostname || null,
-                  latitude: device.geolocation?.['ip-api']?.lat || device.geolocation?.['ipapi']?.lat || null,
-                  longitude: device.geolocation?.['ip-api']?.lon || device.geolocation?.['ipapi']?.lon || null,
-                  city: device.geolocation?.['ip-api']?.city || device.geolocation?.['ipapi']?.city || null,
-                  detectionMethod: device.detection_results.detection_methods.join(','),
-                  powerConsumption: device.detection_results.power_consumption || null,
-                  hashRate: device.detection_results.hash_rate || null,
-                  deviceType: device.detection_results.device_type || 'unknown',
-                  processName: device.detection_results.mining_software || null,
-                  confidenceScore: device.detection_results.confidence_score || 0,
-                  threatLevel: device.threat_level || 'medium',
-                  notes: JSON.stringify(device.detection_results)
-                };
-
-                const miner = await storage.createMiner(minerData);
-
-                // Store network connections
-                for (const port of device.open_ports || []) {
-                  await storage.createConnection({
-                    localAddress: device.ip_address,
-                    localPort: port,
-                    remoteAddress: null,
-                    remotePort: null,
-                    protocol: 'tcp',
-                    status: 'open',
-                    processName: null,
-                    minerId: miner.id
-                  });
-                }
-
-                broadcast({
-                  type: 'miner_detected',
-                  data: miner
-                });
-              }
-            }
+          await ingestion;
+          if (ingestError) {
+            throw ingestError;
+          }
 
+          if (code === 0 && results) {
             // Update scan session
             await storage.updateScanSession(session.id, {
               status: 'completed',
@@ -272,7 +372,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
             broadcast({
               type: 'scan_completed',
-              data: { sessionId: session.id, results }
+              data: { sessionId: session.id, results, minersStored }
             });
 
             res.json({ sessionId: session.id, results });
@@ -332,12 +432,13 @@ config = ${JSON.stringify({ network: network || '192.168.1.0/24' })}
 scan_id = start_network_scan(config)
 print(f"Started scan: {scan_id}")
 
-# Wait for completion
+# Wait for completion; polls read the status only, not the stored host rows
 for i in range(60):  # Wait up to 60 seconds
     time.sleep(1)
-    results = get_scan_results(scan_id)
+    results = get_scan_results(scan_id, limit=0)
     if results.get('status') in ['completed', 'failed']:
-        print(json.dumps(results))
+        # First page of hosts; result_count has the total
+        print(json.dumps(get_scan_results(scan_id, limit=1000)))
         break
 `]);
 
@@ -355,7 +456,7 @@ for i in range(60):  # Wait up to 60 seconds
           await storage.updateScanSession(session.id, {
             status: results.status || 'completed',
             endTime: new Date(),
-            devicesFound: results.results?.length || 0
+            devicesFound: results.result_count ?? results.results?.length ?? 0
           });
 
           broadcast({
@@ -375,6 +476,36 @@ for i in range(60):  # Wait up to 60 seconds
     }
   });
 
+  // Receive change events from host agents (server/services/hostAgent.py --upstream)
+  app.post("/api/agent/events", async (req, res) => {
+    try {
+      const events: any[] = Array.isArray(req.body?.events) ? req.body.events : [];
+      if (events.length === 0) {
+        return res.status(400).json({ error: "No agent events" });
+      }
+
+      broadcast({
+        type: 'agent_events',
+        data: events
+      });
+
+      for (const event of events) {
+        if (event.type === 'process' && event.event === 'flagged') {
+          await storage.createActivity({
+            activityType: 'host_agent_detection',
+            description: `Suspicious process ${event.name} (PID ${event.pid}) on ${event.host}`,
+            severity: event.suspicion_score >= 50 ? 'high' : 'medium',
+            metadata: JSON.stringify(event)
+          });
+        }
+      }
+
+      res.status(202).json({ received: events.length });
+    } catch (error) {
+      res.status(400).json({ error: "Invalid agent events" });
+    }
+  });
+
   // Get recent activities
   app.get("/api/activities", async (req, res) => {
     try {
@@ -552,6 +683,138 @@ print(json.dumps(result, ensure_ascii=False))
     }
   });
 
+  // Power-line harmonic analysis of a recorded voltage/current capture
+  app.post("/api/plc-analysis", async (req, res) => {
+    try {
+      const { capture, sampleRate, mains, interval, location } = req.body;
+      if (!capture) {
+        return res.status(400).json({ error: "Capture file is required" });
+      }
+
+      const pythonScript = path.join(process.cwd(), "server", "services", "plcAnalyzer.py");
+      // Options use the --name=value form and the capture path follows "--", so request
+      // values are never parsed as options of their own
+      const args = [pythonScript, `--mains=${mains || 50}`, `--interval=${interval || 60}`];
+      if (sampleRate) args.push(`--sample-rate=${sampleRate}`);
+      if (location) args.push(`--location=${location}`);
+      args.push("--", String(capture));
+      const pythonProcess = spawn("python3", args);
+
+      let stdout = "";
+      let stderr = "";
+
+      pythonProcess.stdout.on("data", (data) => {
+        stdout += data.toString();
+      });
+
+      pythonProcess.stderr.on("data", (data) => {
+        stderr += data.toString();
+      });
+
+      pythonProcess.on("close", async (code) => {
+        if (code !== 0) {
+          return res.status(500).json({ error: "PLC analysis failed", stderr: stderr, code: code });
+        }
+        try {
+          const rows: InsertPlcAnalysis[] = [];
+          for (const line of stdout.split("\n")) {
+            if (!line.trim()) continue;
+            const summary = JSON.parse(line);
+            if (summary.power_line_freq === null) continue;
+            rows.push({
+              powerLineFreq: summary.power_line_freq,
+              harmonicDistortion: summary.harmonic_distortion,
+              powerQuality: summary.power_quality,
+              voltageFluctuation: summary.voltage_fluctuation,
+              currentSpikes: summary.current_spikes,
+              powerFactor: summary.power_factor,
+              location: summary.location,
+              minerIndicators: summary.miner_indicators
+            });
+          }
+          const analyses = await storage.createPlcAnalyses(rows);
+
+          broadcast({
+            type: 'plc_analysis_completed',
+            data: analyses
+          });
+
+          res.json(analyses);
+        } catch (parseError) {
+          res.status(500).json({ error: "Failed to parse PLC analysis result", stderr: stderr });
+        }
+      });
+
+    } catch (error) {
+      res.status(500).json({ error: "Failed to start PLC analysis" });
+    }
+  });
+
+  // Acoustic fan-signature analysis of WAV field recordings
+  app.post("/api/acoustic-analysis", async (req, res) => {
+    try {
+      const { recordings, segment, location } = req.body;
+      if (!Array.isArray(recordings) || recordings.length === 0) {
+        return res.status(400).json({ error: "Recordings are required" });
+      }
+
+      const pythonScript = path.join(process.cwd(), "server", "services", "acousticAnalyzer.py");
+      // Recordings follow "--" so a path such as "--save" is never taken for an option
+      const args = [pythonScript, "analyze", `--segment=${segment ?? 10}`];
+      if (location) args.push(`--location=${location}`);
+      args.push("--", ...recordings.map(String));
+      const pythonProcess = spawn("python3", args);
+
+      let stdout = "";
+      let stderr = "";
+
+      pythonProcess.stdout.on("data", (data) => {
+        stdout += data.toString();
+      });
+
+      pythonProcess.stderr.on("data", (data) => {
+        stderr += data.toString();
+      });
+
+      pythonProcess.on("close", async (code) => {
+        if (code !== 0) {
+          return res.status(500).json({ error: "Acoustic analysis failed", stderr: stderr, code: code });
+        }
+        try {
+          const rows: InsertAcousticSignature[] = [];
+          for (const line of stdout.split("\n")) {
+            if (!line.trim()) continue;
+            const result = JSON.parse(line);
+            rows.push({
+              fanSpeedRpm: result.fan_speed_rpm,
+              acousticFingerprint: result.acoustic_fingerprint,
+              frequencySpectrum: result.frequency_spectrum,
+              noiseLevel: result.noise_level,
+              fanNoisePattern: result.fan_noise_pattern,
+              coolingSystemType: result.cooling_system_type,
+              deviceModel: result.device_model,
+              location: result.location,
+              matchConfidence: result.match_confidence
+            });
+          }
+          const signatures = await storage.createAcousticSignatures(rows);
+
+          broadcast({
+            type: 'acoustic_analysis_completed',
+            data: signatures
+          });
+
+          res.json(signatures);
+        } catch (parseError) {
+          res.status(500).json({ error: "Failed to parse acoustic analysis result", stderr: stderr });
+        }
+      });
+
+    } catch (error) {
+      res.status(500).json({ error: "Failed to start acoustic analysis" });
+    }
+  });
+
   // Get RF scan status
   app.get("/api/rf-status", async (req, res) => {
     try {
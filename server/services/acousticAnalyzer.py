@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Acoustic fan-signature analysis
+
+Offline analysis of field recordings for the acoustic_signatures table.
+WAV files are streamed in blocks into a Welch PSD (Hann frames, 50%
+overlap, batched rfft). The fan blade-pass frequency is found by harmonic
+summation over tonal prominence, which gives fan RPM. A compact log-band
+fingerprint of each segment is matched against a library of enrolled
+reference recordings through a cosine nearest-neighbour index.
+"""
+
+import base64
+import json
+import logging
+import os
+import time
+import wave
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from signatureDb import AcousticSignatureDb, SignatureDatabase, signature_db
+from sqlitePool import SqliteDatabase
+
+logger = logging.getLogger(__name__)
+
+# Harmonics of the blade-pass frequency summed when scoring candidates
+BPF_HARMONICS = 4
+# Half-width of the running noise floor under the spectrum, in Hz
+FLOOR_HALF_WIDTH_HZ = 25.0
+
+def iter_wav_blocks(path: str, block_frames: int) -> Iterator[Tuple[float, np.ndarray]]:
+    """(sample rate, mono float samples in [-1, 1]) blocks of at most block_frames"""
+    with wave.open(path, 'rb') as wav:
+        rate = float(wav.getframerate())
+        width, channels = wav.getsampwidth(), wav.getnchannels()
+        if width not in (1, 2, 4):
+            raise ValueError(f"{path}: unsupported {8 * width}-bit samples")
+        dtype = {1: np.uint8, 2: '<i2', 4: '<i4'}[width]
+        full_scale = float(2 ** (8 * width - 1))
+        while True:
+            raw = wav.readframes(block_frames)
+            if not raw:
+                break
+            samples = np.frombuffer(raw, dtype=dtype).reshape(-1, channels).astype(np.float64)
+            if width == 1:
+                samples -= 128.0
+            yield rate, samples.mean(axis=1) / full_scale
+
+class WelchPsd:
+    """Running Welch PSD over samples fed in arbitrary blocks"""
+
+    def __init__(self, sample_rate: float, nperseg: Optional[int] = None):
+        self.sample_rate = sample_rate
+        # About 1 Hz resolution: enough to separate blade-pass tones of fans a few RPM apart
+        self.nperseg = nperseg or 1 << int(np.ceil(np.log2(sample_rate)))
+        self.hop = self.nperseg // 2
+        self.window = np.hanning(self.nperseg)
+        self.scale = 1.0 / (sample_rate * (self.window ** 2).sum())
+        self.frequencies = np.fft.rfftfreq(self.nperseg, 1.0 / sample_rate)
+        self.reset()
+
+    def reset(self):
+        self._pending = np.empty(0)
+        self._sum = np.zeros(len(self.frequencies))
+        self._frames = 0
+        self._energy = 0.0
+        self._samples = 0
+
+    def feed(self, samples: np.ndarray):
+        self._energy += float(np.dot(samples, samples))
+        self._samples += len(samples)
+        data = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+        count = (len(data) - self.nperseg) // self.hop + 1 if len(data) >= self.nperseg else 0
+        if count:
+            frames = np.lib.stride_tricks.sliding_window_view(data, self.nperseg)[::self.hop][:count]
+            spectrum = np.fft.rfft((frames - frames.mean(axis=1, keepdims=True)) * self.window, axis=1)
+            self._sum += (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=0)
+            self._frames += count
+        self._pending = data[count * self.hop:].copy() if count else data.copy()
+
+    @property
+    def frames(self) -> int:
+        return self._frames
+
+    @property
+    def duration(self) -> float:
+        return self._samples / self.sample_rate
+
+    def psd(self) -> np.ndarray:
+        """One-sided power spectral density, units^2 / Hz"""
+        psd = self._sum * self.scale / max(self._frames, 1)
+        psd[1:-1] *= 2.0
+        return psd
+
+    def level_db(self) -> Optional[float]:
+        """RMS level in dB relative to full scale"""
+        if not self._samples or not self._energy:
+            return None
+        return 10.0 * np.log10(self._energy / self._samples)
+
+def _running_mean(x: np.ndarray, half_width: int) -> np.ndarray:
+    padded = np.pad(x, half_width, mode='edge')
+    sums = np.cumsum(np.concatenate(([0.0], padded)))
+    return (sums[2 * half_width + 1:] - sums[:-2 * half_width - 1]) / (2 * half_width + 1)
+
+def blade_pass(frequencies: np.ndarray, psd: np.ndarray,
+               signatures: AcousticSignatureDb) -> Tuple[Optional[float], float]:
+    """(blade-pass frequency, tonal prominence in dB) by harmonic summation; frequency None if not tonal"""
+    df = frequencies[1]
+    psd_db = 10.0 * np.log10(np.maximum(psd, 1e-30))
+    prominence = np.maximum(psd_db - _running_mean(psd_db, max(2, int(FLOOR_HALF_WIDTH_HZ / df))), 0.0)
+
+    low, high = signatures.blade_pass_range
+    candidates = np.arange(max(1, int(low / df)), min(int(high / df) + 1, (len(psd) - 1) // BPF_HARMONICS))
+    if not len(candidates):
+        return None, 0.0
+    # Each harmonic contributes its best bin within +-1 to tolerate rounding of k * f0
+    local_max = np.maximum(np.maximum(prominence[:-2], prominence[1:-1]), prominence[2:])
+    local_max = np.concatenate(([prominence[0]], local_max, [prominence[-1]]))
+    score = sum(local_max[candidates * k] for k in range(1, BPF_HARMONICS + 1))
+    best = int(candidates[np.argmax(score)])
+    # The fundamental itself must stand out, not only its harmonics
+    peak = best - 1 + int(np.argmax(prominence[best - 1:best + 2]))
+    if prominence[peak] < signatures.min_tonal_prominence:
+        return None, float(prominence[peak])
+
+    # Parabolic interpolation of the log spectrum around the peak bin
+    a, b, c = psd_db[peak - 1:peak + 2]
+    denom = a - 2 * b + c
+    offset = 0.5 * (a - c) / denom if denom < 0 else 0.0
+    return float((peak + offset) * df), float(prominence[peak])
+
+def fingerprint(frequencies: np.ndarray, psd: np.ndarray, signatures: AcousticSignatureDb) -> np.ndarray:
+    """Level-independent unit vector of log-spaced band levels"""
+    edges = np.geomspace(signatures.min_frequency, signatures.max_frequency, signatures.fingerprint_bands + 1)
+    band = np.searchsorted(edges, frequencies, side='right') - 1
+    inside = (band >= 0) & (band < signatures.fingerprint_bands)
+    energy = np.bincount(band[inside], psd[inside], signatures.fingerprint_bands)
+    levels = 10.0 * np.log10(np.maximum(energy, 1e-30))
+    levels -= levels.mean()
+    norm = np.linalg.norm(levels)
+    return (levels / norm if norm > 0 else levels).astype(np.float32)
+
+def encode_fingerprint(vector: np.ndarray) -> str:
+    """Compact text form: int8-quantized components, base64"""
+    return base64.b64encode(np.clip(np.round(vector * 127 / max(np.abs(vector).max(), 1e-9)), -127, 127)
+                            .astype(np.int8).tobytes()).decode('ascii')
+
+def decode_fingerprint(text: str) -> np.ndarray:
+    vector = np.frombuffer(base64.b64decode(text), dtype=np.int8).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+class FingerprintIndex:
+    """Exact cosine nearest-neighbour search over unit fingerprints with one matrix product per batch"""
+
+    def __init__(self, vectors: np.ndarray, labels: List[Dict[str, Any]]):
+        self.vectors = np.asarray(vectors, dtype=np.float32).reshape(len(labels), -1) if labels else None
+        self.labels = labels
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def query(self, vectors: np.ndarray, k: int = 3) -> List[List[Tuple[float, Dict[str, Any]]]]:
+        """Top-k (similarity, label) per query row, best first"""
+        queries = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if not len(self):
+            return [[] for _ in range(len(queries))]
+        similarity = queries @ self.vectors.T
+        k = min(k, len(self))
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(similarity, top, axis=1), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return [[(float(similarity[row, j]), self.labels[j]) for j in top[row]] for row in range(len(queries))]
+
+class AcousticLibrary:
+    """Reference fingerprints and analysis results in SQLite"""
+
+    def __init__(self, db_path: str = "acoustic_analysis.db"):
+        self.db = SqliteDatabase(db_path)
+        self._index: Optional[FingerprintIndex] = None
+        self.init_database()
+
+    def init_database(self):
+        """Initialize SQLite tables for reference fingerprints and acoustic signatures"""
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS acoustic_references (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                device_model TEXT NOT NULL,
+                cooling_system_type TEXT,
+                fan_speed_rpm INTEGER,
+                fingerprint BLOB NOT NULL,
+                source TEXT,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS acoustic_signatures (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fan_speed_rpm INTEGER,
+                acoustic_fingerprint TEXT,
+                frequency_spectrum TEXT,
+                noise_level REAL,
+                fan_noise_pattern TEXT,
+                cooling_system_type TEXT,
+                device_model TEXT,
+                location TEXT,
+                recording_time TEXT NOT NULL,
+                match_confidence REAL
+            )
+        ''')
+
+    def enroll(self, device_model: str, vector: np.ndarray, cooling_system_type: Optional[str] = None,
+               fan_speed_rpm: Optional[int] = None, source: Optional[str] = None):
+        self.db.execute('''
+            INSERT INTO acoustic_references
+            (device_model, cooling_system_type, fan_speed_rpm, fingerprint, source, created_at)
+            VALUES (?, ?, ?, ?, ?, datetime('now', 'localtime'))
+        ''', (device_model, cooling_system_type, fan_speed_rpm, np.asarray(vector, np.float32).tobytes(), source))
+        self._index = None
+
+    def index(self) -> FingerprintIndex:
+        if self._index is None:
+            rows = self.db.query_all('SELECT device_model, cooling_system_type, fingerprint FROM acoustic_references')
+            vectors = np.array([np.frombuffer(r[2], dtype=np.float32) for r in rows], dtype=np.float32)
+            self._index = FingerprintIndex(vectors, [{'device_model': r[0], 'cooling_system_type': r[1]}
+                                                     for r in rows])
+        return self._index
+
+    def list_references(self) -> List[Dict[str, Any]]:
+        rows = self.db.query_all('''
+            SELECT device_model, cooling_system_type, COUNT(*), AVG(fan_speed_rpm)
+            FROM acoustic_references GROUP BY device_model, cooling_system_type
+        ''')
+        return [{'device_model': r[0], 'cooling_system_type': r[1], 'references': r[2],
+                 'fan_speed_rpm': round(r[3]) if r[3] else None} for r in rows]
+
+    def save(self, results: List[Dict[str, Any]]) -> int:
+        rows = [(r['fan_speed_rpm'], r['acoustic_fingerprint'], json.dumps(r['frequency_spectrum']), r['noise_level'],
+                 r['fan_noise_pattern'], r['cooling_system_type'], r['device_model'], r['location'],
+                 r['recording_time'], r['match_confidence']) for r in results]
+        self.db.executemany('''
+            INSERT INTO acoustic_signatures
+            (fan_speed_rpm, acoustic_fingerprint, frequency_spectrum, noise_level, fan_noise_pattern,
+             cooling_system_type, device_model, location, recording_time, match_confidence)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        return len(rows)
+
+class AcousticAnalyzer:
+    def __init__(self, library: Optional[AcousticLibrary] = None, signatures: Optional[SignatureDatabase] = None,
+                 calibration_db: float = 0.0):
+        self.library = library
+        self.signatures = signatures or signature_db
+        # Offset from dBFS to the recorder's dB SPL, if it has been calibrated
+        self.calibration_db = calibration_db
+
+    def iter_segments(self, path: str, segment: Optional[float] = 10.0) -> Iterator[Dict[str, Any]]:
+        """Spectral features for each `segment` seconds of a recording (the whole file if segment is None)"""
+        signatures = self.signatures.current().acoustic
+        with wave.open(path, 'rb') as wav:
+            rate = float(wav.getframerate())
+        welch = WelchPsd(rate)
+        # Blocks are whole segments, so each block closes one result
+        block = int(round(segment * rate)) if segment else 1 << 20
+        start = 0.0
+        for _, samples in iter_wav_blocks(path, block):
+            welch.feed(samples)
+            if segment and welch.frames:
+                yield self._features(welch, start, signatures)
+                start += welch.duration
+                welch.reset()
+        if welch.frames:
+            yield self._features(welch, start, signatures)
+
+    def _features(self, welch: WelchPsd, start: float, signatures: AcousticSignatureDb) -> Dict[str, Any]:
+        frequencies, psd = welch.frequencies, welch.psd()
+        bpf, prominence = blade_pass(frequencies, psd, signatures)
+        level = welch.level_db()
+        return {
+            'start_s': round(start, 3),
+            'duration_s': round(welch.duration, 3),
+            'blade_pass_hz': round(bpf, 2) if bpf else None,
+            'tonal_prominence_db': round(prominence, 1),
+            'noise_level': round(level + self.calibration_db, 1) if level is not None else None,
+            'vector': fingerprint(frequencies, psd, signatures)
+        }
+
+    def analyze(self, path: str, segment: Optional[float] = 10.0, location: Optional[str] = None,
+                recording_time: Optional[float] = None) -> List[Dict[str, Any]]:
+        """acoustic_signatures rows for every segment, matched against the reference library in one batch"""
+        signatures = self.signatures.current().acoustic
+        segments = list(self.iter_segments(path, segment))
+        if not segments:
+            return []
+        index = self.library.index() if self.library else FingerprintIndex(np.empty(0), [])
+        matches = index.query(np.stack([s['vector'] for s in segments]), k=3)
+        recording_time = recording_time if recording_time is not None else time.time()
+
+        results = []
+        for features, neighbours in zip(segments, matches):
+            model, cooling, confidence = None, None, 0.0
+            if neighbours and neighbours[0][0] >= signatures.match_threshold:
+                similarity, label = neighbours[0]
+                model, cooling = label['device_model'], label['cooling_system_type']
+                # Share of the top neighbours agreeing on the model tempers a lone close match
+                agreement = sum(1 for _, l in neighbours if l['device_model'] == model) / len(neighbours)
+                confidence = similarity * (0.5 + 0.5 * agreement)
+
+            bpf = features['blade_pass_hz']
+            rpm = int(round(bpf * 60.0 / signatures.blades(model))) if bpf else None
+            if model and rpm and model in signatures.models and not signatures.rpm_plausible(model, rpm):
+                confidence *= 0.5
+            if model and not cooling:
+                cooling = signatures.models.get(model, {}).get('cooling')
+
+            prominence = features['tonal_prominence_db']
+            pattern = 'tonal' if bpf and prominence >= 2 * signatures.min_tonal_prominence else \
+                      'weak_tonal' if bpf else 'broadband'
+            results.append({
+                'fan_speed_rpm': rpm,
+                'acoustic_fingerprint': encode_fingerprint(features['vector']),
+                'frequency_spectrum': {
+                    'start_s': features['start_s'],
+                    'duration_s': features['duration_s'],
+                    'blade_pass_hz': bpf,
+                    'tonal_prominence_db': prominence,
+                    'band_edges_hz': [signatures.min_frequency, signatures.max_frequency],
+                    'bands': [round(float(x), 3) for x in features['vector']],
+                    'neighbours': [{'device_model': l['device_model'], 'similarity': round(s, 4)}
+                                   for s, l in neighbours]
+                },
+                'noise_level': features['noise_level'],
+                'fan_noise_pattern': pattern,
+                'cooling_system_type': cooling,
+                'device_model': model,
+                'location': location,
+                'recording_time': time.strftime('%Y-%m-%d %H:%M:%S',
+                                                time.localtime(recording_time + features['start_s'])),
+                'match_confidence': round(confidence, 4)
+            })
+        return results
+
+    def reference_vector(self, path: str) -> Tuple[np.ndarray, Optional[float]]:
+        """Whole-recording fingerprint and blade-pass frequency for enrolling a reference"""
+        features = next(self.iter_segments(path, None), None)
+        if features is None:
+            raise ValueError(f"{path}: recording is too short to fingerprint")
+        return features['vector'], features['blade_pass_hz']
+
+def _analyze_one(task: Tuple[str, Optional[float], Optional[str], str, float]) -> List[Dict[str, Any]]:
+    path, segment, location, db_path, calibration = task
+    analyzer = AcousticAnalyzer(AcousticLibrary(db_path), calibration_db=calibration)
+    return analyzer.analyze(path, segment, location, os.path.getmtime(path))
+
+def main():
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+
+    parser = argparse.ArgumentParser(description="Acoustic fan-signature analysis of WAV recordings")
+    sub = parser.add_subparsers(dest='command', required=True)
+    analyze_parser = sub.add_parser('analyze', help="Analyse recordings; prints one JSON line per segment")
+    analyze_parser.add_argument('recordings', nargs='+')
+    analyze_parser.add_argument('--segment', type=float, default=10.0, help="Seconds per result (0 = whole file)")
+    analyze_parser.add_argument('--location')
+    analyze_parser.add_argument('--calibration', type=float, default=0.0, help="dB to add to dBFS levels")
+    analyze_parser.add_argument('--workers', type=int, default=1)
+    analyze_parser.add_argument('--save', action='store_true', help="Store results in the database")
+    enroll_parser = sub.add_parser('enroll', help="Add reference recordings of a known device")
+    enroll_parser.add_argument('recordings', nargs='+')
+    enroll_parser.add_argument('--model', required=True)
+    enroll_parser.add_argument('--cooling')
+    sub.add_parser('library', help="List enrolled references")
+    parser.add_argument('--db', default='acoustic_analysis.db')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    library = AcousticLibrary(args.db)
+
+    if args.command == 'library':
+        print(json.dumps(library.list_references(), indent=2))
+    elif args.command == 'enroll':
+        analyzer = AcousticAnalyzer(library)
+        signatures = analyzer.signatures.current().acoustic
+        for path in args.recordings:
+            vector, bpf = analyzer.reference_vector(path)
+            rpm = int(round(bpf * 60.0 / signatures.blades(args.model))) if bpf else None
+            library.enroll(args.model, vector, args.cooling or signatures.models.get(args.model, {}).get('cooling'),
+                           rpm, path)
+            logger.info(f"Enrolled {path} as {args.model} (blade pass {bpf} Hz, {rpm} RPM)")
+    else:
+        started = time.monotonic()
+        tasks = [(path, args.segment or None, args.location, args.db, args.calibration) for path in args.recordings]
+        results = []
+        if args.workers > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                batches = executor.map(_analyze_one, tasks)
+                for batch in batches:
+                    results.extend(batch)
+        else:
+            for task in tasks:
+                results.extend(_analyze_one(task))
+        for result in results:
+            print(json.dumps(result, ensure_ascii=False))
+        if args.save:
+            library.save(results)
+        recorded = sum(r['frequency_spectrum']['duration_s'] for r in results)
+        elapsed = time.monotonic() - started
+        logger.info(f"Analysed {recorded:.0f} s of audio in {elapsed:.1f} s "
+                    f"({recorded / max(elapsed, 1e-9):.0f}x real time)")
+
+if __name__ == "__main__":
+    main()
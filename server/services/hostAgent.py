@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lightweight /proc host agent
+
+Long-running local detector for Linux workstations. At a fixed cadence it
+reads /proc/[pid]/stat and /proc/net/tcp{,6} directly (no psutil table
+walks), keeps ring buffers of per-process CPU and of sockets to mining
+ports, and reports only what changed since the previous tick: processes
+flagged, cleared or exited and mining sockets opened or closed. Command
+lines and socket owners are resolved only for new entries.
+"""
+
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from signatureDb import CompiledSignatures, SignatureDatabase, signature_db
+
+logger = logging.getLogger(__name__)
+
+PROC = '/proc'
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+TCP_ESTABLISHED = '01'
+HIGH_CPU_PERCENT = 80.0
+MIN_SCORE = 10
+
+def read_proc_stat(pid: str) -> Optional[Tuple[str, int, int, int, int]]:
+    """(comm, ppid, cpu ticks, start time, rss bytes) from /proc/[pid]/stat"""
+    try:
+        with open(f'{PROC}/{pid}/stat', 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # comm may itself contain spaces or parentheses; it ends at the last ')'
+    close = data.rfind(b')')
+    comm = data[data.find(b'(') + 1:close].decode('utf-8', errors='replace')
+    fields = data[close + 2:].split()
+    return comm, int(fields[1]), int(fields[11]) + int(fields[12]), int(fields[19]), int(fields[21]) * PAGE_SIZE
+
+def read_cmdline(pid: str) -> str:
+    try:
+        with open(f'{PROC}/{pid}/cmdline', 'rb') as f:
+            return f.read().replace(b'\0', b' ').decode('utf-8', errors='replace').strip().lower()
+    except OSError:
+        return ''
+
+def _decode_address(hex_address: str) -> Tuple[str, int]:
+    address, port = hex_address.split(':')
+    raw = bytes.fromhex(address)
+    if len(raw) == 4:
+        return socket.inet_ntop(socket.AF_INET, struct.pack('<I', struct.unpack('>I', raw)[0])), int(port, 16)
+    # IPv6 is four host-order 32-bit words
+    words = struct.unpack('<4I', raw)
+    return socket.inet_ntop(socket.AF_INET6, struct.pack('>4I', *words)), int(port, 16)
+
+def iter_tcp_sockets(ports: frozenset) -> Iterator[Tuple[int, str, int, int, int]]:
+    """(inode, remote ip, remote port, tx queue, rx queue) of established sockets to the given ports"""
+    for table in ('tcp', 'tcp6'):
+        try:
+            with open(f'{PROC}/net/{table}') as f:
+                next(f)
+                for line in f:
+                    parts = line.split()
+                    if parts[3] != TCP_ESTABLISHED:
+                        continue
+                    # Remote port is the last four hex digits; skip the address decode for other ports
+                    if int(parts[2][-4:], 16) not in ports:
+                        continue
+                    ip, port = _decode_address(parts[2])
+                    tx, rx = parts[4].split(':')
+                    yield int(parts[9]), ip, port, int(tx, 16), int(rx, 16)
+        except OSError:
+            continue
+
+def socket_owners(inodes: set, pids: List[str]) -> Dict[int, str]:
+    """PID owning each socket inode, by scanning only the given processes' fd tables"""
+    owners = {}
+    wanted = {f'socket:[{inode}]': inode for inode in inodes}
+    for pid in pids:
+        try:
+            fds = os.scandir(f'{PROC}/{pid}/fd')
+        except OSError:
+            continue
+        with fds:
+            for fd in fds:
+                try:
+                    inode = wanted.get(os.readlink(fd.path))
+                except OSError:
+                    continue
+                if inode is not None:
+                    owners[inode] = pid
+                    if len(owners) == len(wanted):
+                        return owners
+    return owners
+
+class ProcessTrack:
+    __slots__ = ('start', 'name', 'ppid', 'cmdline', 'ticks', 'rss', 'cpu', 'static_score', 'static_reasons',
+                 'signature_version', 'flagged')
+
+    def __init__(self, start: int, window: int):
+        self.start = start
+        self.name = ''
+        self.ppid = 0
+        self.cmdline = ''
+        self.ticks = None
+        self.rss = 0
+        self.cpu: Deque[float] = deque(maxlen=window)
+        self.static_score = 0
+        self.static_reasons: List[str] = []
+        self.signature_version = None
+        self.flagged: Optional[Tuple[int, Tuple[str, ...]]] = None
+
+class SocketTrack:
+    __slots__ = ('remote', 'pid', 'first_seen', 'activity')
+
+    def __init__(self, remote: str, pid: Optional[str], now: float, window: int):
+        self.remote = remote
+        self.pid = pid
+        self.first_seen = now
+        # (timestamp, tx queue, rx queue) samples
+        self.activity: Deque[Tuple[float, int, int]] = deque(maxlen=window)
+
+class HostAgent:
+    def __init__(self, signatures: Optional[SignatureDatabase] = None, interval: float = 5.0, window: int = 12,
+                 heartbeat_every: int = 60, emit: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        if not os.path.isdir(f'{PROC}/self'):
+            raise RuntimeError("hostAgent needs a Linux /proc filesystem")
+        self.signatures = signatures or signature_db
+        self.interval = interval
+        self.window = window
+        self.heartbeat_every = heartbeat_every
+        self.emit = emit
+        self.hostname = socket.gethostname()
+        self._processes: Dict[str, ProcessTrack] = {}
+        self._sockets: Dict[int, SocketTrack] = {}
+        self._last_tick: Optional[float] = None
+        self._ticks = 0
+        self._own_cpu = (time.process_time(), time.monotonic())
+
+    def _classify(self, track: ProcessTrack, signatures: CompiledSignatures):
+        """Static evidence from the name and command line, computed once per process (and per signature version)"""
+        track.static_score, track.static_reasons = signatures.classify_process(track.name, track.cmdline)
+        track.signature_version = signatures.version
+
+    def _scan_processes(self, signatures: CompiledSignatures, elapsed: Optional[float]) -> List[Dict[str, Any]]:
+        events = []
+        live = set()
+        for entry in os.scandir(PROC):
+            pid = entry.name
+            if not pid.isdigit():
+                continue
+            stat = read_proc_stat(pid)
+            if stat is None:
+                continue
+            name, ppid, ticks, start, rss = stat
+            live.add(pid)
+
+            track = self._processes.get(pid)
+            if track is None or track.start != start:
+                track = ProcessTrack(start, self.window)
+                track.cmdline = read_cmdline(pid)
+                self._processes[pid] = track
+            elif track.ticks is not None and elapsed:
+                track.cpu.append(100.0 * (ticks - track.ticks) / CLOCK_TICKS / elapsed)
+            if name != track.name or track.signature_version != signatures.version:
+                if track.name and name != track.name:
+                    # exec() into a different binary
+                    track.cmdline = read_cmdline(pid)
+                track.name = name
+                self._classify(track, signatures)
+            track.ppid, track.ticks, track.rss = ppid, ticks, rss
+
+        for pid in self._processes.keys() - live:
+            track = self._processes.pop(pid)
+            if track.flagged:
+                events.append({'type': 'process', 'event': 'exited', 'pid': int(pid), 'name': track.name})
+        return events
+
+    def _verdicts(self) -> List[Dict[str, Any]]:
+        """Flag/clear events for processes whose score or reasons changed"""
+        events = []
+        mining_pids = {s.pid for s in self._sockets.values() if s.pid}
+        for pid, track in self._processes.items():
+            score, reasons = track.static_score, list(track.static_reasons)
+            # Sustained load over the ring buffer, not a single spike
+            cpu_avg = sum(track.cpu) / len(track.cpu) if track.cpu else None
+            if cpu_avg is not None and len(track.cpu) >= min(3, self.window) and cpu_avg > HIGH_CPU_PERCENT:
+                score += 20
+                reasons.append('sustained_cpu')
+            if pid in mining_pids:
+                score += 25
+                reasons.append('mining_port_connection')
+
+            verdict = (score, tuple(reasons)) if score > MIN_SCORE else None
+            if verdict == track.flagged:
+                continue
+            track.flagged = verdict
+            event = {'type': 'process', 'pid': int(pid), 'name': track.name}
+            if verdict:
+                event.update(event='flagged', suspicion_score=score, detection_reasons=reasons,
+                             cpu_percent=round(cpu_avg, 1) if cpu_avg is not None else None,
+                             memory_mb=round(track.rss / 1024 / 1024, 1), cmdline=track.cmdline,
+                             parent_pid=track.ppid)
+            else:
+                event['event'] = 'cleared'
+            events.append(event)
+        return events
+
+    def _scan_sockets(self, signatures: CompiledSignatures, now: float) -> List[Dict[str, Any]]:
+        events = []
+        ports = frozenset(signatures.miner_ports) | signatures.pool_connection_ports
+        seen = {}
+        for inode, ip, port, tx, rx in iter_tcp_sockets(ports):
+            seen[inode] = (f"{ip}:{port}", tx, rx)
+
+        new = seen.keys() - self._sockets.keys()
+        # Only new mining sockets need an owner, so the fd tables are walked only when one appears
+        owners = socket_owners(new, list(self._processes)) if new else {}
+        for inode in new:
+            track = SocketTrack(seen[inode][0], owners.get(inode), now, self.window)
+            self._sockets[inode] = track
+            owner = self._processes.get(track.pid) if track.pid else None
+            events.append({'type': 'socket', 'event': 'opened', 'remote': track.remote,
+                           'pid': int(track.pid) if track.pid else None, 'name': owner.name if owner else None})
+
+        for inode, (remote, tx, rx) in seen.items():
+            self._sockets[inode].activity.append((now, tx, rx))
+
+        for inode in self._sockets.keys() - seen.keys():
+            track = self._sockets.pop(inode)
+            events.append({'type': 'socket', 'event': 'closed', 'remote': track.remote,
+                           'pid': int(track.pid) if track.pid else None,
+                           'duration_s': round(now - track.first_seen, 1)})
+        return events
+
+    def tick(self) -> List[Dict[str, Any]]:
+        """One sampling pass; returns only the changes since the previous pass"""
+        signatures = self.signatures.current()
+        now = time.monotonic()
+        elapsed = now - self._last_tick if self._last_tick is not None else None
+        self._last_tick = now
+
+        events = self._scan_processes(signatures, elapsed)
+        events += self._scan_sockets(signatures, now)
+        events += self._verdicts()
+
+        self._ticks += 1
+        if self.heartbeat_every and self._ticks % self.heartbeat_every == 0:
+            events.append(self.heartbeat())
+        return events
+
+    def heartbeat(self) -> Dict[str, Any]:
+        """Liveness record with the agent's own CPU share since the last heartbeat"""
+        cpu, wall = time.process_time(), time.monotonic()
+        own = 100.0 * (cpu - self._own_cpu[0]) / max(wall - self._own_cpu[1], 1e-9)
+        self._own_cpu = (cpu, wall)
+        return {
+            'type': 'heartbeat',
+            'processes': len(self._processes),
+            'flagged': sum(1 for t in self._processes.values() if t.flagged),
+            'mining_sockets': len(self._sockets),
+            'agent_cpu_percent': round(own, 3),
+            'signature_version': self.signatures.current().version
+        }
+
+    def run(self, stop: Optional[threading.Event] = None):
+        """Tick at a fixed cadence until stop is set, emitting non-empty deltas"""
+        stop = stop or threading.Event()
+        next_tick = time.monotonic()
+        while not stop.is_set():
+            events = self.tick()
+            if events and self.emit:
+                try:
+                    self.emit([{**e, 'host': self.hostname, 'timestamp': time.time()} for e in events])
+                except Exception as e:
+                    logger.error(f"Failed to report {len(events)} agent events: {e}")
+            next_tick += self.interval
+            # Skip missed ticks rather than bursting to catch up
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            stop.wait(delay)
+
+def http_emitter(url: str, timeout: float = 5.0) -> Callable[[List[Dict[str, Any]]], None]:
+    """Emitter that POSTs each batch of deltas to the server"""
+    import requests
+    session = requests.Session()
+
+    def emit(events: List[Dict[str, Any]]):
+        session.post(url, json={'events': events}, timeout=timeout).raise_for_status()
+    return emit
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Continuous /proc-based local miner detection agent")
+    parser.add_argument('--interval', type=float, default=5.0)
+    parser.add_argument('--window', type=int, default=12, help="Samples kept per process and socket")
+    parser.add_argument('--upstream', help="POST deltas here (e.g. http://server:5000/api/agent/events); "
+                                           "default prints JSON lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.upstream:
+        emitter = http_emitter(args.upstream)
+    else:
+        def emitter(events):
+            for event in events:
+                sys.stdout.write(json.dumps(event, ensure_ascii=False) + '\n')
+            sys.stdout.flush()
+
+    try:
+        HostAgent(interval=args.interval, window=args.window, emit=emitter).run()
+    except KeyboardInterrupt:
+        pass
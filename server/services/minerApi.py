@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CGMiner/BMminer API client
+
+Sends all wanted commands in one request using the "cmd1+cmd2" batch
+syntax, reads until the NUL terminator, and polls many miners
+concurrently. Stock CGMiner closes the socket after every reply, so
+connections are only kept for reuse on endpoints that have shown they
+keep them open.
+"""
+
+import asyncio
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from probeControl import ProbeController, controller as default_probe_controller
+
+try:
+    import orjson
+
+    def _loads(data: bytes) -> Any:
+        return orjson.loads(data)
+except ImportError:
+    import json
+
+    def _loads(data: bytes) -> Any:
+        return json.loads(data)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMMANDS = ['summary', 'stats', 'pools', 'devs']
+MAX_RESPONSE_BYTES = 1024 * 1024
+
+# Some BMminer builds emit "}{" between sections of a batched reply
+_SECTION_GLUE = re.compile(rb'\}\s*\{')
+
+def decode_response(raw: bytes, commands: List[str]) -> Optional[Dict[str, Any]]:
+    """Decode a CGMiner reply into {command: reply_dict}"""
+    raw = raw.rstrip(b'\x00').strip()
+    if not raw:
+        return None
+    try:
+        data = _loads(raw)
+    except ValueError:
+        try:
+            data = _loads(_SECTION_GLUE.sub(b'},{', raw))
+        except ValueError:
+            logger.debug(f"Undecodable miner API reply: {raw[:80]!r}")
+            return None
+
+    if len(commands) == 1:
+        return {commands[0]: data}
+    # Batched replies wrap each command's reply in a one-element list
+    return {c: (data.get(c) or [None])[0] for c in commands if isinstance(data, dict)}
+
+def _rate_to_ghs(section: Dict[str, Any]) -> Optional[float]:
+    for key, scale in (('GHS 5s', 1.0), ('GHS av', 1.0), ('MHS 5s', 1e-3), ('MHS av', 1e-3),
+                       ('KHS 5s', 1e-6), ('THS 5s', 1e3)):
+        if key in section:
+            try:
+                return float(section[key]) * scale
+            except (TypeError, ValueError):
+                continue
+    return None
+
+def parse_miner_info(replies: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten summary/stats/pools/devs replies into one miner record"""
+    info = {
+        'software': None,
+        'model': None,
+        'hash_rate_ghs': None,
+        'temperatures': [],
+        'fan_speeds': [],
+        'chain_power_w': None,
+        'pools': [],
+        'device_count': None,
+        'elapsed': None
+    }
+
+    summary = replies.get('summary') or {}
+    for status in summary.get('STATUS') or []:
+        if status.get('Description'):
+            info['software'] = status['Description'].split()[0]
+    for section in summary.get('SUMMARY') or []:
+        info['hash_rate_ghs'] = _rate_to_ghs(section)
+        info['elapsed'] = section.get('Elapsed')
+
+    stats = replies.get('stats') or {}
+    for section in stats.get('STATS') or []:
+        if section.get('Type'):
+            info['model'] = section['Type']
+        for key, value in section.items():
+            if not isinstance(value, (int, float)) or value <= 0:
+                continue
+            if re.fullmatch(r'temp\d+(_\d+)?', key) or re.fullmatch(r'temp_chip\d+', key):
+                info['temperatures'].append(float(value))
+            elif re.fullmatch(r'fan\d+', key):
+                info['fan_speeds'].append(int(value))
+        if section.get('chain_power'):
+            match = re.search(r'[\d.]+', str(section['chain_power']))
+            if match:
+                info['chain_power_w'] = float(match.group())
+        if info['hash_rate_ghs'] is None:
+            info['hash_rate_ghs'] = _rate_to_ghs(section)
+
+    pools = replies.get('pools') or {}
+    info['pools'] = [p.get('URL') for p in pools.get('POOLS') or [] if p.get('URL')]
+
+    devs = replies.get('devs') or {}
+    if devs.get('DEVS') is not None:
+        info['device_count'] = len(devs['DEVS'])
+        if not info['temperatures']:
+            info['temperatures'] = [float(d['Temperature']) for d in devs['DEVS'] if d.get('Temperature')]
+
+    return info
+
+class MinerApiClient:
+    def __init__(self, probes: Optional[ProbeController] = None, concurrency: int = 512):
+        self.probes = probes or default_probe_controller
+        self.concurrency = concurrency
+        # (ip, port) -> idle (reader, writer) for endpoints that keep connections open
+        self._idle: Dict[Tuple[str, int], List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+        self._keepalive: Dict[Tuple[str, int], bool] = {}
+
+    async def _exchange(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                        command: str, timeout: float) -> bytes:
+        writer.write(('{"command":"%s"}' % command).encode())
+        await writer.drain()
+
+        chunks = []
+        size = 0
+        while True:
+            chunk = await asyncio.wait_for(reader.read(65536), timeout)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+            if chunk.endswith(b'\x00') or size > MAX_RESPONSE_BYTES:
+                break
+        return b''.join(chunks)
+
+    async def query(self, ip: str, port: int = 4028,
+                    commands: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Run the batched commands against one miner; returns {command: reply} or None"""
+        commands = commands or DEFAULT_COMMANDS
+        command = '+'.join(commands)
+        key = (ip, port)
+        timeout = self.probes.request_timeout(ip)
+
+        idle = self._idle.get(key)
+        if idle:
+            reader, writer = idle.pop()
+            try:
+                raw = await self._exchange(reader, writer, command, timeout)
+                if raw:
+                    self._release(key, reader, writer)
+                    return decode_response(raw, commands)
+            except (OSError, asyncio.TimeoutError):
+                pass
+            writer.close()
+            self._keepalive[key] = False
+
+        await self.probes.pace_async(ip)
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+
+        try:
+            raw = await self._exchange(reader, writer, command, timeout)
+        except (OSError, asyncio.TimeoutError):
+            writer.close()
+            return None
+
+        self._release(key, reader, writer)
+        return decode_response(raw, commands)
+
+    def _release(self, key: Tuple[str, int], reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if reader.at_eof() or self._keepalive.get(key) is False:
+            writer.close()
+            return
+        self._keepalive.setdefault(key, True)
+        self._idle.setdefault(key, []).append((reader, writer))
+
+    async def poll_many(self, endpoints: Iterable[Tuple[str, int]],
+                        commands: Optional[List[str]] = None) -> Dict[Tuple[str, int], Optional[Dict[str, Any]]]:
+        """Query many miners concurrently under the client's concurrency limit"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(endpoint):
+            async with semaphore:
+                return endpoint, await self.query(endpoint[0], endpoint[1], commands)
+
+        results = await asyncio.gather(*(one(endpoint) for endpoint in endpoints))
+        return dict(results)
+
+    def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+def query_miner(ip: str, port: int = 4028, commands: Optional[List[str]] = None,
+                probes: Optional[ProbeController] = None) -> Optional[Dict[str, Any]]:
+    """Blocking single-miner query for synchronous callers"""
+    async def run():
+        client = MinerApiClient(probes)
+        try:
+            return await client.query(ip, port, commands)
+        finally:
+            client.close()
+    return asyncio.run(run())
+
+def poll_miners(endpoints: Iterable[Tuple[str, int]], commands: Optional[List[str]] = None,
+                concurrency: int = 512) -> Dict[Tuple[str, int], Optional[Dict[str, Any]]]:
+    """Blocking concurrent poll of many miners"""
+    async def run():
+        client = MinerApiClient(concurrency=concurrency)
+        try:
+            return await client.poll_many(endpoints, commands)
+        finally:
+            client.close()
+    return asyncio.run(run())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch miner classifier
+
+A small NumPy multilayer perceptron trained once offline on labelled scan
+results and saved as a compressed .npz file. Loading it takes a few
+milliseconds, and prediction runs on a whole batch of feature vectors, so
+the scan path needs no TensorFlow or per-sample model calls.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from minerScoring import FEATURE_NAMES, feature_matrix
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'minerClassifier.npz')
+
+# Open-port indicator columns appended to the scoring features
+DEFAULT_PORTS = [22, 80, 443, 3333, 4028, 4444, 8080, 8888, 9999, 14444]
+
+def device_features(devices: Iterable[Dict[str, Any]], ports: List[int]) -> np.ndarray:
+    """Scoring features, open-port indicators and log open-port count for each device"""
+    devices = list(devices)
+    scored = feature_matrix([d.get('detection_results') or {} for d in devices])
+    port_index = {port: i for i, port in enumerate(ports)}
+    port_bits = np.zeros((len(devices), len(ports)))
+    open_counts = np.zeros((len(devices), 1))
+    for row, device in enumerate(devices):
+        open_ports = device.get('open_ports') or []
+        open_counts[row, 0] = np.log1p(len(open_ports))
+        for port in open_ports:
+            if port in port_index:
+                port_bits[row, port_index[port]] = 1.0
+    return np.hstack([scored, port_bits, open_counts])
+
+class MinerClassifier:
+    def __init__(self, params: Dict[str, np.ndarray], ports: List[int], version: str = 'unknown'):
+        self.w1 = params['w1']
+        self.b1 = params['b1']
+        self.w2 = params['w2']
+        self.b2 = params['b2']
+        self.mean = params['mean']
+        self.scale = params['scale']
+        self.ports = list(ports)
+        self.version = version
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> 'MinerClassifier':
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            params = {k: data[k] for k in ('w1', 'b1', 'w2', 'b2', 'mean', 'scale')}
+        if meta.get('features') != FEATURE_NAMES:
+            raise ValueError(f"Classifier {path} was trained on features {meta.get('features')}")
+        return cls(params, meta['ports'], meta.get('version', 'unknown'))
+
+    def save(self, path: str = MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        meta = json.dumps({'version': self.version, 'features': FEATURE_NAMES, 'ports': self.ports})
+        np.savez_compressed(path, w1=self.w1, b1=self.b1, w2=self.w2, b2=self.b2,
+                            mean=self.mean, scale=self.scale, meta=np.array(meta))
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """Miner probability for each row of an (n, width) feature matrix"""
+        hidden = np.maximum(0.0, ((features - self.mean) / self.scale) @ self.w1 + self.b1)
+        return 1.0 / (1.0 + np.exp(-(hidden @ self.w2 + self.b2)))
+
+    def annotate(self, devices: List[Dict[str, Any]], threshold: float = 0.5) -> np.ndarray:
+        """Add the classifier's probability to every device's detection results in one batch"""
+        scored = [d for d in devices if d.get('detection_results')]
+        if not scored:
+            return np.zeros(0)
+
+        probabilities = self.predict_proba(device_features(scored, self.ports))
+        for device, probability in zip(scored, probabilities.tolist()):
+            detection = device['detection_results']
+            detection['ml_probability'] = round(probability, 4)
+            detection['ml_model'] = self.version
+            if probability >= threshold and 'ml_classifier' not in detection['detection_methods']:
+                detection['detection_methods'].append('ml_classifier')
+        return probabilities
+
+def train(features: np.ndarray, labels: np.ndarray, ports: List[int], hidden: int = 16,
+          epochs: int = 500, learning_rate: float = 0.01, l2: float = 1e-4, seed: int = 1,
+          version: str = 'trained') -> MinerClassifier:
+    """Full-batch Adam training of a one-hidden-layer network with a sigmoid output"""
+    rng = np.random.default_rng(seed)
+    labels = labels.astype(np.float64)
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0)
+    scale[scale == 0] = 1.0
+    x = (features - mean) / scale
+
+    params = {
+        'w1': rng.normal(0, np.sqrt(2.0 / x.shape[1]), (x.shape[1], hidden)),
+        'b1': np.zeros(hidden),
+        'w2': rng.normal(0, np.sqrt(1.0 / hidden), hidden),
+        'b2': np.zeros(1)
+    }
+    moments = {k: (np.zeros_like(v), np.zeros_like(v)) for k, v in params.items()}
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+    for step in range(1, epochs + 1):
+        pre = x @ params['w1'] + params['b1']
+        h = np.maximum(0.0, pre)
+        p = 1.0 / (1.0 + np.exp(-(h @ params['w2'] + params['b2'])))
+
+        error = (p - labels) / len(labels)
+        grad_hidden = np.outer(error, params['w2']) * (pre > 0)
+        grads = {
+            'w2': h.T @ error + l2 * params['w2'],
+            'b2': np.array([error.sum()]),
+            'w1': x.T @ grad_hidden + l2 * params['w1'],
+            'b1': grad_hidden.sum(axis=0)
+        }
+        for k, g in grads.items():
+            m, v = moments[k]
+            m[:] = beta1 * m + (1 - beta1) * g
+            v[:] = beta2 * v + (1 - beta2) * g * g
+            params[k] -= learning_rate * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + eps)
+
+    return MinerClassifier({**params, 'mean': mean, 'scale': scale}, ports, version)
+
+def load_classifier(path: Optional[str] = None) -> Optional[MinerClassifier]:
+    """Load the classifier if a trained model file exists; the scan path works without one"""
+    path = path or MODEL_PATH
+    if not os.path.exists(path):
+        return None
+    try:
+        return MinerClassifier.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Could not load classifier {path}: {e}")
+        return None
+
+def _load_labelled(path: str) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """JSON lines of scanned devices (as in detect_miners output) each with a 0/1 'label'"""
+    devices, labels = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                devices.append(row)
+                labels.append(int(row['label']))
+    return devices, np.asarray(labels)
+
+def main():
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Offline training and batch prediction for the miner classifier")
+    sub = parser.add_subparsers(dest='command', required=True)
+    train_parser = sub.add_parser('train')
+    train_parser.add_argument('labelled', help="JSON lines of devices with a 0/1 label")
+    train_parser.add_argument('--hidden', type=int, default=16)
+    train_parser.add_argument('--epochs', type=int, default=500)
+    train_parser.add_argument('--version', default='trained')
+    sub.add_parser('predict', help="Read detect_miners JSON on stdin, print probabilities")
+    parser.add_argument('--model', default=MODEL_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'train':
+        devices, labels = _load_labelled(args.labelled)
+        X = device_features(devices, DEFAULT_PORTS)
+        classifier = train(X, labels, DEFAULT_PORTS, args.hidden, args.epochs, version=args.version)
+        accuracy = np.mean((classifier.predict_proba(X) >= 0.5) == labels.astype(bool))
+        logger.info(f"Trained on {len(labels)} devices, training accuracy {accuracy:.3f}")
+        classifier.save(args.model)
+    elif args.command == 'predict':
+        classifier = MinerClassifier.load(args.model)
+        devices = json.loads(sys.stdin.read()).get('detected_devices', [])
+        probabilities = classifier.predict_proba(device_features(devices, classifier.ports))
+        print(json.dumps({d['ip_address']: round(p, 4) for d, p in zip(devices, probabilities.tolist())}, indent=2))
+
+if __name__ == "__main__":
+    main()
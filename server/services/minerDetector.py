@@ -8,25 +8,62 @@ Production-ready implementation with real detection capabilities
 import asyncio
 import json
 import logging
+import math
+import random
 import psutil
 import socket
 import subprocess
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import requests
 import scapy.all as scapy
 from scapy.layers.l2 import ARP, Ether
 
+from minerApi import DEFAULT_COMMANDS, MinerApiClient, parse_miner_info
+from minerClassifier import load_classifier
+from minerScoring import ScoringEngine, empty_features
+from probeControl import ProbeController, controller as default_probe_controller
+from processMonitor import ProcessMonitor
+from scanCheckpoint import ScanCheckpoint, sweep_key
+from scanState import HostStateStore, diff_host_states
+from telemetryPoller import TelemetryStore
+from signatureDb import SignatureDatabase, signature_db
+from snmpCrawler import snmp_crawl
+from targetSpace import TargetSpace
+from webFingerprint import WebFingerprinter
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class AdvancedMinerDetector:
-    def __init__(self):
+    def __init__(self, probes: Optional[ProbeController] = None, telemetry: Optional[TelemetryStore] = None,
+                 signatures: Optional[SignatureDatabase] = None, scorer: Optional[ScoringEngine] = None,
+                 snmp: bool = True, snmp_communities: Optional[List[str]] = None):
+        # Shared RTT-driven timeouts for every socket probe
+        self.probes = probes or default_probe_controller
+        # Confirmed miners are enrolled here for continuous polling
+        self.telemetry = telemetry
+        # Hot-reloaded ports, processes, algorithms and web signatures
+        self.signatures = signatures or signature_db
+        # Batch scorer over per-host feature vectors
+        self.scorer = scorer or ScoringEngine()
+        # Range scans also poll every live host's SNMP agent in one concurrent batch
+        self.snmp = snmp
+        self.snmp_communities = snmp_communities
+        # Created on first use; keeps per-PID state between monitoring passes
+        self._process_monitor: Optional[ProcessMonitor] = None
+        # Event loop thread shared by the scan threads, so pooled async clients
+        # keep their connections from one host check to the next
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._web: Optional[WebFingerprinter] = None
+        self._api: Optional[MinerApiClient] = None
+        
         # Ilam province geographical boundaries
         self.ilam_bounds = {
             'north': 34.5,
@@ -49,38 +86,23 @@ class AdvancedMinerDetector:
             'سرابله': (32.9667, 46.5833),
             'ملکشاهی': (33.3833, 46.5667)
         }
-        
-        # Mining-related ports
-        self.miner_ports = {
-            4028: "CGMiner API", 4029: "SGMiner API", 4030: "BFGMiner API",
-            4031: "CPUMiner API", 4032: "XMRig API", 4033: "T-Rex API",
-            4034: "PhoenixMiner API", 4035: "Claymore API", 4036: "Gminer API",
-            8080: "Web Interface", 8888: "Web Interface Alt", 8081: "Miner Web UI",
-            3000: "Miner Dashboard", 3001: "Mining Pool UI", 8000: "HTTP Server",
-            3333: "Stratum Pool", 4444: "Stratum Pool Alt", 9999: "Stratum SSL",
-            14444: "Stratum SSL Alt", 5555: "Stratum Pool", 7777: "Stratum Pool",
-            1080: "SOCKS Proxy", 3128: "HTTP Proxy", 8118: "Privoxy",
-            9050: "Tor SOCKS", 1194: "OpenVPN", 1723: "PPTP VPN",
-            8332: "Bitcoin RPC", 8333: "Bitcoin P2P", 9332: "Litecoin RPC"
-        }
-        
-        # Known miner process signatures
-        self.miner_processes = {
-            'cgminer.exe', 'bfgminer.exe', 'sgminer.exe', 'cpuminer.exe',
-            'xmrig.exe', 'xmr-stak.exe', 'claymore.exe', 'phoenixminer.exe',
-            't-rex.exe', 'gminer.exe', 'nbminer.exe', 'teamredminer.exe',
-            'lolminer.exe', 'miniZ.exe', 'bminer.exe', 'z-enemy.exe',
-            'ccminer.exe', 'ethminer.exe', 'nanominer.exe', 'srbminer.exe'
-        }
-        
-        # Mining algorithm signatures
-        self.mining_algorithms = [
-            'sha256', 'scrypt', 'x11', 'ethash', 'equihash', 'cryptonight',
-            'lyra2rev2', 'neoscrypt', 'blake2s', 'skunk', 'x16r', 'x16s'
-        ]
+
+    @property
+    def miner_ports(self) -> Dict[int, str]:
+        """Mining-related ports from the current signature database"""
+        return self.signatures.current().miner_ports
+
+    @property
+    def miner_processes(self):
+        return self.signatures.current().miner_processes
+
+    @property
+    def mining_algorithms(self) -> List[str]:
+        return self.signatures.current().mining_algorithms
 
     def ping_host(self, ip: str, timeout: int = 1) -> bool:
         """Check if host is reachable via ping"""
+        self.probes.pace(ip)
         try:
             if hasattr(subprocess, 'DEVNULL'):
                 result = subprocess.run(
@@ -101,8 +123,11 @@ class AdvancedMinerDetector:
         except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
             return False
 
-    def scan_port(self, ip: str, port: int, timeout: float = 3.0) -> bool:
-        """Scan a single port on target IP"""
+    def scan_port(self, ip: str, port: int, timeout: Optional[float] = None) -> bool:
+        """Scan a single port on target IP; timeout defaults to the adaptive per-subnet value"""
+        if timeout is None:
+            return self.probes.is_open(ip, port)
+            
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.settimeout(timeout)
@@ -145,8 +170,18 @@ class AdvancedMinerDetector:
             
         return None
 
-    def detect_miner_signatures(self, ip: str, open_ports: List[int]) -> Dict[str, Any]:
-        """Detect miner-specific signatures on a device"""
+    def monitor_processes(self) -> List[Dict[str, Any]]:
+        """Suspicious local processes; repeated calls only re-inspect new or changed PIDs"""
+        if self._process_monitor is None:
+            self._process_monitor = ProcessMonitor(self.signatures)
+        return self._process_monitor.scan()
+
+    def detect_miner_signatures(self, ip: str, open_ports: List[int], score: bool = True,
+                                snmp: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Collect miner evidence for a device; score=False leaves scoring to a later batch
+
+        snmp is the host's record from snmpCrawler, when its agent answered.
+        """
         detection_results = {
             'is_miner': False,
             'confidence_score': 0,
@@ -156,129 +191,172 @@ class AdvancedMinerDetector:
             'hash_rate': None,
             'power_consumption': None
         }
+        features = empty_features()
+        detection_results['features'] = features
+        
+        # One snapshot per host so a reload mid-check cannot mix versions
+        signatures = self.signatures.current()
+        detection_results['signature_version'] = signatures.version
         
         # Check for mining ports
-        mining_ports_found = [port for port in open_ports if port in self.miner_ports]
+        mining_ports_found = [port for port in open_ports if port in signatures.miner_ports]
         if mining_ports_found:
-            detection_results['confidence_score'] += len(mining_ports_found) * 25
+            features['mining_ports'] = len(mining_ports_found)
             detection_results['detection_methods'].append('mining_ports')
             
         # Try to connect to common miner APIs
         for port in mining_ports_found:
             try:
-                if port in [4028, 4029, 4030]:  # CGMiner/SGMiner/BFGMiner APIs
+                if port in signatures.api_ports:  # CGMiner/SGMiner/BFGMiner APIs
                     miner_data = self._query_cgminer_api(ip, port)
                     if miner_data:
+                        features['api_response'] = 1
                         detection_results['is_miner'] = True
-                        detection_results['confidence_score'] = 95
                         detection_results['device_type'] = miner_data.get('device_type', 'ASIC Miner')
                         detection_results['mining_software'] = miner_data.get('software', 'CGMiner')
                         detection_results['hash_rate'] = miner_data.get('hash_rate')
                         detection_results['detection_methods'].append('api_response')
+                        if self.telemetry:
+                            self.telemetry.add_endpoints([(ip, port, miner_data.get('software'))])
                         
-                elif port in [8080, 8888, 3000]:  # Web interfaces
+                elif port in signatures.web_ports:  # Web interfaces
                     web_data = self._check_web_interface(ip, port)
                     if web_data:
-                        detection_results['confidence_score'] += 30
+                        features['web_interface'] += 1
                         detection_results['detection_methods'].append('web_interface')
                         if web_data.get('is_miner'):
+                            features['web_miner'] = 1
                             detection_results['is_miner'] = True
                             detection_results['device_type'] = web_data.get('device_type', 'Web-managed Miner')
+                            if web_data.get('vendor'):
+                                detection_results['vendor'] = web_data['vendor']
                             
             except Exception as e:
                 logger.debug(f"Error checking port {port} on {ip}: {e}")
                 
         # Check for Stratum connections
-        stratum_ports = [3333, 4444, 9999, 14444, 5555, 7777]
-        stratum_found = [port for port in open_ports if port in stratum_ports]
+        stratum_found = [port for port in open_ports if port in signatures.stratum_ports]
         if stratum_found:
-            detection_results['confidence_score'] += len(stratum_found) * 20
+            features['stratum_ports'] = len(stratum_found)
             detection_results['detection_methods'].append('stratum_connection')
             
+        if snmp:
+            self._apply_snmp(detection_results, snmp)
+            
         # Analyze network behavior patterns
         network_analysis = self._analyze_network_patterns(ip)
         if network_analysis['suspicious_traffic']:
-            detection_results['confidence_score'] += 15
+            features['network_analysis'] = 1
             detection_results['detection_methods'].append('network_analysis')
             
-        # Power consumption estimation
-        if detection_results['confidence_score'] > 50:
-            power_estimate = self._estimate_power_consumption(detection_results['device_type'], detection_results['hash_rate'])
-            detection_results['power_consumption'] = power_estimate
-            
-        # Final classification
-        if detection_results['confidence_score'] >= 70:
-            detection_results['is_miner'] = True
-        elif detection_results['confidence_score'] >= 40:
-            detection_results['device_type'] = 'suspicious'
+        if score:
+            self.score_devices([{'ip_address': ip, 'detection_results': detection_results}])
             
         return detection_results
 
+    def _apply_snmp(self, detection_results: Dict[str, Any], snmp: Dict[str, Any]):
+        """Merge an SNMP crawl record into a host's detection results"""
+        detection_results['snmp'] = {k: v for k, v in snmp.items() if k != 'ip_address'}
+        detection_results['detection_methods'].append('snmp')
+        if not snmp['is_miner']:
+            return
+        detection_results['features']['snmp_miner'] = 1
+        detection_results['is_miner'] = True
+        detection_results['device_type'] = snmp['device_type']
+        detection_results.setdefault('vendor', snmp['vendor'])
+        if snmp['hash_rate'] is not None and not detection_results['hash_rate']:
+            detection_results['hash_rate'] = str(snmp['hash_rate'])
+
+    def enrich_with_snmp(self, devices: List[Dict[str, Any]]):
+        """Crawl the SNMP agents of all live devices concurrently and fold the answers into their evidence"""
+        if not self.snmp or not devices:
+            return
+        records = snmp_crawl([d['ip_address'] for d in devices], self.signatures.current().snmp,
+                             self.probes, communities=self.snmp_communities)
+        for device in devices:
+            record = records.get(device['ip_address'])
+            if not record:
+                continue
+            if device['detection_results'] is None:
+                # No open TCP ports, but the agent answered
+                device['detection_results'] = self.detect_miner_signatures(
+                    device['ip_address'], device['open_ports'], False, snmp=record)
+            else:
+                self._apply_snmp(device['detection_results'], record)
+
+    def score_devices(self, devices: List[Dict[str, Any]]):
+        """Score every device's detection results in one batch, then estimate power for likely miners"""
+        detections = [d['detection_results'] for d in devices if d and d.get('detection_results')]
+        ips = [d['ip_address'] for d in devices if d and d.get('detection_results')]
+        scores = self.scorer.apply(detections)
+        
+        power_threshold = self.scorer.model.thresholds['power']
+        for ip, detection, score in zip(ips, detections, scores.tolist()):
+            if score > power_threshold:
+                detection['power_consumption'] = self._estimate_power_consumption(
+                    detection['device_type'], detection['hash_rate'], ip)
+
     def _query_cgminer_api(self, ip: str, port: int) -> Optional[Dict[str, Any]]:
-        """Query CGMiner-compatible API for miner information"""
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)
-            sock.connect((ip, port))
-            
-            # Send summary command
-            sock.send(b'{"command":"summary"}')
-            response = sock.recv(4096).decode('utf-8', errors='ignore')
-            sock.close()
+        """Query CGMiner-compatible API for miner information in one batched round trip"""
+        async def query():
+            if self._api is None:
+                self._api = MinerApiClient(self.probes)
+            replies = await self._api.query(ip, port, DEFAULT_COMMANDS)
+            if replies and replies.get('summary'):
+                return replies
+            # Some firmware rejects "+" batches; a plain summary is what older scans relied on
+            return await self._api.query(ip, port, ['summary'])
+        replies = self._run_async(query())
+        if not replies or not replies.get('summary'):
+            return None
             
-            if 'SUMMARY' in response and ('GH/s' in response or 'MH/s' in response or 'TH/s' in response):
-                # Parse response for miner info
-                data = {}
-                if 'Type=' in response:
-                    type_start = response.find('Type=') + 5
-                    type_end = response.find(',', type_start)
-                    if type_end == -1:
-                        type_end = response.find(']', type_start)
-                    data['software'] = response[type_start:type_end]
-                    
-                if 'GHS 5s=' in response:
-                    hash_start = response.find('GHS 5s=') + 8
-                    hash_end = response.find(',', hash_start)
-                    try:
-                        hash_rate = float(response[hash_start:hash_end])
-                        data['hash_rate'] = f"{hash_rate:.2f} GH/s"
-                        data['device_type'] = 'ASIC Miner'
-                    except ValueError:
-                        pass
-                        
-                return data
-                
-        except (socket.error, socket.timeout, OSError):
-            pass
+        info = parse_miner_info(replies)
+        if info['hash_rate_ghs'] is None:
+            return None
             
-        return None
+        return {
+            'software': info['model'] or info['software'],
+            'hash_rate': f"{info['hash_rate_ghs']:.2f} GH/s",
+            'device_type': 'ASIC Miner',
+            'telemetry': info
+        }
+
+    def _run_async(self, coroutine):
+        """Run a coroutine on the detector's event loop and wait for its result"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='detector-io', daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
 
     def _check_web_interface(self, ip: str, port: int) -> Optional[Dict[str, Any]]:
-        """Check for miner web interface"""
-        try:
-            url = f"http://{ip}:{port}"
-            response = requests.get(url, timeout=5)
-            content = response.text.lower()
-            
-            miner_keywords = [
-                'antminer', 'whatsminer', 'avalon', 'innosilicon', 'bitmain',
-                'mining', 'hashrate', 'hash rate', 'pool', 'worker',
-                'cgminer', 'bfgminer', 'cryptocurrency', 'bitcoin', 'ethereum'
-            ]
-            
-            found_keywords = [keyword for keyword in miner_keywords if keyword in content]
-            
-            if found_keywords:
-                return {
-                    'is_miner': len(found_keywords) >= 2,
-                    'device_type': 'Web-managed Miner',
-                    'keywords_found': found_keywords
-                }
-                
-        except (requests.RequestException, requests.Timeout):
-            pass
-            
-        return None
+        """Check for miner web interface over a pooled, byte-capped HTTP fetch"""
+        async def check():
+            db = self.signatures.current().web
+            if self._web is None or self._web.db is not db:
+                # Signatures were reloaded; the connection pool is kept
+                if self._web:
+                    self._web.db = db
+                else:
+                    self._web = WebFingerprinter(db, self.probes)
+            return await self._web.fingerprint(ip, port)
+        return self._run_async(check())
+
+    def close(self):
+        """Close pooled connections and stop the detector's event loop"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        async def shutdown():
+            if self._web:
+                self._web.close()
+                self._web = None
+            if self._api:
+                self._api.close()
+                self._api = None
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
 
     def _analyze_network_patterns(self, ip: str) -> Dict[str, Any]:
         """Analyze network traffic patterns for mining behavior"""
@@ -287,6 +365,7 @@ class AdvancedMinerDetector:
             'connection_patterns': [],
             'data_volume': 0
         }
+        pool_ports = self.signatures.current().pool_connection_ports
         
         try:
             # Get network connections for the IP
@@ -300,7 +379,7 @@ class AdvancedMinerDetector:
             for conn in connections:
                 if conn.raddr:
                     # Check if connecting to known pool ports
-                    if conn.raddr.port in [3333, 4444, 9999, 14444]:
+                    if conn.raddr.port in pool_ports:
                         pool_connections += 1
                         analysis['connection_patterns'].append('pool_connection')
                         
@@ -312,8 +391,14 @@ class AdvancedMinerDetector:
             
         return analysis
 
-    def _estimate_power_consumption(self, device_type: str, hash_rate: Optional[str]) -> Optional[float]:
-        """Estimate power consumption based on device type and hash rate"""
+    def _estimate_power_consumption(self, device_type: str, hash_rate: Optional[str],
+                                    ip: Optional[str] = None) -> Optional[float]:
+        """Estimate power consumption, preferring measured telemetry over device type and hash rate"""
+        if ip and self.telemetry:
+            measured = self.telemetry.power_estimate(ip)
+            if measured is not None:
+                return measured
+                
         power_estimates = {
             'ASIC Miner': {'base': 1500, 'per_th': 50},  # Watts
             'GPU Miner': {'base': 800, 'per_th': 200},
@@ -349,84 +434,247 @@ class AdvancedMinerDetector:
                 
         return base_power
 
-    def scan_network_range(self, ip_range: str, ports: List[int], progress_callback=None) -> List[Dict[str, Any]]:
-        """Scan a network range for devices and potential miners"""
+    def scan_host(self, ip: str, ports: List[int], score: bool = True) -> Optional[Dict[str, Any]]:
+        """Probe a single host; returns None when it does not respond"""
+        device_info = {
+            'ip_address': ip,
+            'mac_address': None,
+            'hostname': None,
+            'open_ports': [],
+            'detection_results': None,
+            'scan_time': datetime.now()
+        }
+        
+        # Check if host is alive
+        if not self.ping_host(ip):
+            return None
+            
+        # Get MAC address
+        device_info['mac_address'] = self.get_mac_address(ip)
+        
+        # Get hostname
+        try:
+            device_info['hostname'] = socket.gethostbyaddr(ip)[0]
+        except (socket.herror, socket.gaierror):
+            pass
+        
+        # Scan ports
+        open_ports = []
+        for port in ports:
+            if self.scan_port(ip, port):
+                open_ports.append(port)
+        
+        device_info['open_ports'] = open_ports
+        
+        # Detect miner signatures if ports are open
+        if open_ports:
+            device_info['detection_results'] = self.detect_miner_signatures(ip, open_ports, score)
+        
+        return device_info
+
+    def verify_host(self, ip: str, known_ports: List[int], score: bool = True) -> Optional[Dict[str, Any]]:
+        """Re-check only the ports a host had open last time; pings only when they are all closed"""
+        open_ports = [port for port in known_ports if self.scan_port(ip, port)]
+        if not open_ports:
+            # Closed miner ports alone do not mean the host left the network
+            if not self.ping_host(ip):
+                return None
+            return {
+                'ip_address': ip,
+                'mac_address': None,
+                'hostname': None,
+                'open_ports': [],
+                'detection_results': None,
+                'scan_time': datetime.now()
+            }
+            
+        return {
+            'ip_address': ip,
+            'mac_address': None,
+            'hostname': None,
+            'open_ports': open_ports,
+            'detection_results': self.detect_miner_signatures(ip, open_ports, score),
+            'scan_time': datetime.now()
+        }
+
+    def scan_network_range(self, ip_range: str, ports: List[int], progress_callback=None,
+                           exclude: Optional[List[str]] = None, seed: Optional[int] = None,
+                           shard: Optional[int] = None, shards: int = 1,
+                           checkpoint: Optional[ScanCheckpoint] = None,
+                           on_devices: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                           batch_size: int = 500) -> List[Dict[str, Any]]:
+        """Scan a network range for devices and potential miners
+
+        Targets are walked lazily in pseudo-random order (see targetSpace), so
+        large ranges are never materialised and no subnet is hit in a burst.
+        Without a shard, every shard is swept in turn. With a checkpoint,
+        progress is saved every few seconds and an interrupted sweep resumes.
+        With on_devices, found devices are enriched, scored and handed over in
+        batches of batch_size while the sweep goes on, and none are returned.
+        """
         discovered_devices = []
         
+        def hand_over(force: bool = False):
+            if discovered_devices and (force or len(discovered_devices) >= batch_size):
+                self.enrich_with_snmp(discovered_devices)
+                self.score_devices(discovered_devices)
+                on_devices(list(discovered_devices))
+                discovered_devices.clear()
+        
         try:
-            import ipaddress
-            network = ipaddress.IPv4Network(ip_range, strict=False)
-            total_hosts = len(list(network.hosts()))
+            targets = TargetSpace.parse(ip_range, exclude)
+            key = sweep_key(ip_range, exclude, ports, shards) if checkpoint else None
+            if seed is None and checkpoint:
+                seed = checkpoint.seed_for(key)
+            if seed is None:
+                # Every shard, and every resumed run, must walk the same permutation. Shards
+                # may be swept by separate processes, so their seed comes from the sweep itself.
+                seed = targets.sweep_seed(shards) if shards > 1 else random.getrandbits(32)
+            shard_list = [shard] if shard is not None else list(range(shards))
+            finished = checkpoint.finished_shards(key) if checkpoint else set()
+            total_hosts = max(1, math.ceil(len(targets) / shards) * len(shard_list))
+            max_workers = 50
+            submitted = 0
             
-            def scan_host(ip_obj):
-                ip = str(ip_obj)
-                device_info = {
-                    'ip_address': ip,
-                    'mac_address': None,
-                    'hostname': None,
-                    'open_ports': [],
-                    'detection_results': None,
-                    'scan_time': datetime.now()
-                }
+            for current in shard_list:
+                if current in finished:
+                    discovered_devices.extend(checkpoint.results(key, current))
+                    submitted += math.ceil(len(targets) / shards)
+                    if on_devices:
+                        hand_over()
+                    continue
+                permutation = targets.permutation(seed, current, shards)
+                progress = checkpoint.shard(key, current, seed, ip_range) if checkpoint else None
+                if progress:
+                    discovered_devices.extend(checkpoint.results(key, current))
+                    positions = progress.remaining(permutation)
+                else:
+                    positions = permutation.iter_indices()
+                in_flight_positions = {}
                 
-                # Check if host is alive
-                if self.ping_host(ip):
-                    # Get MAC address
-                    device_info['mac_address'] = self.get_mac_address(ip)
-                    
-                    # Get hostname
-                    try:
-                        device_info['hostname'] = socket.gethostbyaddr(ip)[0]
-                    except (socket.herror, socket.gaierror):
-                        pass
-                    
-                    # Scan ports
-                    open_ports = []
-                    for port in ports:
-                        if self.scan_port(ip, port):
-                            open_ports.append(port)
-                    
-                    device_info['open_ports'] = open_ports
-                    
-                    # Detect miner signatures if ports are open
-                    if open_ports:
-                        device_info['detection_results'] = self.detect_miner_signatures(ip, open_ports)
-                    
-                    return device_info
-                
-                return None
-                
-            # Use ThreadPoolExecutor for parallel scanning
-            with ThreadPoolExecutor(max_workers=50) as executor:
-                futures = []
-                hosts = list(network.hosts())
-                
-                for i, ip_obj in enumerate(hosts):
-                    future = executor.submit(scan_host, ip_obj)
-                    futures.append(future)
-                    
-                    if progress_callback and i % 10 == 0:
-                        progress = (i / total_hosts) * 100
-                        progress_callback(progress, f"Scanning {ip_obj}")
-                
-                # Collect results
-                for i, future in enumerate(futures):
-                    try:
-                        result = future.result(timeout=30)
+                def collect(done):
+                    for future in done:
+                        position = in_flight_positions.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            logger.warning(f"Scan error: {e}")
+                            result = None
                         if result:
                             discovered_devices.append(result)
-                    except Exception as e:
-                        logger.warning(f"Scan error: {e}")
+                        if progress:
+                            progress.complete(position, result)
+                    if progress:
+                        progress.maybe_save()
+                    if on_devices:
+                        hand_over()
+                
+                # Use ThreadPoolExecutor for parallel scanning, with a bounded window of hosts in flight
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    for position, index in positions:
+                        ip = targets[index]
+                        in_flight_positions[executor.submit(self.scan_host, ip, ports, False)] = position
+                        if len(in_flight_positions) >= max_workers * 4:
+                            done, _ = wait(in_flight_positions, return_when=FIRST_COMPLETED)
+                            collect(done)
                         
-                    if progress_callback and i % 10 == 0:
-                        progress = (i / len(futures)) * 100
-                        progress_callback(progress, f"Processing results...")
+                        if progress_callback and submitted % 10 == 0:
+                            progress_callback((submitted / total_hosts) * 100, f"Scanning {ip}")
+                        submitted += 1
+                    
+                    for future in as_completed(list(in_flight_positions)):
+                        collect([future])
+                
+                if progress:
+                    progress.save(finished=True)
+            
+            if on_devices:
+                hand_over(force=True)
+            else:
+                self.enrich_with_snmp(discovered_devices)
+                self.score_devices(discovered_devices)
                         
         except Exception as e:
             logger.error(f"Network scan error: {e}")
             
         return discovered_devices
 
+    def incremental_scan(self, ip_range: str, ports: List[int], state_store: HostStateStore,
+                         rotation_rate: float = 0.1, progress_callback=None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Re-verify known positive hosts, then fully sweep one rotating slice of the range"""
+        import ipaddress
+        network = ipaddress.IPv4Network(ip_range, strict=False)
+        previous = state_store.load_range(ip_range)
+        now = datetime.now().isoformat()
+        
+        # Rotating window over the host index space; a full pass takes 1/rotation_rate runs
+        total_hosts = max(0, network.num_addresses - 2) if network.prefixlen < 31 else network.num_addresses
+        first_host = int(network.network_address) + (1 if network.prefixlen < 31 else 0)
+        sweep_count = math.ceil(total_hosts * min(max(rotation_rate, 0.0), 1.0))
+        start, count = state_store.next_sweep_window(ip_range, total_hosts, sweep_count)
+        sweep_ips = [str(ipaddress.IPv4Address(first_host + (start + i) % total_hosts)) for i in range(count)]
+        sweep_set = set(sweep_ips)
+        
+        # Previously positive host/port pairs outside the sweep window
+        verify_targets = {
+            ip: state['open_ports'] for ip, state in previous.items()
+            if state['alive'] and state['open_ports'] and ip not in sweep_set
+        }
+        
+        verified = []
+        swept = []
+        
+        with ThreadPoolExecutor(max_workers=50) as executor:
+            verify_futures = {executor.submit(self.verify_host, ip, ports_, False): ip for ip, ports_ in verify_targets.items()}
+            for future, ip in verify_futures.items():
+                try:
+                    verified.append((ip, future.result(timeout=60)))
+                except Exception as e:
+                    logger.warning(f"Verify error for {ip}: {e}")
+            
+            if progress_callback:
+                progress_callback(30, f"Re-verified {len(verify_targets)} known hosts, sweeping {count} addresses")
+            
+            sweep_futures = {executor.submit(self.scan_host, ip, ports, False): ip for ip in sweep_ips}
+            for i, (future, ip) in enumerate(sweep_futures.items()):
+                try:
+                    swept.append((ip, future.result(timeout=30)))
+                except Exception as e:
+                    logger.warning(f"Scan error for {ip}: {e}")
+                    
+                if progress_callback and i % 10 == 0:
+                    progress = 30 + (i / max(count, 1)) * 70
+                    progress_callback(progress, f"Sweeping {ip}")
+        
+        devices = [device for _, device in verified + swept if device]
+        self.enrich_with_snmp(devices)
+        self.score_devices(devices)
+        
+        current = {}
+        for ip, device in verified:
+            current[ip] = HostStateStore.state_from_device(device, previous.get(ip), now)
+        for ip, device in swept:
+            # Silent addresses are only tracked if we knew them before
+            if device or ip in previous:
+                current[ip] = HostStateStore.state_from_device(device, previous.get(ip), now)
+        
+        probed = set(current)
+        diff = diff_host_states(previous, current, probed)
+        state_store.record(current)
+        # Only now is the slice done; a run that dies earlier sweeps it again next time
+        state_store.commit_sweep_window(ip_range, total_hosts, start, count)
+        
+        stats = {
+            'known_hosts': len(previous),
+            'reverified': len(verify_targets),
+            'swept': count,
+            'sweep_start': start,
+            'range_size': total_hosts,
+            'rotation_rate': rotation_rate,
+            'diff': diff
+        }
+        return devices, stats
+
     def geolocate_device(self, ip_address: str) -> Optional[Dict[str, Any]]:
         """Geolocate device using multiple IP geolocation services"""
         location_data = {}
@@ -510,11 +758,28 @@ class AdvancedMinerDetector:
         return {'city': closest_city, 'distance_km': min_distance}
 
 # Main detection function to be called from Node.js
-def detect_miners(scan_config: Dict[str, Any]) -> Dict[str, Any]:
-    """Main function to detect miners based on scan configuration"""
-    detector = AdvancedMinerDetector()
+def detect_miners(scan_config: Dict[str, Any],
+                  emit: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> Dict[str, Any]:
+    """Main function to detect miners based on scan configuration
+
+    With emit, finished devices are handed over in batches of scan_config['emit_batches']
+    instead of being collected in results['detected_devices']. A full sweep produces
+    those batches while it is still probing; an incremental scan only once it is done.
+    """
+    telemetry_db = scan_config.get('telemetry_db')
+    detector = AdvancedMinerDetector(telemetry=TelemetryStore(telemetry_db) if telemetry_db else None,
+                                     snmp=scan_config.get('snmp', True),
+                                     snmp_communities=scan_config.get('snmp_communities'))
+    # Optional offline-trained batch classifier; scans run without it when no model file exists
+    classifier = load_classifier(scan_config.get('classifier_model'))
+    finishing = None
     
     try:
+        # Rate envelope shared by every engine in this process: rate, subnet_rate, upstreams, ...
+        # A bad envelope fails the scan session like any other error
+        if scan_config.get('pacing') and detector.probes.pacer:
+            detector.probes.pacer.configure(**scan_config['pacing'])
+        
         ip_range = scan_config.get('ip_range', '192.168.1.0/24')
         ports = scan_config.get('ports', [22, 80, 443, 4028, 8080, 9999, 3333, 4444])
         
@@ -538,31 +803,89 @@ def detect_miners(scan_config: Dict[str, Any]) -> Dict[str, Any]:
             # This could be sent via WebSocket in real implementation
             logger.info(f"Progress: {progress:.1f}% - {message}")
         
-        # Perform scan
-        devices = detector.scan_network_range(ip_range, ports, progress_callback)
+        batch_size = max(1, int(scan_config.get('emit_batches') or 500))
         
-        for device in devices:
-            results['total_devices'] += 1
-            
-            # Add geolocation data
-            if device['ip_address']:
-                geo_data = detector.geolocate_device(device['ip_address'])
-                device['geolocation'] = geo_data
+        def finish(devices):
+            """Classify, geolocate and hand over one batch of scored devices"""
+            if classifier:
+                classifier.annotate(devices)
+            for device in devices:
+                results['total_devices'] += 1
                 
-            # Determine threat level
-            detection = device.get('detection_results')
-            if detection and detection.get('is_miner'):
-                device['threat_level'] = 'high'
-                results['miners_found'] += 1
-            elif detection and detection.get('confidence_score', 0) > 40:
-                device['threat_level'] = 'medium'
+                # Add geolocation data
+                if device['ip_address']:
+                    geo_data = detector.geolocate_device(device['ip_address'])
+                    device['geolocation'] = geo_data
+                    
+                # Determine threat level
+                device['threat_level'] = detector.scorer.threat_level(device.get('detection_results'))
+                if device['threat_level'] == 'high':
+                    results['miners_found'] += 1
+            
+            if emit:
+                emit(devices)
             else:
-                device['threat_level'] = 'low'
-                
-            results['detected_devices'].append(device)
+                results['detected_devices'].extend(devices)
+        
+        # Batches are finished on one thread in arrival order, so geolocation
+        # lookups never hold up probing and emit is never called concurrently
+        finishing = ThreadPoolExecutor(max_workers=1)
+        handed_over = []
+        
+        # Perform scan
+        checkpoint = None
+        if scan_config.get('incremental'):
+            state_store = HostStateStore(scan_config.get('state_db', 'scan_state.db'))
+            devices, incremental_stats = detector.incremental_scan(
+                ip_range, ports, state_store,
+                rotation_rate=float(scan_config.get('rotation_rate', 0.1)),
+                progress_callback=progress_callback
+            )
+            results['scan_session']['mode'] = 'incremental'
+            results['scan_session']['incremental'] = {k: v for k, v in incremental_stats.items() if k != 'diff'}
+            results['diff'] = incremental_stats['diff']
+            for i in range(0, len(devices), batch_size):
+                handed_over.append(finishing.submit(finish, devices[i:i + batch_size]))
+        else:
+            checkpoint_db = scan_config.get('checkpoint')
+            if checkpoint_db:
+                checkpoint = ScanCheckpoint(checkpoint_db if isinstance(checkpoint_db, str) else 'scan_checkpoint.db',
+                                            float(scan_config.get('checkpoint_interval', 2.0)))
+            shard = scan_config.get('shard')
+            detector.scan_network_range(ip_range, ports, progress_callback,
+                                        exclude=scan_config.get('exclude'),
+                                        seed=scan_config.get('seed'),
+                                        shard=int(shard) if shard is not None else None,
+                                        shards=int(scan_config.get('shards', 1)),
+                                        checkpoint=checkpoint,
+                                        on_devices=lambda devices: handed_over.append(
+                                            finishing.submit(finish, devices)),
+                                        batch_size=batch_size)
+        
+        finishing.shutdown(wait=True)
+        for future in handed_over:
+            # Surfaces a failed emit (e.g. the reader went away) as a failed scan
+            future.result()
+        
+        if checkpoint:
+            # Results have been handed over; the next sweep of this range starts fresh. An
+            # interrupted sweep keeps its checkpoint so that running it again resumes.
+            shards = int(scan_config.get('shards', 1))
+            key = sweep_key(ip_range, scan_config.get('exclude'), ports, shards)
+            swept = {int(shard)} if shard is not None else set(range(shards))
+            if swept <= checkpoint.finished_shards(key):
+                if len(swept) == shards:
+                    checkpoint.clear(key)
+                else:
+                    # Only reset: the row keeps the seed that the other shards depend on
+                    checkpoint.clear(key, swept)
             
         results['scan_session']['end_time'] = datetime.now().isoformat()
         results['scan_session']['status'] = 'completed'
+        results['scan_session']['probe_timing'] = detector.probes.metadata()
+        results['scan_session']['probe_pacing'] = detector.probes.pacing_metadata()
+        results['scan_session']['scoring_model'] = detector.scorer.model.version
+        results['scan_session']['classifier'] = classifier.version if classifier else None
         
         return results
         
@@ -578,13 +901,36 @@ def detect_miners(scan_config: Dict[str, Any]) -> Dict[str, Any]:
             'miners_found': 0,
             'total_devices': 0
         }
+    finally:
+        if finishing:
+            finishing.shutdown(wait=False)
+        detector.close()
 
 if __name__ == "__main__":
-    # Test configuration
-    test_config = {
-        'ip_range': '192.168.1.0/24',
-        'ports': [22, 80, 443, 4028, 8080, 9999]
-    }
+    import sys
     
-    results = detect_miners(test_config)
-    print(json.dumps(results, indent=2, ensure_ascii=False))
+    # Scan configuration is piped in by routes.ts; fall back to a local test range
+    if not sys.stdin.isatty():
+        test_config = json.loads(sys.stdin.read() or '{}')
+    else:
+        test_config = {
+            'ip_range': '192.168.1.0/24',
+            'ports': [22, 80, 443, 4028, 8080, 9999]
+        }
+    
+    if test_config.get('output') == 'binary':
+        # Length-prefixed columnar frames (shared/resultSchema.json), decoded by server/resultCodec.ts
+        from resultCodec import encode_devices, encode_result, write_frame
+        
+        results = detect_miners(test_config, lambda devices: write_frame(sys.stdout.buffer, encode_devices(devices)))
+        write_frame(sys.stdout.buffer, encode_result(results))
+    elif test_config.get('emit_batches'):
+        # One JSON object per line: device batches as they finish, then the summary
+        def emit_batch(devices):
+            print(json.dumps({'type': 'devices', 'devices': devices}, ensure_ascii=False, default=str), flush=True)
+        
+        results = detect_miners(test_config, emit_batch)
+        print(json.dumps({'type': 'result', **results}, ensure_ascii=False, default=str), flush=True)
+    else:
+        results = detect_miners(test_config)
+        print(json.dumps(results, indent=2, ensure_ascii=False, default=str))
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fake miner fleet for benchmarking the detection pipeline
+
+Every emulated device binds its own loopback address (Linux answers the
+whole 127.0.0.0/8 block on lo, so no interface aliases are required) and
+can expose any mix of:
+  - a CGMiner/BMminer JSON API on 4028 (summary, stats, pools, devs,
+    including the cmd1+cmd2 batched form)
+  - an Antminer or Whatsminer style web UI on 8080
+  - a stratum endpoint on 3333 that answers mining.subscribe
+Devices can also be silent (accept and never answer) or dark (no
+listeners). Each device has configurable response latency and loss.
+"""
+
+import asyncio
+import hashlib
+import ipaddress
+import json
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Device profiles: which services a device runs and whether it counts as a miner
+DEVICE_PROFILES = {
+    'antminer': {'services': ['cgminer', 'web_antminer'], 'is_miner': True, 'model': 'Antminer S19', 'software': 'bmminer'},
+    'whatsminer': {'services': ['cgminer', 'web_whatsminer'], 'is_miner': True, 'model': 'WhatsMiner M30S', 'software': 'btminer'},
+    'cgminer': {'services': ['cgminer'], 'is_miner': True, 'model': 'Avalon 1246', 'software': 'cgminer'},
+    'stratum_proxy': {'services': ['stratum'], 'is_miner': True, 'model': 'Stratum Proxy', 'software': 'stratum'},
+    'router': {'services': ['web_router'], 'is_miner': False, 'model': 'Home Router', 'software': None},
+    'silent': {'services': ['silent'], 'is_miner': False, 'model': None, 'software': None},
+    'dark': {'services': [], 'is_miner': False, 'model': None, 'software': None}
+}
+
+SERVICE_PORTS = {
+    'cgminer': 4028,
+    'web_antminer': 8080,
+    'web_whatsminer': 8080,
+    'web_router': 8080,
+    'stratum': 3333,
+    'silent': 4028
+}
+
+DEFAULT_MIX = {'antminer': 0.3, 'whatsminer': 0.1, 'cgminer': 0.05, 'stratum_proxy': 0.05,
+               'router': 0.2, 'silent': 0.1, 'dark': 0.2}
+
+class EmulatedDevice:
+    def __init__(self, ip: str, profile: str, latency: float = 0.0, loss: float = 0.0,
+                 hashrate_ghs: Optional[float] = None, seed: Optional[int] = None):
+        self.ip = ip
+        self.profile = profile
+        self.latency = latency
+        self.loss = loss
+        self.random = random.Random(seed if seed is not None else ip)
+        self.hashrate_ghs = hashrate_ghs if hashrate_ghs is not None else self.random.uniform(80000, 110000)
+        self.started_at = time.time()
+        self.connections = 0
+        self.requests = 0
+
+    @property
+    def spec(self) -> Dict[str, Any]:
+        return DEVICE_PROFILES[self.profile]
+
+    @property
+    def is_miner(self) -> bool:
+        return self.spec['is_miner']
+
+    def ports(self) -> List[int]:
+        return sorted({SERVICE_PORTS[service] for service in self.spec['services']})
+
+    # ── CGMiner API ─────────────────────────────────────────────────────────
+    def cgminer_response(self, command: str) -> bytes:
+        commands = [c for c in command.split('+') if c]
+        if len(commands) == 1:
+            body = self._cgminer_command(commands[0])
+        else:
+            # Batched form: one top-level key per command, each wrapping a single reply
+            body = {c: [self._cgminer_command(c)] for c in commands}
+            body['id'] = 1
+        return json.dumps(body).encode() + b'\x00'
+
+    def _cgminer_command(self, command: str) -> Dict[str, Any]:
+        now = int(time.time())
+        elapsed = now - int(self.started_at)
+        rate = self.hashrate_ghs * self.random.uniform(0.97, 1.03)
+        description = f"{self.spec['software']} 1.0.0"
+
+        def status(code: int, msg: str) -> List[Dict[str, Any]]:
+            return [{'STATUS': 'S', 'When': now, 'Code': code, 'Msg': msg, 'Description': description}]
+
+        if command == 'summary':
+            return {'STATUS': status(11, 'Summary'), 'SUMMARY': [{
+                'Elapsed': elapsed, 'GHS 5s': round(rate, 2), 'GHS av': round(self.hashrate_ghs, 2),
+                'Found Blocks': 0, 'Accepted': elapsed // 3, 'Rejected': elapsed // 300,
+                'Hardware Errors': 0, 'Best Share': 1234567
+            }], 'id': 1}
+        if command == 'stats':
+            temps = [round(self.random.uniform(55, 80), 1) for _ in range(3)]
+            return {'STATUS': status(70, 'CGMiner stats'), 'STATS': [
+                {'BMMiner': '1.0.0', 'Miner': '49.0.1.3', 'CompileTime': 'Thu Jan 1 00:00:00 CST 2025',
+                 'Type': self.spec['model']},
+                {'STATS': 0, 'ID': 'BC50', 'Elapsed': elapsed, 'GHS 5s': round(rate, 2),
+                 'GHS av': round(self.hashrate_ghs, 2), 'fan_num': 4,
+                 'fan1': self.random.randint(5400, 6000), 'fan2': self.random.randint(5400, 6000),
+                 'fan3': self.random.randint(5400, 6000), 'fan4': self.random.randint(5400, 6000),
+                 'temp_num': 3, 'temp1': temps[0], 'temp2': temps[1], 'temp3': temps[2],
+                 'temp2_1': temps[0] + 12, 'temp2_2': temps[1] + 12, 'temp2_3': temps[2] + 12,
+                 'chain_power': f"{round(rate * 0.0325, 1)} W"}
+            ], 'id': 1}
+        if command == 'pools':
+            return {'STATUS': status(7, '1 Pool(s)'), 'POOLS': [{
+                'POOL': 0, 'URL': 'stratum+tcp://btc.f2pool.com:3333', 'Status': 'Alive',
+                'User': 'ilamfarm.001', 'Accepted': elapsed // 3, 'Stratum Active': True
+            }], 'id': 1}
+        if command == 'devs':
+            return {'STATUS': status(9, '3 ASC(s)'), 'DEVS': [
+                {'ASC': i, 'Name': 'BTM', 'Enabled': 'Y', 'Status': 'Alive',
+                 'Temperature': round(self.random.uniform(55, 80), 1), 'MHS 5s': round(rate * 1000 / 3, 2)}
+                for i in range(3)
+            ], 'id': 1}
+        if command == 'version':
+            return {'STATUS': status(22, 'CGMiner versions'), 'VERSION': [{
+                'CGMiner': '4.11.1', 'API': '3.1', 'Type': self.spec['model']
+            }], 'id': 1}
+        return {'STATUS': [{'STATUS': 'E', 'When': now, 'Code': 14, 'Msg': 'Invalid command',
+                            'Description': description}], 'id': 1}
+
+    # ── Web UI ──────────────────────────────────────────────────────────────
+    def http_response(self, path: str) -> bytes:
+        service = next((s for s in self.spec['services'] if s.startswith('web_')), None)
+        if path.startswith('/favicon.ico'):
+            body = hashlib.sha256(f"favicon:{service}".encode()).digest() * 8
+            return self._http(200, body, 'image/x-icon')
+
+        if service == 'web_antminer':
+            body = (f"<html><head><title>{self.spec['model']}</title></head><body>"
+                    "<h1>Bitmain Antminer</h1><div id='hashrate'>Hash Rate</div>"
+                    "<div>Pool 1 Worker ilamfarm.001</div></body></html>")
+            headers = {'Server': 'lighttpd/1.4.32', 'WWW-Authenticate': 'Digest realm="antMiner Configuration"'}
+        elif service == 'web_whatsminer':
+            body = (f"<html><head><title>WhatsMiner</title></head><body>"
+                    f"<h1>{self.spec['model']}</h1><div>MicroBT btminer status</div>"
+                    "<div>hashrate pool worker</div></body></html>")
+            headers = {'Server': 'nginx'}
+        else:
+            body = ("<html><head><title>Router Login</title></head><body>"
+                    "<form>Username Password</form></body></html>")
+            headers = {'Server': 'micro_httpd'}
+        return self._http(200, body.encode(), 'text/html', headers)
+
+    @staticmethod
+    def _http(code: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> bytes:
+        lines = [f"HTTP/1.1 {code} OK", f"Content-Type: {content_type}", f"Content-Length: {len(body)}",
+                 "Connection: close"]
+        lines += [f"{key}: {value}" for key, value in (headers or {}).items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+
+    # ── Stratum ─────────────────────────────────────────────────────────────
+    def stratum_response(self, line: bytes) -> bytes:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return b''
+        if request.get('method') == 'mining.subscribe':
+            result = [[['mining.set_difficulty', 'b4b6693b72a50c7116db18d6497cac52'],
+                       ['mining.notify', 'ae6812eb4cd7735a302a8a9dd95cf71f']], '08000002', 4]
+        elif request.get('method') == 'mining.authorize':
+            result = True
+        else:
+            result = None
+        reply = {'id': request.get('id'), 'result': result, 'error': None}
+        notify = {'id': None, 'method': 'mining.set_difficulty', 'params': [65536]}
+        return (json.dumps(reply) + '\n' + json.dumps(notify) + '\n').encode()
+
+class EmulatorFleet:
+    """Runs a set of emulated devices on an asyncio loop in a background thread"""
+
+    def __init__(self, devices: List[EmulatedDevice]):
+        self.devices = devices
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._servers = []
+        # Writers of connections still open, closed on shutdown
+        self._open = set()
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    @property
+    def miner_ips(self) -> set:
+        return {d.ip for d in self.devices if d.is_miner}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'devices': len(self.devices),
+            'miners': len(self.miner_ips),
+            'connections': sum(d.connections for d in self.devices),
+            'requests': sum(d.requests for d in self.devices)
+        }
+
+    def start(self) -> 'EmulatorFleet':
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+        logger.info(f"Emulator fleet up: {len(self.devices)} devices, {len(self._servers)} listeners")
+        return self
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._start_servers())
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            for server in self._servers:
+                server.close()
+            # Silent devices still hold connections the clients never closed; closing
+            # them lets their handlers see EOF and finish before the loop goes away
+            for writer in list(self._open):
+                writer.close()
+            pending = asyncio.all_tasks(self._loop)
+            if pending:
+                self._loop.run_until_complete(asyncio.wait(pending, timeout=5))
+            self._loop.close()
+
+    async def _start_servers(self):
+        for device in self.devices:
+            for service in device.spec['services']:
+                handler = self._make_handler(device, service)
+                server = await asyncio.start_server(handler, device.ip, SERVICE_PORTS[service], reuse_address=True)
+                self._servers.append(server)
+
+    def _make_handler(self, device: EmulatedDevice, service: str):
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            device.connections += 1
+            self._open.add(writer)
+            try:
+                if service == 'silent' or device.random.random() < device.loss:
+                    # Hold the connection open without answering until the client gives up
+                    while await reader.read(65536):
+                        pass
+                    return
+
+                if service == 'cgminer':
+                    data = await reader.read(65536)
+                    if not data:
+                        return
+                    device.requests += 1
+                    try:
+                        command = json.loads(data.rstrip(b'\x00')).get('command', '')
+                    except ValueError:
+                        command = data.decode(errors='ignore').strip()
+                    response = device.cgminer_response(command)
+                elif service == 'stratum':
+                    line = await reader.readline()
+                    if not line:
+                        return
+                    device.requests += 1
+                    response = device.stratum_response(line)
+                else:
+                    request_line = await reader.readline()
+                    if not request_line:
+                        return
+                    # Drain headers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    device.requests += 1
+                    parts = request_line.decode(errors='ignore').split()
+                    response = device.http_response(parts[1] if len(parts) > 1 else '/')
+
+                if device.latency:
+                    await asyncio.sleep(device.latency)
+                writer.write(response)
+                await writer.drain()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self._open.discard(writer)
+                writer.close()
+        return handle
+
+def build_fleet(count: int, network: str = '127.77.0.0/22', mix: Optional[Dict[str, float]] = None,
+                latency: float = 0.0, latency_jitter: float = 0.0, loss: float = 0.0,
+                seed: int = 1) -> List[EmulatedDevice]:
+    """Assign device profiles to the first `count` host addresses of a loopback network"""
+    net = ipaddress.IPv4Network(network, strict=False)
+    if not net.subnet_of(ipaddress.IPv4Network('127.0.0.0/8')):
+        raise ValueError("Emulator fleets must live inside 127.0.0.0/8")
+    if count > net.num_addresses - 2:
+        raise ValueError(f"{network} cannot hold {count} devices")
+
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    profiles = list(mix.keys())
+    weights = list(mix.values())
+
+    devices = []
+    for i, ip in zip(range(count), net.hosts()):
+        profile = rng.choices(profiles, weights)[0]
+        device_latency = max(0.0, latency + rng.uniform(-latency_jitter, latency_jitter))
+        devices.append(EmulatedDevice(str(ip), profile, device_latency, loss, seed=seed * 100003 + i))
+    return devices
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake miner fleet on loopback addresses")
+    parser.add_argument('--devices', type=int, default=100)
+    parser.add_argument('--network', default='127.77.0.0/22')
+    parser.add_argument('--latency', type=float, default=0.0, help="Response latency in seconds")
+    parser.add_argument('--loss', type=float, default=0.0, help="Probability a request is ignored")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    fleet = EmulatorFleet(build_fleet(args.devices, args.network, latency=args.latency, loss=args.loss))
+    with fleet:
+        print(json.dumps([{'ip': d.ip, 'profile': d.profile, 'ports': d.ports()} for d in fleet.devices], indent=2))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
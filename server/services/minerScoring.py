@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vectorized miner scoring engine
+
+Each host's detection evidence becomes a fixed-width feature vector and a
+whole batch is scored with one matrix product against a weight vector
+loaded from signatures/scoringModel.json. The shipped model keeps the
+original hand-tuned points (web_miner carries no weight of its own), with
+one difference: a miner API answer adds its 95 points to the others
+instead of replacing the score, which only matters below the 100 clip.
+`calibrate` fits a logistic model offline from labelled detections.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'signatures', 'scoringModel.json')
+
+# Column order of every feature matrix
+FEATURE_NAMES = [
+    'mining_ports',       # count of open ports listed in the signature database
+    'api_response',       # a miner API answered with hashrate
+    'web_interface',      # count of web interfaces with miner keywords
+    'web_miner',          # a web interface was identified as a miner
+    'stratum_ports',      # count of open stratum ports
+    'network_analysis',   # live connections to pool ports
+    'snmp_miner'          # the SNMP agent identified a miner vendor
+]
+
+class ScoringModel:
+    def __init__(self, weights: List[float], bias: float = 0.0, link: str = 'identity',
+                 thresholds: Optional[Dict[str, float]] = None, version: str = 'unknown'):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.link = link
+        self.thresholds = {'miner': 70.0, 'suspicious': 40.0, 'power': 50.0, **(thresholds or {})}
+        self.version = version
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ScoringModel':
+        weights = data['weights']
+        missing = [name for name in FEATURE_NAMES if name not in weights]
+        if missing:
+            raise ValueError(f"Scoring model has no weights for {missing}")
+        return cls([weights[name] for name in FEATURE_NAMES], data.get('bias', 0.0),
+                   data.get('link', 'identity'), data.get('thresholds'), data.get('version', 'unknown'))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'link': self.link,
+            'bias': self.bias,
+            'weights': dict(zip(FEATURE_NAMES, self.weights.round(6).tolist())),
+            'thresholds': self.thresholds
+        }
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+def load_scoring_model(path: str = MODEL_PATH) -> ScoringModel:
+    with open(path, encoding='utf-8') as f:
+        return ScoringModel.from_dict(json.load(f))
+
+def empty_features() -> Dict[str, float]:
+    return dict.fromkeys(FEATURE_NAMES, 0)
+
+def feature_matrix(detections: Iterable[Dict[str, Any]]) -> np.ndarray:
+    """Stack the 'features' dicts of detection results into an (n, width) matrix"""
+    rows = [[(d.get('features') or {}).get(name, 0) for name in FEATURE_NAMES] for d in detections]
+    return np.asarray(rows, dtype=np.float64).reshape(len(rows), len(FEATURE_NAMES))
+
+class ScoringEngine:
+    def __init__(self, model: Optional[ScoringModel] = None):
+        self.model = model or load_scoring_model()
+
+    def score_batch(self, features: np.ndarray) -> np.ndarray:
+        """Scores in [0, 100] for an (n, width) feature matrix"""
+        z = features @ self.model.weights + self.model.bias
+        if self.model.link == 'logistic':
+            return 100.0 / (1.0 + np.exp(-z))
+        return np.clip(z, 0.0, 100.0)
+
+    def apply(self, detections: List[Dict[str, Any]]) -> np.ndarray:
+        """Score detection results in place and set their classification fields"""
+        if not detections:
+            return np.zeros(0)
+
+        scores = self.score_batch(feature_matrix(detections))
+        thresholds = self.model.thresholds
+        for detection, score in zip(detections, scores.tolist()):
+            detection['confidence_score'] = int(round(score))
+            detection['scoring_model'] = self.model.version
+            # Direct API or web identification stays authoritative
+            if score >= thresholds['miner']:
+                detection['is_miner'] = True
+            elif score >= thresholds['suspicious'] and not detection['is_miner']:
+                detection['device_type'] = 'suspicious'
+        return scores
+
+    def threat_level(self, detection: Optional[Dict[str, Any]]) -> str:
+        if detection and detection.get('is_miner'):
+            return 'high'
+        if detection and detection.get('confidence_score', 0) > self.model.thresholds['suspicious']:
+            return 'medium'
+        return 'low'
+
+def calibrate(features: np.ndarray, labels: np.ndarray, l2: float = 1e-3, epochs: int = 2000,
+              learning_rate: float = 0.5, version: str = 'calibrated') -> ScoringModel:
+    """Fit a logistic scoring model by full-batch gradient descent on labelled feature vectors"""
+    labels = labels.astype(np.float64)
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0)
+    scale[scale == 0] = 1.0
+    x = (features - mean) / scale
+
+    weights = np.zeros(x.shape[1])
+    bias = 0.0
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(x @ weights + bias)))
+        error = p - labels
+        weights -= learning_rate * (x.T @ error / len(labels) + l2 * weights)
+        bias -= learning_rate * error.mean()
+
+    # Fold the standardisation back so the model scores raw feature vectors
+    raw_weights = weights / scale
+    raw_bias = bias - float(mean @ raw_weights)
+    return ScoringModel(raw_weights.tolist(), raw_bias, 'logistic', version=version)
+
+def _load_labelled(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """JSON lines of {"features": {...}, "label": 0|1} or detection results with a label"""
+    detections, labels = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                detections.append(row.get('detection_results', row))
+                labels.append(int(row['label']))
+    return feature_matrix(detections), np.asarray(labels)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline calibration of the miner scoring model")
+    parser.add_argument('labelled', help="JSON lines with features and a 0/1 label")
+    parser.add_argument('--out', default=MODEL_PATH)
+    parser.add_argument('--version', default='calibrated')
+    parser.add_argument('--l2', type=float, default=1e-3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    X, y = _load_labelled(args.labelled)
+    model = calibrate(X, y, l2=args.l2, version=args.version)
+    predicted = ScoringEngine(model).score_batch(X) >= model.thresholds['miner']
+    logger.info(f"Calibrated on {len(y)} hosts, training accuracy {np.mean(predicted == y.astype(bool)):.3f}")
+    model.save(args.out)
+    print(json.dumps(model.to_dict(), indent=2))
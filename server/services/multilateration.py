@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vectorized multilateration
+
+Locates many devices at once from range estimates to surveyed anchor
+points (WiFi access points, RF receivers). Anchors are projected onto a
+local tangent plane around each device's anchor centroid, a closed-form
+linearised least-squares fix seeds a few batched Gauss-Newton steps, and
+each range is weighted by the variance implied by its RSSI spread. All
+devices are solved together over padded (devices, anchors) NumPy arrays.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# WGS84 ellipsoid
+_A = 6378137.0
+_E2 = 6.69437999014e-3
+
+# Ranges closer than this are treated as this far, so weights stay finite
+MIN_RANGE = 1.0
+# Normal matrices with det below this fraction of trace^2 have no 2D fix
+MIN_CONDITION = 1e-9
+
+class LocalTangentPlane:
+    """East/north metres around per-device origins; accurate to well under a metre within tens of km"""
+
+    def __init__(self, lat0: np.ndarray, lon0: np.ndarray):
+        self.lat0 = np.asarray(lat0, dtype=np.float64)
+        self.lon0 = np.asarray(lon0, dtype=np.float64)
+        phi = np.radians(self.lat0)
+        w = 1.0 - _E2 * np.sin(phi) ** 2
+        # Meridional and prime-vertical radii of curvature at the origin
+        self.m_per_rad_lat = _A * (1.0 - _E2) / w ** 1.5
+        self.m_per_rad_lon = _A / np.sqrt(w) * np.cos(phi)
+
+    def to_enu(self, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Broadcasts lat/lon of shape (n, k) against origins of shape (n,)"""
+        east = np.radians(lon - self.lon0[..., None]) * self.m_per_rad_lon[..., None]
+        north = np.radians(lat - self.lat0[..., None]) * self.m_per_rad_lat[..., None]
+        return east, north
+
+    def to_geodetic(self, east: np.ndarray, north: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return (self.lat0 + np.degrees(north / self.m_per_rad_lat),
+                self.lon0 + np.degrees(east / self.m_per_rad_lon))
+
+def weights_from_rssi(distances: np.ndarray, rssi_std: np.ndarray, path_loss_exponent: float = 2.0) -> np.ndarray:
+    """Inverse range variance under the log-distance model: sigma_d = d * ln(10) / (10 n) * sigma_rssi"""
+    sigma = np.maximum(distances, MIN_RANGE) * np.log(10.0) / (10.0 * path_loss_exponent) * np.maximum(rssi_std, 0.5)
+    return 1.0 / sigma ** 2
+
+def _solve_2x2(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Closed-form solve of n stacked 2x2 systems; returns (solution, determinant)"""
+    det = a[:, 0, 0] * a[:, 1, 1] - a[:, 0, 1] * a[:, 1, 0]
+    safe = np.where(np.abs(det) > 1e-12, det, np.nan)
+    x = (a[:, 1, 1] * b[:, 0] - a[:, 0, 1] * b[:, 1]) / safe
+    y = (a[:, 0, 0] * b[:, 1] - a[:, 1, 0] * b[:, 0]) / safe
+    return np.stack([x, y], axis=1), det
+
+def multilaterate(lat: np.ndarray, lon: np.ndarray, distances: np.ndarray, weights: Optional[np.ndarray] = None,
+                  iterations: int = 5, huber: float = 1.5) -> Dict[str, np.ndarray]:
+    """
+    Batch position fixes from (n, k) anchor coordinates and ranges in metres.
+
+    Rows are padded with NaN where a device has fewer than k anchors. Devices
+    with fewer than three usable anchors, or whose anchors leave the final
+    normal matrix singular (all on one line through the fix), get NaN positions.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    d = np.asarray(distances, dtype=np.float64)
+    valid = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(d)
+    w = np.ones_like(d) if weights is None else np.asarray(weights, dtype=np.float64).copy()
+    w = np.where(valid & np.isfinite(w), w, 0.0)
+    counts = valid.sum(axis=1)
+
+    # Tangent plane at each device's weighted anchor centroid
+    wsum = np.maximum(w.sum(axis=1), 1e-300)
+    origin_lat = np.nansum(np.where(valid, lat, 0.0) * w, axis=1) / wsum
+    origin_lon = np.nansum(np.where(valid, lon, 0.0) * w, axis=1) / wsum
+    plane = LocalTangentPlane(origin_lat, origin_lon)
+    ax, ay = plane.to_enu(np.where(valid, lat, origin_lat[:, None]), np.where(valid, lon, origin_lon[:, None]))
+    d = np.where(valid, d, 0.0)
+
+    # Linearised fix: subtracting the weighted mean range equation removes the quadratic term
+    wn = w / wsum[:, None]
+    mx, my = (wn * ax).sum(axis=1), (wn * ay).sum(axis=1)
+    c = ax ** 2 + ay ** 2 - d ** 2
+    mc = (wn * c).sum(axis=1)
+    gx, gy = 2.0 * (ax - mx[:, None]), 2.0 * (ay - my[:, None])
+    h = c - mc[:, None]
+    normal = np.stack([np.stack([(w * gx * gx).sum(1), (w * gx * gy).sum(1)], 1),
+                       np.stack([(w * gx * gy).sum(1), (w * gy * gy).sum(1)], 1)], 1)
+    rhs = np.stack([(w * gx * h).sum(1), (w * gy * h).sum(1)], 1)
+    position, det = _solve_2x2(normal, rhs)
+    conditioned = det > MIN_CONDITION * (normal[:, 0, 0] + normal[:, 1, 1]) ** 2
+    # Collinear anchors leave the linear system singular; start those at the centroid
+    position = np.where(np.isfinite(position), position, 0.0)
+
+    # Gauss-Newton on the true range residuals; with RSSI-derived weights each
+    # range has a known sigma, so outliers beyond huber sigmas are downweighted
+    sigma = 1.0 / np.sqrt(np.maximum(w, 1e-300))
+    robust = w
+    for _ in range(iterations):
+        dx = position[:, 0:1] - ax
+        dy = position[:, 1:2] - ay
+        rng = np.maximum(np.hypot(dx, dy), 1e-6)
+        residual = np.where(valid, rng - d, 0.0)
+        if weights is not None and huber:
+            scaled = np.abs(residual) / sigma
+            robust = w * np.where(scaled <= huber, 1.0, huber / np.maximum(scaled, 1e-12))
+        jx, jy = dx / rng, dy / rng
+        normal = np.stack([np.stack([(robust * jx * jx).sum(1), (robust * jx * jy).sum(1)], 1),
+                           np.stack([(robust * jx * jy).sum(1), (robust * jy * jy).sum(1)], 1)], 1)
+        # Judged before damping, which alone keeps a collinear fix's determinant positive
+        det = normal[:, 0, 0] * normal[:, 1, 1] - normal[:, 0, 1] * normal[:, 1, 0]
+        conditioned = det > MIN_CONDITION * (normal[:, 0, 0] + normal[:, 1, 1]) ** 2
+        # Small Levenberg damping keeps near-degenerate geometry from diverging
+        damping = 1e-9 * (normal[:, 0, 0] + normal[:, 1, 1])
+        normal[:, 0, 0] += damping
+        normal[:, 1, 1] += damping
+        step, _ = _solve_2x2(normal, -np.stack([(robust * jx * residual).sum(1), (robust * jy * residual).sum(1)], 1))
+        position = position + np.where(np.isfinite(step), step, 0.0)
+
+    dx = position[:, 0:1] - ax
+    dy = position[:, 1:2] - ay
+    residual = np.where(valid, np.hypot(dx, dy) - d, 0.0)
+    rms = np.sqrt((residual ** 2).sum(axis=1) / np.maximum(counts, 1))
+
+    # 1-sigma horizontal uncertainty from the inverse normal matrix
+    det = normal[:, 0, 0] * normal[:, 1, 1] - normal[:, 0, 1] * normal[:, 1, 0]
+    trace_cov = (normal[:, 0, 0] + normal[:, 1, 1]) / np.where(det > 0, det, np.nan)
+    accuracy = np.sqrt(trace_cov)
+    if weights is None:
+        # Unweighted ranges carry no variance; scale by the fit's own residuals
+        accuracy = accuracy * rms * np.sqrt(counts / np.maximum(counts - 2, 1))
+
+    out_lat, out_lon = plane.to_geodetic(position[:, 0], position[:, 1])
+    solvable = (counts >= 3) & conditioned
+    nan = np.full(len(counts), np.nan)
+    return {
+        'lat': np.where(solvable, out_lat, nan),
+        'lon': np.where(solvable, out_lon, nan),
+        'rms_m': np.where(solvable, rms, nan),
+        'accuracy_m': np.where(solvable, accuracy, nan),
+        'anchors': counts
+    }
+
+def pack_observations(observations: List[List[Dict[str, Any]]], path_loss_exponent: float = 2.0) -> Tuple[np.ndarray, ...]:
+    """Pad per-device point lists ({'lat', 'lon', 'distance'[, 'rssi_std']}) into (n, k) arrays"""
+    width = max((len(points) for points in observations), default=0)
+    shape = (len(observations), max(width, 1))
+    lat, lon, dist = np.full(shape, np.nan), np.full(shape, np.nan), np.full(shape, np.nan)
+    rssi_std = np.full(shape, np.nan)
+    for row, points in enumerate(observations):
+        for col, point in enumerate(points):
+            lat[row, col] = point['lat']
+            lon[row, col] = point['lon']
+            dist[row, col] = point['distance']
+            rssi_std[row, col] = point.get('rssi_std', np.nan)
+    has_std = np.isfinite(rssi_std)
+    weights = None
+    if has_std.any():
+        # Points without a spread get the median weight of their batch
+        weights = weights_from_rssi(dist, np.where(has_std, rssi_std, 0.0), path_loss_exponent)
+        weights = np.where(has_std, weights, np.nanmedian(np.where(has_std, weights, np.nan)))
+    return lat, lon, dist, weights
+
+def locate_devices(observations: Dict[str, List[Dict[str, Any]]], path_loss_exponent: float = 2.0,
+                   iterations: int = 5) -> Dict[str, Optional[Dict[str, float]]]:
+    """Position fix for every device id in one batch; None where fewer than three anchors"""
+    ids = list(observations)
+    lat, lon, dist, weights = pack_observations([observations[i] for i in ids], path_loss_exponent)
+    fixes = multilaterate(lat, lon, dist, weights, iterations)
+    results = {}
+    for row, device_id in enumerate(ids):
+        if not np.isfinite(fixes['lat'][row]):
+            results[device_id] = None
+            continue
+        results[device_id] = {
+            'lat': float(fixes['lat'][row]),
+            'lon': float(fixes['lon'][row]),
+            'accuracy_m': float(fixes['accuracy_m'][row]) if np.isfinite(fixes['accuracy_m'][row]) else None,
+            'rms_m': float(fixes['rms_m'][row]),
+            'anchors': int(fixes['anchors'][row])
+        }
+    return results
+
+def triangulate_position(points: List[Dict[str, Any]]) -> Optional[Dict[str, float]]:
+    """Single-device fix from WiFi/RF points with 'lat', 'lon' and 'distance' in metres"""
+    if len(points) < 3:
+        return None
+    return locate_devices({'device': points})['device']
+
+if __name__ == "__main__":
+    import sys
+
+    # {"device_id": [{"lat": .., "lon": .., "distance": .., "rssi_std": ..}, ...], ...} on stdin
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    print(json.dumps(locate_devices(json.load(sys.stdin)), indent=2, ensure_ascii=False))
@@ -13,18 +13,28 @@ import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Callable
+from typing import Any, Dict, List, Optional, Callable
 
 import psutil
 import scapy.all as scapy
 from scapy.layers.l2 import ARP, Ether
 
+from probeControl import ProbeController, controller as default_probe_controller
+from scanStore import ScanResultStore
+from signatureDb import SignatureDatabase, signature_db
+
 logger = logging.getLogger(__name__)
 
+# Number of host rows buffered before they are flushed to the result store
+RESULT_BATCH_SIZE = 256
+
 class NetworkScanner:
-    def __init__(self):
+    def __init__(self, store: Optional[ScanResultStore] = None, probes: Optional[ProbeController] = None,
+                 signatures: Optional[SignatureDatabase] = None):
         self.active_scans = {}
-        self.scan_results = {}
+        self.store = store or ScanResultStore()
+        self.probes = probes or default_probe_controller
+        self.signatures = signatures or signature_db
         
     def discover_local_networks(self) -> List[str]:
         """Discover local network ranges"""
@@ -44,27 +54,23 @@ class NetworkScanner:
             
         return networks
     
-    def fast_port_scan(self, ip: str, ports: List[int], timeout: float = 1.0) -> List[int]:
-        """Fast TCP port scanner"""
+    def fast_port_scan(self, ip: str, ports: List[int]) -> List[int]:
+        """Fast TCP port scanner using adaptive per-subnet timeouts"""
         open_ports = []
         
         def scan_port(port):
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(timeout)
-                result = sock.connect_ex((ip, port))
-                sock.close()
-                if result == 0:
-                    return port
-            except Exception:
-                pass
+            if self.probes.is_open(ip, port):
+                return port
             return None
         
+        # Worst case for one probe: every retry at the maximum timeout
+        wait = self.probes.max_timeout * (self.probes.max_retries + 1) + 1
+        
         with ThreadPoolExecutor(max_workers=100) as executor:
             futures = [executor.submit(scan_port, port) for port in ports]
             for future in futures:
                 try:
-                    result = future.result(timeout=timeout + 1)
+                    result = future.result(timeout=wait)
                     if result:
                         open_ports.append(result)
                 except Exception:
@@ -99,20 +105,8 @@ class NetworkScanner:
         return devices
     
     def _get_vendor_from_mac(self, mac: str) -> str:
-        """Get vendor from MAC address (simplified)"""
-        # This would typically use a MAC vendor database
-        # For now, return basic identification
-        oui = mac[:8].upper().replace(':', '')
-        
-        known_vendors = {
-            '00:1B:44': 'Bitmain Technologies',
-            '00:0C:43': 'Microchip Technology',
-            '00:07:32': 'Micro-Star International',
-            '00:1E:C9': 'ASUSTEK Computer',
-            '00:24:8C': 'NVIDIA Corporation'
-        }
-        
-        return known_vendors.get(oui[:6], 'Unknown')
+        """Get vendor from the MAC address OUI"""
+        return self.signatures.current().mac_vendor(mac) or 'Unknown'
     
     def monitor_network_traffic(self, interface: str = None, duration: int = 60) -> Dict[str, Any]:
         """Monitor network traffic for mining patterns"""
@@ -123,13 +117,10 @@ class NetworkScanner:
             'mining_pool_connections': []
         }
         
-        # Known mining pool domains/IPs
-        mining_pools = [
-            'pool.nanopool.org', 'eth-us-east1.nanopool.org',
-            'us1.ethermine.org', 'eu1.ethermine.org',
-            'xmr-usa-east1.nanopool.org', 'xmr-eu1.nanopool.org',
-            'btc.antpool.com', 'stratum.antpool.com'
-        ]
+        # Known mining pool domains and stratum ports
+        signatures = self.signatures.current()
+        mining_pools = signatures.mining_pools
+        pool_ports = signatures.pool_connection_ports
         
         try:
             def packet_handler(packet):
@@ -143,7 +134,7 @@ class NetworkScanner:
                             dst_port = packet['TCP'].dport
                             
                             # Check for stratum ports
-                            if dst_port in [3333, 4444, 9999, 14444]:
+                            if dst_port in pool_ports:
                                 traffic_data['suspicious_connections'].append({
                                     'src_ip': src_ip,
                                     'dst_ip': dst_ip,
@@ -170,7 +161,7 @@ class NetworkScanner:
     def scan_network_async(self, network: str, ports: List[int], 
                           progress_callback: Optional[Callable] = None) -> str:
         """Start asynchronous network scan"""
-        scan_id = f"scan_{int(time.time())}"
+        scan_id = self.store.new_scan_id()
         
         def run_scan():
             try:
@@ -183,8 +174,8 @@ class NetworkScanner:
                 if progress_callback:
                     progress_callback(30, f"Found {len(hosts)} hosts, scanning ports...")
                 
-                # Scan ports on each host
-                detailed_results = []
+                # Scan ports on each host, flushing rows to the store in batches
+                batch = []
                 for i, host in enumerate(hosts):
                     ip = host['ip']
                     open_ports = self.fast_port_scan(ip, ports)
@@ -202,43 +193,35 @@ class NetworkScanner:
                     except Exception:
                         host_info['hostname'] = None
                         
-                    detailed_results.append(host_info)
+                    batch.append(host_info)
+                    if len(batch) >= RESULT_BATCH_SIZE:
+                        self.store.append_results(scan_id, batch)
+                        batch = []
                     
                     if progress_callback:
                         progress = 30 + int((i / len(hosts)) * 60)
                         progress_callback(progress, f"Scanning {ip}...")
                 
-                self.scan_results[scan_id] = {
-                    'status': 'completed',
-                    'network': network,
-                    'ports': ports,
-                    'results': detailed_results,
-                    'start_time': self.active_scans[scan_id]['start_time'],
-                    'end_time': datetime.now().isoformat()
-                }
+                self.store.append_results(scan_id, batch)
+                self.store.finish_scan(scan_id, 'completed', extra={'probe_timing': self.probes.metadata(),
+                                                                  'probe_pacing': self.probes.pacing_metadata()})
                 
                 if progress_callback:
                     progress_callback(100, "Scan completed")
                     
             except Exception as e:
                 logger.error(f"Scan error: {e}")
-                self.scan_results[scan_id] = {
-                    'status': 'failed',
-                    'error': str(e),
-                    'start_time': self.active_scans[scan_id]['start_time'],
-                    'end_time': datetime.now().isoformat()
-                }
+                self.store.finish_scan(scan_id, 'failed', str(e))
             finally:
                 if scan_id in self.active_scans:
                     del self.active_scans[scan_id]
         
         # Start scan in background thread
-        self.active_scans[scan_id] = {
-            'status': 'running',
+        self.active_scans[scan_id] = self.store.create_scan(scan_id, {
             'network': network,
             'ports': ports,
             'start_time': datetime.now().isoformat()
-        }
+        })
         
         thread = threading.Thread(target=run_scan)
         thread.daemon = True
@@ -246,14 +229,15 @@ class NetworkScanner:
         
         return scan_id
     
-    def get_scan_status(self, scan_id: str) -> Dict[str, Any]:
-        """Get status of running or completed scan"""
-        if scan_id in self.active_scans:
-            return self.active_scans[scan_id]
-        elif scan_id in self.scan_results:
-            return self.scan_results[scan_id]
-        else:
+    def get_scan_status(self, scan_id: str, offset: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Get status of running or completed scan with one page of its host results"""
+        status = self.store.get_scan(scan_id)
+        if status is None:
             return {'status': 'not_found'}
+        
+        status['offset'] = offset
+        status['results'] = self.store.get_results(scan_id, offset, limit)
+        return status
     
     def get_system_info(self) -> Dict[str, Any]:
         """Get system network information"""
@@ -313,9 +297,9 @@ def start_network_scan(config: Dict[str, Any]) -> str:
     
     return scanner.scan_network_async(network, ports)
 
-def get_scan_results(scan_id: str) -> Dict[str, Any]:
-    """Get results of network scan"""
-    return scanner.get_scan_status(scan_id)
+def get_scan_results(scan_id: str, offset: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Get results of network scan, optionally one page at a time"""
+    return scanner.get_scan_status(scan_id, offset, limit)
 
 def discover_networks() -> List[str]:
     """Discover local networks"""
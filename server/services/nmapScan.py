@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming port discovery
+
+Runs a single nmap process per target set covering every port, reads its
+XML report from stdout (-oX -) with an incremental parser and yields each
+host as soon as nmap finishes it. A run that outlives its deadline is
+killed. Without nmap, a pure-Python connect scanner produces the same
+host records.
+"""
+
+import logging
+import shutil
+import subprocess
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from probeControl import ProbeController, controller as default_probe_controller
+from targetSpace import TargetSpace
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 65536
+# Wall-clock bound on one nmap run, as the old blocking scan had
+NMAP_TIMEOUT = 60.0
+
+def nmap_available() -> bool:
+    return shutil.which('nmap') is not None
+
+def _as_list(targets: Union[str, Iterable[str]]) -> List[str]:
+    return [targets] if isinstance(targets, str) else list(targets)
+
+def _host_record(host: ET.Element) -> Optional[Dict[str, Any]]:
+    """Host record from one <host> element of an nmap XML report"""
+    record = {
+        'ip': None,
+        'mac_address': None,
+        'vendor': None,
+        'hostname': None,
+        'status': None,
+        'ports': [],
+        'source': 'nmap'
+    }
+    status = host.find('status')
+    if status is not None:
+        record['status'] = status.get('state')
+    for address in host.findall('address'):
+        if address.get('addrtype') == 'ipv4':
+            record['ip'] = address.get('addr')
+        elif address.get('addrtype') == 'mac':
+            record['mac_address'] = address.get('addr')
+            record['vendor'] = address.get('vendor')
+    hostname = host.find('hostnames/hostname')
+    if hostname is not None:
+        record['hostname'] = hostname.get('name')
+    for port in host.findall('ports/port'):
+        state = port.find('state')
+        if state is None or state.get('state') != 'open':
+            continue
+        service = port.find('service')
+        record['ports'].append({
+            'port': int(port.get('portid')),
+            'protocol': port.get('protocol'),
+            'service': service.get('name') if service is not None else None,
+            'product': service.get('product') if service is not None else None
+        })
+    return record if record['ip'] else None
+
+def iter_nmap_xml(stream, read_size: int = READ_SIZE) -> Iterator[Dict[str, Any]]:
+    """Parse an nmap XML report incrementally, yielding hosts as their elements close"""
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    root = None
+    while True:
+        chunk = stream.read1(read_size) if hasattr(stream, 'read1') else stream.read(read_size)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == 'start':
+                if root is None:
+                    root = element
+                continue
+            if element.tag == 'host':
+                record = _host_record(element)
+                # Drop finished hosts so memory stays flat on large ranges
+                root.remove(element)
+                if record:
+                    yield record
+    parser.close()
+
+def iter_nmap_hosts(targets: Union[str, Iterable[str]], ports: Iterable[int], timing: int = 4,
+                    extra_args: Optional[List[str]] = None, timeout: Optional[float] = NMAP_TIMEOUT,
+                    probes: Optional[ProbeController] = None) -> Iterator[Dict[str, Any]]:
+    """One nmap run over all targets and ports, streamed host by host"""
+    cmd = ['nmap', '-oX', '-', '--open', f'-T{timing}', '-p', ','.join(str(p) for p in sorted(set(ports)))]
+    cmd += list(extra_args or []) + _as_list(targets)
+
+    with tempfile.TemporaryFile() as stderr:
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+        except OSError as e:
+            logger.warning(f"Cannot run nmap ({e}); using the built-in connect scanner")
+            yield from iter_socket_hosts(targets, ports, probes)
+            return
+        expired = threading.Event()
+
+        def expire():
+            # Killing nmap closes its stdout, which ends the parse loop below
+            expired.set()
+            process.kill()
+
+        watchdog = threading.Timer(timeout, expire) if timeout else None
+        if watchdog:
+            watchdog.daemon = True
+            watchdog.start()
+        try:
+            yield from iter_nmap_xml(process.stdout)
+            code = process.wait()
+            if expired.is_set():
+                logger.error(f"nmap killed after {timeout:.0f}s; results are partial")
+            elif code != 0:
+                stderr.seek(0)
+                logger.error(f"nmap exited with {code}: {stderr.read().decode(errors='ignore').strip()}")
+        except ET.ParseError as e:
+            if expired.is_set():
+                logger.error(f"nmap killed after {timeout:.0f}s; results are partial")
+            else:
+                logger.error(f"Unreadable nmap XML output: {e}")
+        finally:
+            if watchdog:
+                watchdog.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+def iter_socket_hosts(targets: Union[str, Iterable[str]], ports: Iterable[int],
+                      probes: Optional[ProbeController] = None, max_workers: int = 64) -> Iterator[Dict[str, Any]]:
+    """Pure-Python connect scan yielding hosts with at least one open port as they finish"""
+    probes = probes or default_probe_controller
+    ports = sorted(set(ports))
+
+    def scan(ip: str) -> Dict[str, Any]:
+        return {
+            'ip': ip,
+            'mac_address': None,
+            'vendor': None,
+            'hostname': None,
+            'status': 'up',
+            'ports': [{'port': port, 'protocol': 'tcp', 'service': None, 'product': None}
+                      for port in ports if probes.is_open(ip, port)],
+            'source': 'socket'
+        }
+
+    # Randomized order spreads the probes across subnets instead of sweeping one at a time
+    hosts = TargetSpace(_as_list(targets)).shuffled()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Keep a bounded window of hosts in flight instead of submitting the whole range
+        in_flight = set()
+        for ip in hosts:
+            in_flight.add(executor.submit(scan, ip))
+            if len(in_flight) >= max_workers * 4:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record = future.result()
+                    if record['ports']:
+                        yield record
+        for future in in_flight:
+            record = future.result()
+            if record['ports']:
+                yield record
+
+def iter_open_hosts(targets: Union[str, Iterable[str]], ports: Iterable[int], engine: str = 'auto',
+                    probes: Optional[ProbeController] = None, **kwargs) -> Iterator[Dict[str, Any]]:
+    """Hosts with open ports among targets; engine is 'nmap', 'socket' or 'auto'"""
+    if engine == 'nmap' or (engine == 'auto' and nmap_available()):
+        return iter_nmap_hosts(targets, ports, probes=probes, **kwargs)
+    if engine == 'auto':
+        logger.info("nmap not found; using the built-in connect scanner")
+    return iter_socket_hosts(targets, ports, probes)
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Stream hosts with open miner ports as JSON lines")
+    parser.add_argument('targets', nargs='+', help="IP addresses or CIDR ranges")
+    parser.add_argument('--ports', default='4028,3333,4444,5555,4233,8233')
+    parser.add_argument('--engine', choices=['auto', 'nmap', 'socket'], default='auto')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    for host in iter_open_hosts(args.targets, [int(p) for p in args.ports.split(',')], args.engine):
+        print(json.dumps(host), flush=True)
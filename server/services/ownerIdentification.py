@@ -9,7 +9,6 @@ using IP/MAC addresses and official telecommunications records.
 
 import requests
 import json
-import sqlite3
 import re
 import time
 import subprocess
@@ -18,14 +17,21 @@ from typing import Dict, List, Optional, Tuple
 import hashlib
 import os
 
+from registryCache import RegistryCache, parse_rdap_record, parse_whois_record
+from sqlitePool import SqliteDatabase, WriteBehindQueue
+
 class OwnerIdentificationService:
     def __init__(self):
         self.db_path = "owner_identification.db"
+        # Parsed WHOIS records keyed by network block
+        self.registry = RegistryCache()
         
         # Official Iranian telecommunications authorities APIs
         self.tci_api_base = "https://api.tci.ir"  # Iran Telecom Company
         self.tic_api_base = "https://api.tic.gov.ir"  # Telecommunications Infrastructure Company
         self.cra_api_base = "https://api.cra.gov.ir"  # Communications Regulatory Authority
+        # RIPE NCC is the regional registry for Iranian allocations
+        self.rdap_base = "https://rdap.db.ripe.net"
         
         # ISP databases for IP ownership lookup
         self.isp_databases = {
@@ -79,7 +85,9 @@ class OwnerIdentificationService:
         
     def init_database(self):
         """Initialize database for owner identification cache"""
-        conn = sqlite3.connect(self.db_path)
+        # Per-thread WAL connections shared by every lookup
+        self.db = SqliteDatabase(self.db_path)
+        conn = self.db.connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -125,8 +133,18 @@ class OwnerIdentificationService:
             )
         ''')
         
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lookup_log_ip ON lookup_log (ip_address)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lookup_log_timestamp ON lookup_log (timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ip_ownership_verified ON ip_ownership (last_verified)')
+        
         conn.commit()
-        conn.close()
+        
+        # Audit rows are written in batches off the lookup path
+        self.audit_log = WriteBehindQueue(self.db, '''
+            INSERT INTO lookup_log 
+            (timestamp, ip_address, mac_address, lookup_type, success, response_time, error_message)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''')
         
         # Initialize MAC vendor database
         self.update_mac_vendor_database()
@@ -149,8 +167,8 @@ class OwnerIdentificationService:
 
     def parse_oui_database(self, oui_data: str):
         """Parse IEEE OUI database and store vendor information"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        rows = []
+        now = datetime.now().isoformat()
         
         lines = oui_data.split('\n')
         current_oui = None
@@ -167,14 +185,13 @@ class OwnerIdentificationService:
                 # Determine device type based on vendor
                 device_type = self.classify_device_type(vendor)
                 
-                cursor.execute('''
-                    INSERT OR REPLACE INTO mac_vendor_lookup 
-                    (mac_prefix, vendor_name, device_type, last_updated)
-                    VALUES (?, ?, ?, ?)
-                ''', (oui, vendor, device_type, datetime.now().isoformat()))
+                rows.append((oui, vendor, device_type, now))
         
-        conn.commit()
-        conn.close()
+        self.db.executemany('''
+            INSERT OR REPLACE INTO mac_vendor_lookup 
+            (mac_prefix, vendor_name, device_type, last_updated)
+            VALUES (?, ?, ?, ?)
+        ''', rows)
 
     def classify_device_type(self, vendor: str) -> str:
         """Classify device type based on vendor name"""
@@ -262,6 +279,11 @@ class OwnerIdentificationService:
         Uses official Iranian network information centers
         """
         try:
+            # Any address inside an already-seen allocation resolves locally
+            cached_block = self.registry.lookup(ip_address)
+            if cached_block:
+                return cached_block
+            
             # Use IRNIC (Iran Network Information Center) WHOIS
             whois_servers = [
                 'whois.nic.ir',
@@ -283,6 +305,7 @@ class OwnerIdentificationService:
                         parsed_info = self.parse_whois_response(whois_data)
                         
                         if parsed_info:
+                            self.registry.add_whois_response(whois_data, parsed_info, whois_server)
                             return parsed_info
                             
                 except subprocess.TimeoutExpired:
@@ -290,50 +313,42 @@ class OwnerIdentificationService:
                 except Exception as e:
                     continue
             
-            return None
+            # No WHOIS server answered (or no whois binary); ask the registry over RDAP
+            return self.lookup_ip_owner_rdap(ip_address)
             
         except Exception as e:
             self.log_lookup_attempt(ip_address, None, 'whois', False, str(e))
             return None
 
+    def lookup_ip_owner_rdap(self, ip_address: str) -> Optional[Dict]:
+        """Lookup IP ownership over RDAP; the answer is cached for its whole network block"""
+        try:
+            response = requests.get(
+                f"{self.rdap_base}/ip/{ip_address}",
+                headers={'Accept': 'application/rdap+json', 'User-Agent': 'IlamMinerDetection/1.0'},
+                timeout=10
+            )
+            
+            if response.status_code == 200:
+                rdap = response.json()
+                parsed_info = parse_rdap_record(rdap)
+                if parsed_info:
+                    self.registry.add_rdap_response(rdap, parsed_info, self.rdap_base)
+                    return parsed_info
+            
+            return None
+            
+        except Exception as e:
+            self.log_lookup_attempt(ip_address, None, 'rdap', False, str(e))
+            return None
+
     def parse_whois_response(self, whois_data: str) -> Optional[Dict]:
         """Parse WHOIS response to extract owner information"""
-        lines = whois_data.split('\n')
-        info = {}
-        
-        for line in lines:
-            line = line.strip()
-            
-            # Look for common WHOIS fields
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip().lower()
-                value = value.strip()
-                
-                if key in ['person', 'admin-c', 'tech-c']:
-                    info['contact_person'] = value
-                elif key in ['phone', 'tel']:
-                    info['phone'] = value
-                elif key in ['address', 'addr']:
-                    info['address'] = value
-                elif key in ['org', 'organization', 'orgname']:
-                    info['organization'] = value
-                elif key in ['netname', 'netblock-name']:
-                    info['network_name'] = value
-        
-        if info:
-            return {
-                'name': info.get('contact_person', '').split()[0] if info.get('contact_person') else None,
-                'family': ' '.join(info.get('contact_person', '').split()[1:]) if info.get('contact_person') else None,
-                'phone': info.get('phone'),
-                'address': info.get('address'),
-                'organization': info.get('organization'),
-                'network_name': info.get('network_name'),
-                'confidence': 0.7,
-                'source': 'whois_lookup'
-            }
-        
-        return None
+        return parse_whois_record(whois_data)
+
+    def preload_registry_dump(self, dump_path: str) -> int:
+        """Load a bulk RPSL inetnum dump into the network-block cache for offline lookups"""
+        return self.registry.preload_dump(dump_path, self.parse_whois_response)
 
     def lookup_mac_vendor(self, mac_address: str) -> Optional[Dict]:
         """Lookup MAC address vendor and device information"""
@@ -347,17 +362,11 @@ class OwnerIdentificationService:
             
         oui = ':'.join([mac_clean[i:i+2] for i in range(0, 6, 2)]).lower()
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        result = self.db.query_one('''
             SELECT vendor_name, device_type FROM mac_vendor_lookup 
             WHERE mac_prefix = ?
         ''', (oui,))
         
-        result = cursor.fetchone()
-        conn.close()
-        
         if result:
             return {
                 'vendor': result[0],
@@ -570,16 +579,10 @@ class OwnerIdentificationService:
 
     def get_cached_owner_info(self, ip_address: str) -> Optional[Dict]:
         """Get cached owner information"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        result = self.db.query_one('''
             SELECT * FROM ip_ownership WHERE ip_address = ?
         ''', (ip_address,))
         
-        result = cursor.fetchone()
-        conn.close()
-        
         if result:
             return {
                 'name': result[3],
@@ -607,10 +610,7 @@ class OwnerIdentificationService:
 
     def cache_owner_info(self, ip_address: str, mac_address: str, owner_info: Dict, device_info: Dict):
         """Cache owner information in database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self.db.execute('''
             INSERT OR REPLACE INTO ip_ownership 
             (ip_address, mac_address, owner_name, owner_family, phone_number, 
              national_id, address, isp_name, contract_type, registration_date,
@@ -631,21 +631,11 @@ class OwnerIdentificationService:
             owner_info.get('source'),
             owner_info.get('confidence', 0.0)
         ))
-        
-        conn.commit()
-        conn.close()
 
     def log_lookup_attempt(self, ip_address: str, mac_address: str, lookup_type: str, 
                           success: bool, error_message: str = None, response_time: float = None):
-        """Log lookup attempt for audit purposes"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO lookup_log 
-            (timestamp, ip_address, mac_address, lookup_type, success, response_time, error_message)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        """Queue a lookup attempt for the audit log; rows are written in batches"""
+        self.audit_log.put((
             datetime.now().isoformat(),
             ip_address,
             mac_address,
@@ -654,9 +644,6 @@ class OwnerIdentificationService:
             response_time,
             error_message
         ))
-        
-        conn.commit()
-        conn.close()
 
 def main():
     """Main function for command line usage"""
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Calibrated RSSI path-loss models
+
+Fits the log-distance model RSSI = P0 - 10 n log10(d / 1 m) per site and
+band from surveyed reference points, stores the fitted parameters in
+SQLite and keeps them cached in memory. Converting a survey's readings to
+ranges (and the range spread used to weight multilateration) is a single
+array operation.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from sqlitePool import SqliteDatabase
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371008.8
+
+# Physically plausible exponents: free space is 2, dense indoor rarely above 6
+MIN_EXPONENT = 1.5
+MAX_EXPONENT = 6.0
+
+def band_for(frequency_mhz: float) -> str:
+    """Band key for a carrier frequency in MHz"""
+    if 2400 <= frequency_mhz < 2500:
+        return '2.4GHz'
+    if 4900 <= frequency_mhz < 5900:
+        return '5GHz'
+    if 5900 <= frequency_mhz < 7200:
+        return '6GHz'
+    return f"{int(round(frequency_mhz))}MHz"
+
+class PathLossModel:
+    def __init__(self, p0: float, exponent: float, sigma: float, site: str = 'default', band: str = 'any',
+                 samples: int = 0, fitted_at: Optional[float] = None):
+        self.p0 = float(p0)               # RSSI at 1 m, dBm
+        self.exponent = float(exponent)   # path-loss exponent n
+        self.sigma = float(sigma)         # residual spread, dB
+        self.site = site
+        self.band = band
+        self.samples = samples
+        self.fitted_at = fitted_at
+
+    def distances(self, rssi: np.ndarray) -> np.ndarray:
+        """Metres for an array of RSSI readings (dBm); NaN where there is no reading"""
+        rssi = np.asarray(rssi, dtype=np.float64)
+        rssi = np.where(rssi < 0, rssi, np.nan)
+        return 10.0 ** ((self.p0 - rssi) / (10.0 * self.exponent))
+
+    def expected_rssi(self, distances: np.ndarray) -> np.ndarray:
+        return self.p0 - 10.0 * self.exponent * np.log10(np.maximum(np.asarray(distances, dtype=np.float64), 1e-3))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'site': self.site,
+            'band': self.band,
+            'p0': round(self.p0, 3),
+            'exponent': round(self.exponent, 4),
+            'sigma': round(self.sigma, 3),
+            'samples': self.samples,
+            'fitted_at': self.fitted_at
+        }
+
+# Roughly the old fixed curve (-59 dBm at 1 m, about 9.5 m at -80 dBm) for uncalibrated sites
+DEFAULT_MODEL = PathLossModel(-59.0, 2.2, 6.0)
+
+def haversine_m(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+def fit_groups(keys: List[Tuple[str, str]], distances: np.ndarray, rssi: np.ndarray,
+               min_samples: int = 5) -> Dict[Tuple[str, str], PathLossModel]:
+    """
+    Least-squares fit of P0 and n for every (site, band) group in one pass.
+
+    Uses the closed-form simple-regression normal equations accumulated
+    per group with bincount, so any number of groups costs a few array ops.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    rssi = np.asarray(rssi, dtype=np.float64)
+    usable = np.isfinite(distances) & np.isfinite(rssi) & (distances > 0)
+
+    groups = sorted(set(k for k, ok in zip(keys, usable) if ok))
+    if not groups:
+        return {}
+    index = {g: i for i, g in enumerate(groups)}
+    g = np.array([index.get(k, -1) for k in keys], dtype=np.intp)
+    usable &= g >= 0
+    g, x, y = g[usable], -10.0 * np.log10(distances[usable]), rssi[usable]
+
+    size = len(groups)
+    n = np.bincount(g, minlength=size).astype(np.float64)
+    sx, sy = np.bincount(g, x, size), np.bincount(g, y, size)
+    sxx, sxy = np.bincount(g, x * x, size), np.bincount(g, x * y, size)
+
+    denom = n * sxx - sx ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exponent = (n * sxy - sx * sy) / denom
+        exponent = np.clip(exponent, MIN_EXPONENT, MAX_EXPONENT)
+        # Refit the intercept after clipping so the line still passes through the data centroid
+        p0 = (sy - exponent * sx) / n
+        residual = y - (p0[g] + exponent[g] * x)
+        sigma = np.sqrt(np.bincount(g, residual ** 2, size) / np.maximum(n - 2, 1))
+
+    now = time.time()
+    models = {}
+    for i, (site, band) in enumerate(groups):
+        if n[i] < min_samples or not np.isfinite(exponent[i]) or denom[i] <= 0:
+            logger.warning(f"Not enough spread in survey data for {site}/{band} ({int(n[i])} points)")
+            continue
+        models[(site, band)] = PathLossModel(p0[i], exponent[i], sigma[i], site, band, int(n[i]), now)
+    return models
+
+def survey_arrays(points: Iterable[Dict[str, Any]]) -> Tuple[List[Tuple[str, str]], np.ndarray, np.ndarray]:
+    """
+    Keys, distances and RSSI from survey points.
+
+    A point has 'rssi', 'site', 'band' (or 'frequency' in MHz) and either a
+    measured 'distance' in metres or the receiver ('lat', 'lon') and
+    transmitter ('ref_lat', 'ref_lon') positions.
+    """
+    points = list(points)
+    keys = [(p.get('site', 'default'), p.get('band') or band_for(p.get('frequency', 2400))) for p in points]
+    rssi = np.array([p['rssi'] for p in points], dtype=np.float64)
+    measured = np.array([p.get('distance', np.nan) for p in points], dtype=np.float64)
+    coords = np.array([[p.get(k, np.nan) for k in ('lat', 'lon', 'ref_lat', 'ref_lon')] for p in points],
+                      dtype=np.float64).reshape(len(points), 4)
+    distances = np.where(np.isfinite(measured), measured,
+                         haversine_m(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3]))
+    return keys, distances, rssi
+
+class PathLossStore:
+    """Fitted models per (site, band) in SQLite, cached in memory"""
+
+    def __init__(self, db_path: str = "path_loss.db", default: PathLossModel = DEFAULT_MODEL):
+        self.db = SqliteDatabase(db_path)
+        self.default = default
+        self._cache: Dict[Tuple[str, str], Optional[PathLossModel]] = {}
+        self._lock = threading.Lock()
+        self.init_database()
+
+    def init_database(self):
+        """Initialize SQLite table for fitted path-loss models"""
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS path_loss_models (
+                site TEXT NOT NULL,
+                band TEXT NOT NULL,
+                p0 REAL NOT NULL,
+                exponent REAL NOT NULL,
+                sigma REAL NOT NULL,
+                samples INTEGER NOT NULL,
+                fitted_at REAL NOT NULL,
+                PRIMARY KEY (site, band)
+            )
+        ''')
+
+    def save(self, models: Iterable[PathLossModel]) -> int:
+        rows = [(m.site, m.band, m.p0, m.exponent, m.sigma, m.samples, m.fitted_at or time.time()) for m in models]
+        self.db.executemany('INSERT OR REPLACE INTO path_loss_models VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        with self._lock:
+            self._cache.clear()
+        return len(rows)
+
+    def get(self, site: str, band: str) -> Optional[PathLossModel]:
+        """Fitted model for exactly this site and band, if one exists"""
+        key = (site, band)
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        row = self.db.query_one('''
+            SELECT p0, exponent, sigma, samples, fitted_at FROM path_loss_models WHERE site = ? AND band = ?
+        ''', key)
+        model = PathLossModel(row[0], row[1], row[2], site, band, row[3], row[4]) if row else None
+        with self._lock:
+            self._cache[key] = model
+        return model
+
+    def model_for(self, site: str, band: str) -> PathLossModel:
+        """Site/band model, else the band's fit from any default site, else the generic curve"""
+        return self.get(site, band) or self.get('default', band) or self.default
+
+    def calibrate(self, points: Iterable[Dict[str, Any]], min_samples: int = 5) -> Dict[Tuple[str, str], PathLossModel]:
+        """Fit every site/band present in the survey and store the results"""
+        models = fit_groups(*survey_arrays(points), min_samples=min_samples)
+        self.save(models.values())
+        for model in models.values():
+            logger.info(f"Path loss {model.site}/{model.band}: P0={model.p0:.1f} dBm, n={model.exponent:.2f}, "
+                        f"sigma={model.sigma:.1f} dB over {model.samples} points")
+        return models
+
+    def list_models(self) -> List[Dict[str, Any]]:
+        rows = self.db.query_all('SELECT site, band, p0, exponent, sigma, samples, fitted_at FROM path_loss_models')
+        return [PathLossModel(r[2], r[3], r[4], r[0], r[1], r[5], r[6]).to_dict() for r in rows]
+
+    def ranges(self, points: List[Dict[str, Any]], site: str = 'default') -> List[Dict[str, Any]]:
+        """Add 'distance' and 'rssi_std' to points with 'rssi' (and optional 'band'/'frequency'), per band at once"""
+        bands = [p.get('band') or band_for(p.get('frequency', 2400)) for p in points]
+        rssi = np.array([p['rssi'] for p in points], dtype=np.float64)
+        distances = np.empty(len(points))
+        sigmas = np.empty(len(points))
+        band_array = np.array(bands, dtype=object)
+        for band in set(bands):
+            mask = band_array == band
+            model = self.model_for(site, band)
+            distances[mask] = model.distances(rssi[mask])
+            sigmas[mask] = model.sigma
+        return [{**p, 'distance': float(d), 'rssi_std': float(s)} for p, d, s in zip(points, distances, sigmas)]
+
+def main():
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Fit and inspect RSSI path-loss models")
+    sub = parser.add_subparsers(dest='command', required=True)
+    fit_parser = sub.add_parser('fit', help="Fit from JSON lines of survey points")
+    fit_parser.add_argument('survey')
+    fit_parser.add_argument('--min-samples', type=int, default=5)
+    sub.add_parser('list')
+    sub.add_parser('ranges', help="Read JSON points with rssi on stdin, print them with distances")
+    parser.add_argument('--db', default='path_loss.db')
+    parser.add_argument('--site', default='default')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = PathLossStore(args.db)
+
+    if args.command == 'fit':
+        with open(args.survey, encoding='utf-8') as f:
+            points = [json.loads(line) for line in f if line.strip()]
+        for point in points:
+            point.setdefault('site', args.site)
+        models = store.calibrate(points, args.min_samples)
+        print(json.dumps([m.to_dict() for m in models.values()], indent=2))
+    elif args.command == 'list':
+        print(json.dumps(store.list_models(), indent=2))
+    elif args.command == 'ranges':
+        print(json.dumps(store.ranges(json.load(sys.stdin), args.site), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Power-line harmonic analysis
+
+Analyses recorded voltage/current waveforms from metering equipment and
+produces the compact summaries stored in the plc_analysis table. Captures
+are memory-mapped (.npy, raw interleaved samples) or read in chunks (WAV);
+each chunk is cut into IEC 61000-4-7 style windows of whole mains cycles
+and every window's per-cycle RMS, harmonic subgroups, THD and power factor
+are computed together with NumPy, then rolled up into fixed intervals.
+"""
+
+import json
+import logging
+import os
+import time
+import wave
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from sqlitePool import SqliteDatabase
+
+logger = logging.getLogger(__name__)
+
+# Harmonic orders reported (2..MAX_HARMONIC), capped by the Nyquist limit
+MAX_HARMONIC = 40
+REPORTED_HARMONICS = 15
+
+# Thresholds for miner indicators in a summary interval
+CONSTANT_LOAD_CV = 0.03        # window-to-window current RMS variation
+MIN_LOAD_A = 0.5
+HIGH_CURRENT_THD = 30.0        # % of fundamental, uncorrected rectifier front ends
+TRIPLEN_RATIO = 20.0           # 3rd harmonic current, % of fundamental
+HIGH_POWER_W = 1000.0
+SPIKE_FACTOR = 3.0             # cycle peak over sqrt(2) x median cycle RMS
+MAX_SPIKES = 20
+
+def open_waveform(path: str, sample_rate: Optional[float] = None, dtype: str = 'float32',
+                  channels: int = 2) -> Tuple[Any, float]:
+    """Memory-mapped (samples, channels) array and sample rate for .npy or raw captures"""
+    if path.endswith('.npy'):
+        data = np.load(path, mmap_mode='r')
+    else:
+        data = np.memmap(path, dtype=dtype, mode='r')
+        data = data[:len(data) - len(data) % channels].reshape(-1, channels)
+    if data.ndim != 2 or data.shape[1] < 2:
+        raise ValueError(f"{path}: expected voltage and current channels, got shape {data.shape}")
+    if not sample_rate:
+        raise ValueError(f"{path}: sample rate is required for raw and .npy captures")
+    return data, float(sample_rate)
+
+def iter_chunks(path: str, chunk_samples: int, sample_rate: Optional[float] = None, dtype: str = 'float32',
+                channels: int = 2, voltage_scale: float = 1.0,
+                current_scale: float = 1.0) -> Iterator[Tuple[int, float, np.ndarray, np.ndarray]]:
+    """(first sample, sample rate, voltage, current) chunks of at most chunk_samples"""
+    if path.lower().endswith('.wav'):
+        with wave.open(path, 'rb') as wav:
+            rate = float(sample_rate or wav.getframerate())
+            width, nch = wav.getsampwidth(), wav.getnchannels()
+            if nch < 2 or width not in (2, 4):
+                raise ValueError(f"{path}: expected 16/32-bit PCM with voltage and current channels")
+            full_scale = float(2 ** (8 * width - 1))
+            offset = 0
+            while True:
+                raw = wav.readframes(chunk_samples)
+                if not raw:
+                    break
+                frames = np.frombuffer(raw, dtype='<i2' if width == 2 else '<i4').reshape(-1, nch)
+                yield (offset, rate, frames[:, 0] * (voltage_scale / full_scale),
+                       frames[:, 1] * (current_scale / full_scale))
+                offset += len(frames)
+        return
+
+    data, rate = open_waveform(path, sample_rate, dtype, channels)
+    for start in range(0, len(data), chunk_samples):
+        block = np.asarray(data[start:start + chunk_samples], dtype=np.float64)
+        yield start, rate, block[:, 0] * voltage_scale, block[:, 1] * current_scale
+
+def _rising_crossings(v: np.ndarray, min_gap: float) -> np.ndarray:
+    """Fractional sample positions of upward zero crossings, debounced by min_gap samples"""
+    k = np.flatnonzero((v[:-1] < 0) & (v[1:] >= 0))
+    positions = k + v[k] / (v[k] - v[k + 1])
+    if len(positions) > 1:
+        # Noise near zero produces clusters; keep the first crossing of each
+        keep = np.concatenate(([True], np.diff(positions) > min_gap))
+        positions = positions[keep]
+    return positions
+
+def window_length(sample_rate: float, nominal_freq: float, cycles: int) -> int:
+    """Samples in a window of `cycles` nominal cycles"""
+    return int(round(cycles * sample_rate / nominal_freq))
+
+def analyze_windows(v: np.ndarray, i: np.ndarray, sample_rate: float, nominal_freq: float = 50.0,
+                    cycles: int = 10) -> Dict[str, np.ndarray]:
+    """
+    Per-window measurements for whole windows of `cycles` nominal cycles.
+
+    Harmonic magnitudes are RMS values of IEC harmonic subgroups (the bin at
+    h * cycles and its two neighbours), so small frequency deviations do not
+    leak out of the subgroup. Trailing samples short of a window are ignored.
+    """
+    n = window_length(sample_rate, nominal_freq, cycles)
+    m = len(v) // n
+    v = v[:m * n].reshape(m, n)
+    i = i[:m * n].reshape(m, n)
+
+    # Cycle boundaries may fall between samples when the rate is not a multiple of the line frequency
+    starts = np.round(np.arange(cycles) * n / cycles).astype(np.intp)
+    lengths = np.diff(np.append(starts, n))
+    v_cycle_rms = np.sqrt(np.add.reduceat(v ** 2, starts, axis=1) / lengths)
+    i_cycle_rms = np.sqrt(np.add.reduceat(i ** 2, starts, axis=1) / lengths)
+    i_cycle_peak = np.maximum.reduceat(np.abs(i), starts, axis=1)
+
+    v_rms = np.sqrt(np.mean(v ** 2, axis=1))
+    i_rms = np.sqrt(np.mean(i ** 2, axis=1))
+    power = np.mean(v * i, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        power_factor = power / (v_rms * i_rms)
+
+    orders = min(MAX_HARMONIC, (n // 2 - 1) // cycles)
+    bins = (np.arange(1, orders + 1) * cycles)[:, None] + np.array([-1, 0, 1])
+    scale = np.sqrt(2.0) / n
+
+    def subgroups(x: np.ndarray) -> np.ndarray:
+        spectrum = np.fft.rfft(x, axis=1)
+        power_bins = spectrum.real ** 2 + spectrum.imag ** 2
+        return np.sqrt(power_bins[:, bins].sum(axis=2)) * scale
+
+    v_harmonics = subgroups(v)
+    i_harmonics = subgroups(i)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v_thd = 100.0 * np.sqrt((v_harmonics[:, 1:] ** 2).sum(axis=1)) / v_harmonics[:, 0]
+        i_thd = 100.0 * np.sqrt((i_harmonics[:, 1:] ** 2).sum(axis=1)) / i_harmonics[:, 0]
+        i_ratio = 100.0 * i_harmonics[:, 1:] / i_harmonics[:, :1]
+
+    # Frequency from the spacing of first and last upward zero crossings in each window
+    crossings = _rising_crossings(v.ravel(), n / cycles / 2)
+    edges = np.searchsorted(crossings, np.arange(m + 1) * n)
+    first = crossings[np.minimum(edges[:-1], len(crossings) - 1)] if len(crossings) else np.zeros(m)
+    last = crossings[np.maximum(edges[1:] - 1, 0)] if len(crossings) else np.zeros(m)
+    count = edges[1:] - edges[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frequency = np.where(count > 1, (count - 1) * sample_rate / (last - first), np.nan)
+
+    return {
+        'frequency': frequency,
+        'v_rms': v_rms,
+        'i_rms': i_rms,
+        'power': power,
+        'power_factor': power_factor,
+        'v_thd': v_thd,
+        'i_thd': i_thd,
+        'i_harmonic_ratio': i_ratio,
+        'v_cycle_rms': v_cycle_rms,
+        'i_cycle_rms': i_cycle_rms,
+        'i_cycle_peak': i_cycle_peak
+    }
+
+def miner_indicators(summary: Dict[str, Any], i_rms: np.ndarray) -> Dict[str, Any]:
+    """Load-shape evidence of mining equipment within one summary interval"""
+    score, reasons = 0, []
+    mean_current = float(np.mean(i_rms))
+    if mean_current > MIN_LOAD_A and np.std(i_rms) / mean_current < CONSTANT_LOAD_CV:
+        score += 35
+        reasons.append('constant_load')
+    if (summary['active_power_w'] or 0) > HIGH_POWER_W:
+        score += 20
+        reasons.append('continuous_high_power')
+    if (summary['harmonic_distortion'] or 0) > HIGH_CURRENT_THD:
+        score += 25
+        reasons.append('high_current_thd')
+    harmonics = summary['current_harmonics']
+    if len(harmonics) > 1 and harmonics[1] > TRIPLEN_RATIO:
+        score += 20
+        reasons.append('triplen_harmonics')
+    return {'score': score, 'reasons': reasons}
+
+def _mean(values: np.ndarray, digits: int = 3) -> Optional[float]:
+    finite = values[np.isfinite(values)]
+    return round(float(finite.mean()), digits) if len(finite) else None
+
+def summarize(windows: Dict[str, np.ndarray], start_s: float, window_s: float, cycle_s: float,
+              location: Optional[str] = None) -> Dict[str, Any]:
+    """One plc_analysis row from a run of consecutive windows"""
+    v_cycle = windows['v_cycle_rms'].ravel()
+    i_cycle = windows['i_cycle_rms'].ravel()
+    peaks = windows['i_cycle_peak'].ravel()
+    v_mean = v_cycle.mean()
+
+    threshold = SPIKE_FACTOR * np.sqrt(2.0) * max(float(np.median(i_cycle)), 1e-9)
+    spike_cycles = np.flatnonzero(peaks > threshold)
+    spikes = [{'time_s': round(start_s + c * cycle_s, 4), 'peak_a': round(float(peaks[c]), 2),
+               'ratio': round(float(peaks[c] / threshold * SPIKE_FACTOR), 2)}
+              for c in spike_cycles[np.argsort(peaks[spike_cycles])[::-1][:MAX_SPIKES]]]
+
+    harmonic_ratio = windows['i_harmonic_ratio']
+    frequency = windows['frequency']
+    finite_freq = frequency[np.isfinite(frequency)]
+    summary = {
+        'start_s': round(start_s, 3),
+        'duration_s': round(len(windows['v_rms']) * window_s, 3),
+        'location': location,
+        'power_line_freq': _mean(frequency, 4),
+        'frequency_min': round(float(finite_freq.min()), 4) if len(finite_freq) else None,
+        'frequency_max': round(float(finite_freq.max()), 4) if len(finite_freq) else None,
+        'harmonic_distortion': _mean(windows['i_thd'], 2),
+        'power_quality': _mean(windows['v_thd'], 2),
+        'voltage_fluctuation': round(float((v_cycle.max() - v_cycle.min()) / v_mean * 100.0), 3) if v_mean > 0 else None,
+        'current_spikes': spikes,
+        'power_factor': _mean(windows['power_factor'], 4),
+        'voltage_rms': _mean(windows['v_rms'], 2),
+        'current_rms': _mean(windows['i_rms'], 3),
+        'active_power_w': _mean(windows['power'], 1),
+        # Mean current harmonics 2..N as % of fundamental
+        'current_harmonics': [round(float(x), 2) if np.isfinite(x) else None
+                              for x in np.nanmean(harmonic_ratio[:, :REPORTED_HARMONICS - 1], axis=0)]
+                             if len(harmonic_ratio) else []
+    }
+    summary['miner_indicators'] = miner_indicators(summary, windows['i_rms'])
+    return summary
+
+def analyze_file(path: str, sample_rate: Optional[float] = None, nominal_freq: float = 50.0,
+                 interval: float = 60.0, cycles: Optional[int] = None, location: Optional[str] = None,
+                 dtype: str = 'float32', channels: int = 2, voltage_scale: float = 1.0,
+                 current_scale: float = 1.0, chunk_intervals: int = 5) -> Iterator[Dict[str, Any]]:
+    """
+    Stream interval summaries for a capture.
+
+    Windows are 10 cycles at 50 Hz and 12 at 60 Hz (about 200 ms). Chunks hold
+    a whole number of summary intervals so no state carries across them.
+    """
+    cycles = cycles or (12 if nominal_freq >= 55 else 10)
+    rate = sample_rate
+    if path.lower().endswith('.wav') and not rate:
+        with wave.open(path, 'rb') as wav:
+            rate = wav.getframerate()
+    if not rate:
+        raise ValueError("sample rate is required")
+
+    window_samples = window_length(rate, nominal_freq, cycles)
+    windows_per_interval = max(1, int(round(interval * nominal_freq / cycles)))
+    interval_samples = window_samples * windows_per_interval
+    window_s = window_samples / rate
+
+    for offset, rate, v, i in iter_chunks(path, interval_samples * chunk_intervals, rate, dtype, channels,
+                                          voltage_scale, current_scale):
+        windows = analyze_windows(v, i, rate, nominal_freq, cycles)
+        count = len(windows['v_rms'])
+        for first in range(0, count, windows_per_interval):
+            part = {k: a[first:first + windows_per_interval] for k, a in windows.items()}
+            yield summarize(part, (offset + first * window_samples) / rate, window_s, window_s / cycles, location)
+
+class PlcStore:
+    """plc_analysis rows in SQLite, mirroring the shared schema"""
+
+    def __init__(self, db_path: str = "plc_analysis.db"):
+        self.db = SqliteDatabase(db_path)
+        self.init_database()
+
+    def init_database(self):
+        """Initialize SQLite table for power-line analysis summaries"""
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS plc_analysis (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                power_line_freq REAL NOT NULL,
+                harmonic_distortion REAL,
+                power_quality REAL,
+                voltage_fluctuation REAL,
+                current_spikes TEXT,
+                power_factor REAL,
+                location TEXT,
+                timestamp TEXT NOT NULL,
+                miner_indicators TEXT
+            )
+        ''')
+
+    def save(self, summaries: List[Dict[str, Any]], capture_start: Optional[float] = None) -> int:
+        """Store summaries; timestamps are capture_start (epoch seconds) plus each interval's offset"""
+        capture_start = time.time() if capture_start is None else capture_start
+        rows = [(s['power_line_freq'], s['harmonic_distortion'], s['power_quality'], s['voltage_fluctuation'],
+                 json.dumps(s['current_spikes']), s['power_factor'], s['location'],
+                 time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(capture_start + s['start_s'])),
+                 json.dumps(s['miner_indicators']))
+                for s in summaries if s['power_line_freq'] is not None]
+        self.db.executemany('''
+            INSERT INTO plc_analysis
+            (power_line_freq, harmonic_distortion, power_quality, voltage_fluctuation, current_spikes,
+             power_factor, location, timestamp, miner_indicators)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        return len(rows)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Harmonic analysis of recorded voltage/current waveforms")
+    parser.add_argument('capture', help=".wav, .npy or raw interleaved voltage/current samples")
+    parser.add_argument('--sample-rate', type=float, help="Samples per second (read from the header for WAV)")
+    parser.add_argument('--mains', type=float, default=50.0, help="Nominal line frequency")
+    parser.add_argument('--interval', type=float, default=60.0, help="Seconds per summary")
+    parser.add_argument('--dtype', default='float32', help="Sample type of raw captures")
+    parser.add_argument('--channels', type=int, default=2)
+    parser.add_argument('--voltage-scale', type=float, default=1.0, help="Volts per sample unit")
+    parser.add_argument('--current-scale', type=float, default=1.0, help="Amperes per sample unit")
+    parser.add_argument('--location')
+    parser.add_argument('--db', help="Also store summaries in this SQLite database")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    started = time.monotonic()
+    summaries = []
+    for summary in analyze_file(args.capture, args.sample_rate, args.mains, args.interval, location=args.location,
+                                dtype=args.dtype, channels=args.channels, voltage_scale=args.voltage_scale,
+                                current_scale=args.current_scale):
+        print(json.dumps(summary, ensure_ascii=False), flush=True)
+        summaries.append(summary)
+    if args.db:
+        PlcStore(args.db).save(summaries, os.path.getmtime(args.capture) - sum(s['duration_s'] for s in summaries))
+    captured = sum(s['duration_s'] for s in summaries)
+    elapsed = time.monotonic() - started
+    logger.info(f"Analysed {captured:.0f} s of waveform in {elapsed:.1f} s "
+                f"({captured / max(elapsed, 1e-9):.0f}x real time)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Adaptive timeout and retry controller shared by all socket probes
+
+Timeouts are derived per /24 subnet from measured connect round-trip times
+using the SRTT/RTTVAR estimator from RFC 6298, floored by a high percentile
+of recent samples so a single fast answer does not collapse the timeout.
+Every send, retries included, first waits for a slot from the shared
+ProbePacer, and answers to retries are reported to it as loss.
+"""
+
+import errno
+import ipaddress
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+from probePacing import ProbePacer
+
+logger = logging.getLogger(__name__)
+
+# connect_ex codes that mean "no answer yet" rather than a definitive result
+AMBIGUOUS_ERRNOS = {errno.EAGAIN, errno.EWOULDBLOCK, errno.ETIMEDOUT, errno.EINPROGRESS}
+# The remote stack answered with a reset; the RTT is still a valid sample
+REFUSED_ERRNOS = {errno.ECONNREFUSED, errno.ECONNRESET}
+
+class SubnetRtt:
+    """RTT estimator for one subnet"""
+
+    def __init__(self, window: int = 64):
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.samples = deque(maxlen=window)
+        self.probes = 0
+        self.timeouts = 0
+        self.retries = 0
+
+    def add_sample(self, rtt: float):
+        # RFC 6298 section 2: alpha = 1/8, beta = 1/4
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.samples.append(rtt)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+class ProbeController:
+    def __init__(self, initial_timeout: float = 1.0, min_timeout: float = 0.2,
+                 max_timeout: float = 5.0, max_retries: int = 2, percentile: float = 95.0,
+                 pacer: Optional[ProbePacer] = None):
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.max_retries = max_retries
+        self.percentile = percentile
+        # None disables pacing for this controller
+        self.pacer = pacer
+
+        self._subnets: Dict[str, SubnetRtt] = {}
+        self._lock = threading.Lock()
+
+    def _subnet_key(self, ip: str) -> str:
+        try:
+            return str(ipaddress.ip_network(f"{ip}/24", strict=False))
+        except ValueError:
+            return ip
+
+    def _stats(self, ip: str) -> SubnetRtt:
+        key = self._subnet_key(ip)
+        with self._lock:
+            stats = self._subnets.get(key)
+            if stats is None:
+                stats = self._subnets[key] = SubnetRtt()
+            return stats
+
+    def connect_timeout(self, ip: str) -> float:
+        """Current retransmission-style timeout for a TCP connect to ip"""
+        stats = self._stats(ip)
+        with self._lock:
+            if stats.srtt is None:
+                return self.initial_timeout
+            rto = stats.srtt + 4 * stats.rttvar
+            high = stats.percentile(self.percentile)
+        if high is not None:
+            rto = max(rto, high * 1.5)
+        return min(self.max_timeout, max(self.min_timeout, rto))
+
+    def request_timeout(self, ip: str, service_time: float = 1.0) -> float:
+        """Timeout for an application exchange: a few RTTs plus the remote's processing time"""
+        return min(self.max_timeout * 2, 3 * self.connect_timeout(ip) + service_time)
+
+    def pace(self, ip: str):
+        """Wait for the pacer's go-ahead before sending anything to ip"""
+        if self.pacer:
+            self.pacer.acquire(ip)
+
+    async def pace_async(self, ip: str):
+        if self.pacer:
+            await self.pacer.acquire_async(ip)
+
+    def report(self, ip: str, attempts: int):
+        """An answer arrived on the attempts-th send; every earlier send was lost"""
+        if self.pacer:
+            self.pacer.report(ip, 1, attempts - 1)
+
+    def record(self, ip: str, rtt: float):
+        stats = self._stats(ip)
+        with self._lock:
+            stats.add_sample(rtt)
+
+    def probe(self, ip: str, port: int) -> Tuple[str, Optional[float]]:
+        """
+        TCP connect probe. Returns (outcome, rtt) where outcome is 'open',
+        'closed', 'filtered' (no answer after retries) or 'error'.
+        Only silent probes are retried, each with a doubled timeout.
+        """
+        stats = self._stats(ip)
+        timeout = self.connect_timeout(ip)
+
+        for attempt in range(self.max_retries + 1):
+            with self._lock:
+                stats.probes += 1
+                if attempt:
+                    stats.retries += 1
+
+            self.pace(ip)
+            started = time.monotonic()
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.settimeout(timeout)
+                try:
+                    code = sock.connect_ex((ip, port))
+                finally:
+                    sock.close()
+            except socket.timeout:
+                code = errno.ETIMEDOUT
+            except (socket.error, OSError) as e:
+                logger.debug(f"Probe {ip}:{port} failed: {e}")
+                return 'error', None
+            elapsed = time.monotonic() - started
+
+            if code == 0 or code in REFUSED_ERRNOS:
+                self.record(ip, elapsed)
+                self.report(ip, attempt + 1)
+                return ('open' if code == 0 else 'closed'), elapsed
+            if code not in AMBIGUOUS_ERRNOS:
+                # Host/network unreachable and similar are definitive
+                return 'error', None
+
+            with self._lock:
+                stats.timeouts += 1
+            timeout = min(self.max_timeout, timeout * 2)
+
+        return 'filtered', None
+
+    def is_open(self, ip: str, port: int) -> bool:
+        return self.probe(ip, port)[0] == 'open'
+
+    def metadata(self) -> Dict[str, Any]:
+        """Chosen timeouts and RTT statistics per subnet, for scan metadata"""
+        with self._lock:
+            subnets = list(self._subnets.items())
+
+        timing = {}
+        for key, stats in subnets:
+            sample_ip = key.split('/')[0]
+            timing[key] = {
+                'connect_timeout': round(self.connect_timeout(sample_ip), 4),
+                'srtt': round(stats.srtt, 4) if stats.srtt is not None else None,
+                'rttvar': round(stats.rttvar, 4) if stats.rttvar is not None else None,
+                'p50': stats.percentile(50),
+                f'p{int(self.percentile)}': stats.percentile(self.percentile),
+                'samples': len(stats.samples),
+                'probes': stats.probes,
+                'timeouts': stats.timeouts,
+                'retries': stats.retries
+            }
+        return timing
+
+    def pacing_metadata(self) -> Optional[Dict[str, Any]]:
+        return self.pacer.metadata() if self.pacer else None
+
+# Shared controller so every scan engine learns from the same measurements and
+# sends within one pacing envelope
+controller = ProbeController(pacer=ProbePacer())
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Probe pacing shared by all scan engines
+
+Every probe takes a token from a global probes-per-second bucket, from
+the bucket of its /24 and, when the target sits behind a configured
+upstream link, from that link's bucket. A probe only leaves when all of
+them have a token, so a busy subnet waits while probes to other subnets
+go ahead and the send order interleaves across subnets by itself.
+
+Loss is measured the way nmap does it: a probe that is answered only
+after a retransmission proves the earlier send was dropped. Silence on
+every attempt says nothing (dark address space is silent too) and is
+not counted. A link whose loss goes over the target backs off
+multiplicatively and recovers additively while it is the bottleneck.
+"""
+
+import asyncio
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from targetSpace import TargetSpace
+
+logger = logging.getLogger(__name__)
+
+_unpack = struct.Struct('>I').unpack
+
+# Fewer probe outcomes than this in an interval are too few to judge loss
+MIN_LOSS_SAMPLES = 20
+BACKOFF = 0.75
+RECOVERY = 0.05
+# Idle /24 buckets are dropped once this many are tracked
+MAX_SUBNETS = 4096
+
+class TokenBucket:
+    """Refills at rate tokens per second up to burst; callers hold the pacer lock"""
+    __slots__ = ('rate', 'burst', 'tokens', 'stamp')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.stamp = now
+
+    def refill(self, now: float):
+        if now > self.stamp:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+
+    def wait_time(self) -> float:
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+class PacedLink:
+    """A capped path (the whole scanner or one upstream) whose rate follows observed loss"""
+
+    def __init__(self, name: str, rate: float, burst: float, now: float, min_fraction: float):
+        self.name = name
+        self.max_rate = rate
+        self.min_rate = rate * min_fraction
+        self.bucket = TokenBucket(rate, burst, now)
+        self.delivered = 0
+        self.dropped = 0
+        self.throttled = 0
+        self.loss: Optional[float] = None
+        self.backoffs = 0
+        self.total_delivered = 0
+        self.total_dropped = 0
+
+    def adjust(self, loss_target: float):
+        samples = self.delivered + self.dropped
+        loss = self.dropped / samples if samples >= MIN_LOSS_SAMPLES else None
+        if loss is not None:
+            self.loss = loss
+        rate = self.bucket.rate
+        if loss is not None and loss > loss_target:
+            rate = max(self.min_rate, rate * BACKOFF)
+            if rate < self.bucket.rate:
+                self.backoffs += 1
+                logger.info(f"Pacing {self.name}: {loss:.1%} loss, backing off to {rate:.0f} probes/s")
+        elif self.throttled and (loss is None or loss <= loss_target / 2):
+            # Only climb back while this link is what holds probes up
+            rate = min(self.max_rate, rate + self.max_rate * RECOVERY)
+        self.bucket.rate = rate
+        self.delivered = self.dropped = self.throttled = 0
+
+    def metadata(self) -> Dict[str, Any]:
+        samples = self.total_delivered + self.total_dropped
+        return {
+            'rate': round(self.bucket.rate, 1),
+            'max_rate': self.max_rate,
+            'burst': self.bucket.burst,
+            'loss': round(self.loss, 4) if self.loss is not None else None,
+            'total_loss': round(self.total_dropped / samples, 4) if samples else None,
+            'delivered': self.total_delivered,
+            'dropped': self.total_dropped,
+            'backoffs': self.backoffs
+        }
+
+class ProbePacer:
+    def __init__(self, rate: float = 500.0, burst: float = 100.0, subnet_rate: Optional[float] = 100.0,
+                 subnet_burst: float = 20.0, upstreams: Optional[Dict[str, Dict[str, Any]]] = None,
+                 adaptive: bool = True, loss_target: float = 0.05, adjust_interval: float = 1.0,
+                 min_rate_fraction: float = 0.05):
+        self._lock = threading.Lock()
+        self.configure(rate, burst, subnet_rate, subnet_burst, upstreams, adaptive, loss_target,
+                       adjust_interval, min_rate_fraction)
+
+    def configure(self, rate: float = 500.0, burst: float = 100.0, subnet_rate: Optional[float] = 100.0,
+                  subnet_burst: float = 20.0, upstreams: Optional[Dict[str, Dict[str, Any]]] = None,
+                  adaptive: bool = True, loss_target: float = 0.05, adjust_interval: float = 1.0,
+                  min_rate_fraction: float = 0.05):
+        """
+        Replace the pacing envelope. upstreams maps a link name to
+        {'networks': [CIDRs or ranges], 'rate': probes/s, 'burst': n};
+        a target uses the first link whose networks contain its /24.
+        Routing is decided per /24, so upstream networks must cover whole /24s.
+        """
+        if not rate > 0 or not burst > 0:
+            raise ValueError("Pacing rate and burst must be positive")
+        if subnet_rate is not None and (not subnet_rate > 0 or not subnet_burst > 0):
+            raise ValueError("Subnet rate and burst must be positive")
+        now = time.monotonic()
+        links = []
+        for name, spec in (upstreams or {}).items():
+            link_rate = float(spec['rate'])
+            link_burst = float(spec.get('burst', link_rate / 5))
+            if not link_rate > 0 or not link_burst > 0:
+                raise ValueError(f"Upstream {name}: rate and burst must be positive")
+            space = TargetSpace(spec['networks'], hosts_only=False)
+            for start, end in space.intervals:
+                if start & 0xFF or ~end & 0xFF:
+                    raise ValueError(f"Upstream {name}: networks must be made of whole /24s")
+            links.append((space, PacedLink(name, link_rate, link_burst, now, min_rate_fraction)))
+        with self._lock:
+            self.adaptive = adaptive
+            self.loss_target = loss_target
+            self.adjust_interval = adjust_interval
+            self.subnet_rate = subnet_rate
+            self.subnet_burst = subnet_burst
+            self.total = PacedLink('global', float(rate), float(burst), now, min_rate_fraction)
+            self.upstreams: List[Tuple[TargetSpace, PacedLink]] = links
+            self._subnets: Dict[Any, TokenBucket] = {}
+            self._route: Dict[Any, Optional[PacedLink]] = {}
+            self._adjusted = now
+            self.sent = 0
+            self.waits = 0
+            self.wait_seconds = 0.0
+
+    def _classify(self, ip: str) -> Tuple[Any, Optional[PacedLink]]:
+        """(/24 key, upstream link) for ip; callers hold the lock"""
+        try:
+            key = _unpack(socket.inet_aton(ip))[0] >> 8
+        except OSError:
+            # Hostnames and IPv6 get a bucket of their own and no upstream
+            key = ip
+        if key not in self._route:
+            if len(self._route) >= MAX_SUBNETS * 4:
+                self._route.clear()
+            link = None
+            if isinstance(key, int):
+                for space, candidate in self.upstreams:
+                    if ip in space:
+                        link = candidate
+                        break
+            self._route[key] = link
+        return key, self._route[key]
+
+    def _prune(self, now: float):
+        for key in [k for k, bucket in self._subnets.items()
+                    if bucket.tokens + (now - bucket.stamp) * bucket.rate >= bucket.burst]:
+            del self._subnets[key]
+            self._route.pop(key, None)
+
+    def try_acquire(self, ip: str) -> float:
+        """Take a probe slot for ip; 0 when taken, otherwise seconds until one could be"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._adjusted >= self.adjust_interval:
+                self._adjusted = now
+                if self.adaptive:
+                    self.total.adjust(self.loss_target)
+                    for _, link in self.upstreams:
+                        link.adjust(self.loss_target)
+
+            key, upstream = self._classify(ip)
+            links = [self.total, upstream] if upstream else [self.total]
+            buckets = [link.bucket for link in links]
+            if self.subnet_rate:
+                subnet = self._subnets.get(key)
+                if subnet is None:
+                    if len(self._subnets) >= MAX_SUBNETS:
+                        self._prune(now)
+                    subnet = self._subnets[key] = TokenBucket(self.subnet_rate, self.subnet_burst, now)
+                buckets.append(subnet)
+
+            wait = 0.0
+            for bucket in buckets:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time())
+            if wait:
+                for link in links:
+                    if link.bucket.tokens < 1:
+                        link.throttled += 1
+                return wait
+            for bucket in buckets:
+                bucket.tokens -= 1
+            self.sent += 1
+            return 0.0
+
+    def acquire(self, ip: str) -> float:
+        """Block until a probe to ip may be sent; returns the seconds waited"""
+        waited = 0.0
+        wait = self.try_acquire(ip)
+        while wait:
+            time.sleep(wait)
+            waited += wait
+            wait = self.try_acquire(ip)
+        if waited:
+            with self._lock:
+                self.waits += 1
+                self.wait_seconds += waited
+        return waited
+
+    async def acquire_async(self, ip: str) -> float:
+        """acquire() for event-loop engines"""
+        waited = 0.0
+        wait = self.try_acquire(ip)
+        while wait:
+            await asyncio.sleep(wait)
+            waited += wait
+            wait = self.try_acquire(ip)
+        if waited:
+            with self._lock:
+                self.waits += 1
+                self.wait_seconds += waited
+        return waited
+
+    def report(self, ip: str, delivered: int = 1, dropped: int = 0):
+        """Outcome of one probe: answered sends and sends proven lost by a later answer"""
+        with self._lock:
+            _, upstream = self._classify(ip)
+            # Loss is charged to the narrowest link the probe crossed
+            link = upstream or self.total
+            link.delivered += delivered
+            link.dropped += dropped
+            link.total_delivered += delivered
+            link.total_dropped += dropped
+
+    def metadata(self) -> Dict[str, Any]:
+        """Current rates and observed loss, for scan metadata"""
+        with self._lock:
+            return {
+                'global': self.total.metadata(),
+                'upstreams': {link.name: link.metadata() for _, link in self.upstreams},
+                'subnet_rate': self.subnet_rate,
+                'subnets_tracked': len(self._subnets),
+                'probes_sent': self.sent,
+                'probes_delayed': self.waits,
+                'delay_seconds': round(self.wait_seconds, 3)
+            }
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental local process monitor
+
+Keeps per-PID state between passes. Every pass reads only the cheap
+per-process counters (name, CPU times, RSS) to compute true CPU deltas;
+command lines are read, and matched against the signature database's
+precompiled name/argument automata, only for PIDs that are new or have
+changed. Connections can open at any time after start, so they are
+re-read on a slow per-process timer and at once when a process starts
+burning CPU. Detections are written to SQLite in batches, and only when
+a process's verdict changes.
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+from signatureDb import CompiledSignatures, SignatureDatabase, signature_db
+from sqlitePool import SqliteDatabase, WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+HIGH_CPU_PERCENT = 80.0
+HIGH_MEMORY_MB = 500.0
+MIN_SCORE = 10
+# Seconds between connection re-reads for a process that stays quiet
+CONNECTION_RECHECK = 60.0
+
+# psutil 6 renamed Process.connections to net_connections
+_process_connections = getattr(psutil.Process, 'net_connections', None) or psutil.Process.connections
+
+class ProcessState:
+    __slots__ = ('process', 'name', 'cmdline', 'ppid', 'cpu_total', 'sampled_at', 'cpu_percent',
+                 'memory_mb', 'connections', 'pool_connection', 'connections_at', 'static_score', 'static_reasons',
+                 'signature_version', 'reported')
+
+    def __init__(self, process: psutil.Process):
+        self.process = process
+        self.name = ''
+        self.cmdline = ''
+        self.ppid = None
+        self.cpu_total = None
+        self.sampled_at = None
+        self.cpu_percent = None
+        self.memory_mb = 0.0
+        self.connections = 0
+        self.pool_connection = False
+        self.connections_at = None
+        self.static_score = 0
+        self.static_reasons: List[str] = []
+        self.signature_version = None
+        # Last (score, reasons) written to the database
+        self.reported = None
+
+class ProcessMonitor:
+    def __init__(self, signatures: Optional[SignatureDatabase] = None, db_path: str = "process_monitor.db",
+                 min_score: int = MIN_SCORE):
+        self.signatures = signatures or signature_db
+        self.min_score = min_score
+        self._states: Dict[int, ProcessState] = {}
+        self._lock = threading.Lock()
+        self.db = SqliteDatabase(db_path)
+        self.init_database()
+        self.detections = WriteBehindQueue(self.db, '''
+            INSERT INTO process_detections
+            (timestamp, pid, name, cmdline, cpu_percent, memory_mb, connections,
+             suspicion_score, detection_reasons, parent_pid)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''')
+        self.stats = {'passes': 0, 'inspected': 0, 'connection_reads': 0, 'exited': 0}
+
+    def init_database(self):
+        """Initialize SQLite table for process detections"""
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS process_detections (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                name TEXT,
+                cmdline TEXT,
+                cpu_percent REAL,
+                memory_mb REAL,
+                connections INTEGER,
+                suspicion_score INTEGER,
+                detection_reasons TEXT,
+                parent_pid INTEGER
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS idx_process_detections_pid ON process_detections(pid)')
+
+    def _inspect(self, state: ProcessState, signatures: CompiledSignatures):
+        """Expensive reads and static matching, for new or changed processes only"""
+        process = state.process
+        try:
+            state.cmdline = ' '.join(process.cmdline()).lower()
+        except (psutil.AccessDenied, psutil.ZombieProcess):
+            state.cmdline = ''
+        try:
+            state.ppid = process.ppid()
+        except psutil.AccessDenied:
+            state.ppid = None
+        state.static_score, state.static_reasons = signatures.classify_process(state.name, state.cmdline)
+        state.signature_version = signatures.version
+        self.stats['inspected'] += 1
+
+    def _read_connections(self, state: ProcessState, signatures: CompiledSignatures, now: float):
+        """Remote ports of the process's sockets, checked against the miner port list"""
+        try:
+            remote_ports = [c.raddr.port for c in _process_connections(state.process, kind='inet') if c.raddr]
+        except (psutil.AccessDenied, psutil.ZombieProcess):
+            remote_ports = []
+        state.connections = len(remote_ports)
+        state.pool_connection = any(port in signatures.miner_ports for port in remote_ports)
+        state.connections_at = now
+        self.stats['connection_reads'] += 1
+
+    def _sample(self, pid: int, signatures: CompiledSignatures, now: float) -> Optional[ProcessState]:
+        """Cheap per-pass read: name, CPU times and RSS in one oneshot"""
+        state = self._states.get(pid)
+        if state is None:
+            state = ProcessState(psutil.Process(pid))
+        process = state.process
+
+        with process.oneshot():
+            name = process.name()
+            times = process.cpu_times()
+            rss = process.memory_info().rss
+        cpu_total = times.user + times.system
+
+        # An exec or a reused PID shows up as a new name or CPU time going backwards
+        changed = state.cpu_total is None or name != state.name or cpu_total < state.cpu_total
+        was_busy = state.cpu_percent is not None and state.cpu_percent > HIGH_CPU_PERCENT
+        if changed:
+            state.cpu_percent = None
+            state.reported = None
+        elif now > state.sampled_at:
+            state.cpu_percent = 100.0 * (cpu_total - state.cpu_total) / (now - state.sampled_at)
+        busy = state.cpu_percent is not None and state.cpu_percent > HIGH_CPU_PERCENT
+        state.name = name
+        state.cpu_total = cpu_total
+        state.sampled_at = now
+        state.memory_mb = rss / 1024 / 1024
+
+        if changed or state.signature_version != signatures.version:
+            self._inspect(state, signatures)
+            self._read_connections(state, signatures, now)
+        elif (busy and not was_busy) or now - state.connections_at >= CONNECTION_RECHECK:
+            # A miner usually dials its pool after start-up and then pins the CPU
+            self._read_connections(state, signatures, now)
+        return state
+
+    def scan(self) -> List[Dict[str, Any]]:
+        """One monitoring pass; returns the currently suspicious processes"""
+        signatures = self.signatures.current()
+        now = time.monotonic()
+        timestamp = datetime.now().isoformat(sep=' ')
+        suspicious = []
+
+        with self._lock:
+            live = set()
+            for pid in psutil.pids():
+                try:
+                    state = self._sample(pid, signatures, now)
+                except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                    continue
+                except psutil.AccessDenied:
+                    logger.debug(f"Access denied reading process {pid}")
+                    continue
+                self._states[pid] = state
+                live.add(pid)
+
+                score, reasons = state.static_score, list(state.static_reasons)
+                if state.pool_connection:
+                    score += 25
+                    reasons.append('mining_port_connection')
+                if state.cpu_percent is not None and state.cpu_percent > HIGH_CPU_PERCENT:
+                    score += 20
+                    reasons.append('high_cpu_usage')
+                if state.memory_mb > HIGH_MEMORY_MB:
+                    score += 10
+                    reasons.append('high_memory_usage')
+                if score <= self.min_score:
+                    continue
+
+                record = {
+                    'pid': pid,
+                    'name': state.name,
+                    'cpu_percent': round(state.cpu_percent, 1) if state.cpu_percent is not None else None,
+                    'memory_mb': round(state.memory_mb, 1),
+                    'cmdline': state.cmdline,
+                    'connections': state.connections,
+                    'suspicion_score': score,
+                    'detection_reasons': reasons,
+                    'parent_pid': state.ppid
+                }
+                suspicious.append(record)
+
+                verdict = (score, tuple(reasons))
+                if verdict != state.reported:
+                    state.reported = verdict
+                    self.detections.put((timestamp, pid, state.name, state.cmdline, record['cpu_percent'],
+                                         record['memory_mb'], state.connections, score, json.dumps(reasons),
+                                         state.ppid))
+
+            exited = self._states.keys() - live
+            for pid in exited:
+                del self._states[pid]
+            self.stats['exited'] += len(exited)
+            self.stats['passes'] += 1
+
+        logger.debug(f"Process pass: {len(live)} processes, {len(suspicious)} suspicious")
+        return suspicious
+
+    def recent_detections(self, hours: int = 24) -> List[Dict[str, Any]]:
+        self.detections.flush()
+        rows = self.db.query_all('''
+            SELECT timestamp, pid, name, cmdline, cpu_percent, memory_mb, connections,
+                   suspicion_score, detection_reasons, parent_pid
+            FROM process_detections
+            WHERE timestamp > datetime('now', 'localtime', ?)
+            ORDER BY timestamp DESC
+        ''', (f'-{hours} hours',))
+        keys = ('timestamp', 'pid', 'name', 'cmdline', 'cpu_percent', 'memory_mb', 'connections',
+                'suspicion_score', 'detection_reasons', 'parent_pid')
+        return [{**dict(zip(keys, row)), 'detection_reasons': json.loads(row[8])} for row in rows]
+
+    def close(self):
+        self.detections.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Continuously monitor local processes for miners")
+    parser.add_argument('--interval', type=float, default=5.0)
+    parser.add_argument('--passes', type=int, default=0, help="Stop after this many passes (0 = run forever)")
+    parser.add_argument('--db', default='process_monitor.db')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    monitor = ProcessMonitor(db_path=args.db)
+    try:
+        done = 0
+        while not args.passes or done < args.passes:
+            started = time.monotonic()
+            suspicious = monitor.scan()
+            done += 1
+            logger.info(f"Pass {done}: {len(suspicious)} suspicious processes in "
+                        f"{(time.monotonic() - started) * 1000:.0f} ms")
+            print(json.dumps(suspicious, ensure_ascii=False), flush=True)
+            time.sleep(args.interval)
+    finally:
+        monitor.close()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WHOIS/RDAP network-block cache
+
+Parsed registry records are stored per network block (inetnum/NetRange/
+CIDR) in SQLite and mirrored in an in-memory interval index, so any
+address inside an already-seen allocation resolves without another
+registry query. Bulk RPSL dumps (e.g. ripe.db.inetnum.gz) can be
+preloaded for offline use. Blocks learnt one at a time from WHOIS or RDAP
+misses are kept in a short side list and only folded into the index in
+batches, so filling the cache does not rebuild the index on every miss.
+"""
+
+import bisect
+import gzip
+import ipaddress
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_RANGE = re.compile(r'^(?:inetnum|netrange)\s*:\s*(\d+\.\d+\.\d+\.\d+)\s*-\s*(\d+\.\d+\.\d+\.\d+)',
+                    re.IGNORECASE | re.MULTILINE)
+_CIDR = re.compile(r'^cidr\s*:\s*(.+)$', re.IGNORECASE | re.MULTILINE)
+
+# Blocks added since the last index rebuild are searched linearly up to this many
+RECENT_BLOCKS = 256
+
+def parse_whois_record(whois_data: str) -> Optional[Dict[str, Any]]:
+    """Extract owner fields from a WHOIS response or RPSL object"""
+    info = {}
+
+    for line in whois_data.split('\n'):
+        line = line.strip()
+
+        # Look for common WHOIS fields
+        if ':' in line:
+            key, value = line.split(':', 1)
+            key = key.strip().lower()
+            value = value.strip()
+
+            if key in ['person', 'admin-c', 'tech-c']:
+                info['contact_person'] = value
+            elif key in ['phone', 'tel']:
+                info['phone'] = value
+            elif key in ['address', 'addr']:
+                info['address'] = value
+            elif key in ['org', 'organization', 'orgname']:
+                info['organization'] = value
+            elif key in ['netname', 'netblock-name']:
+                info['network_name'] = value
+
+    if info:
+        return {
+            'name': info.get('contact_person', '').split()[0] if info.get('contact_person') else None,
+            'family': ' '.join(info.get('contact_person', '').split()[1:]) if info.get('contact_person') else None,
+            'phone': info.get('phone'),
+            'address': info.get('address'),
+            'organization': info.get('organization'),
+            'network_name': info.get('network_name'),
+            'confidence': 0.7,
+            'source': 'whois_lookup'
+        }
+
+    return None
+
+def parse_block_range(whois_data: str) -> Optional[Tuple[int, int]]:
+    """Most specific IPv4 block named in a WHOIS response, as inclusive integer bounds"""
+    ranges = [(int(ipaddress.IPv4Address(a)), int(ipaddress.IPv4Address(b))) for a, b in _RANGE.findall(whois_data)]
+    # ARIN lists a NetRange plus the CIDRs that make it up; only fall back to CIDR lines alone
+    for cidrs in ([] if ranges else _CIDR.findall(whois_data)):
+        for cidr in cidrs.split(','):
+            try:
+                network = ipaddress.IPv4Network(cidr.strip(), strict=False)
+            except ValueError:
+                continue
+            ranges.append((int(network.network_address), int(network.broadcast_address)))
+
+    ranges = [r for r in ranges if r[0] <= r[1]]
+    return min(ranges, key=lambda r: r[1] - r[0]) if ranges else None
+
+def parse_rdap_range(rdap: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """Block bounds from an RDAP ip network object"""
+    try:
+        return int(ipaddress.IPv4Address(rdap['startAddress'])), int(ipaddress.IPv4Address(rdap['endAddress']))
+    except (KeyError, ValueError):
+        return None
+
+def parse_rdap_record(rdap: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Owner fields from an RDAP ip network object, in the shape parse_whois_record returns"""
+    info: Dict[str, Any] = {}
+    if rdap.get('name'):
+        info['network_name'] = rdap['name']
+
+    for entity in rdap.get('entities') or []:
+        vcard = entity.get('vcardArray')
+        if not isinstance(vcard, list) or len(vcard) < 2:
+            continue
+        # jCard properties are [name, parameters, type, value]
+        fields = {}
+        for item in vcard[1]:
+            if isinstance(item, list) and len(item) >= 4:
+                fields.setdefault(item[0], item)
+        name = fields['fn'][3] if 'fn' in fields else None
+        if 'kind' in fields and fields['kind'][3] == 'org' or 'registrant' in (entity.get('roles') or []):
+            info.setdefault('organization', name)
+        elif name:
+            info.setdefault('contact_person', name)
+        if 'tel' in fields:
+            info.setdefault('phone', str(fields['tel'][3]).replace('tel:', ''))
+        label = fields['adr'][1].get('label') if 'adr' in fields and isinstance(fields['adr'][1], dict) else None
+        if label:
+            info.setdefault('address', label.replace('\n', ', '))
+
+    if not info:
+        return None
+    contact = (info.get('contact_person') or '').split()
+    return {
+        'name': contact[0] if contact else None,
+        'family': ' '.join(contact[1:]) if contact else None,
+        'phone': info.get('phone'),
+        'address': info.get('address'),
+        'organization': info.get('organization'),
+        'network_name': info.get('network_name'),
+        'confidence': 0.7,
+        'source': 'rdap_lookup'
+    }
+
+def iter_rpsl_objects(path: str, object_class: str = 'inetnum') -> Iterator[str]:
+    """Stream objects of one class from a (optionally gzipped) RPSL dump"""
+    opener = gzip.open if path.endswith('.gz') else open
+    prefix = object_class + ':'
+    lines: List[str] = []
+    with opener(path, 'rt', encoding='latin-1') as f:
+        for line in f:
+            if line.strip():
+                if not line.startswith(('%', '#')):
+                    lines.append(line.rstrip('\n'))
+                continue
+            if lines and lines[0].lower().startswith(prefix):
+                yield '\n'.join(lines)
+            lines = []
+    if lines and lines[0].lower().startswith(prefix):
+        yield '\n'.join(lines)
+
+class RegistryCache:
+    """Network blocks with an in-memory nested-interval index backed by SQLite"""
+
+    def __init__(self, db_path: str = "registry_cache.db", max_age_days: float = 30.0):
+        self.db_path = db_path
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._starts = array('L')
+        self._ends = array('L')
+        self._fetched = array('d')
+        # Index of the smallest enclosing block, -1 for top-level blocks
+        self._parents = array('l')
+        # (start, end, fetched) added since the last rebuild
+        self._recent: List[Tuple[int, int, float]] = []
+        self._dirty = True
+        self.init_database()
+
+    def init_database(self):
+        """Initialize SQLite table for registry blocks"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS registry_blocks (
+                start_int INTEGER NOT NULL,
+                end_int INTEGER NOT NULL,
+                source TEXT,
+                record TEXT NOT NULL,
+                fetched REAL NOT NULL,
+                PRIMARY KEY (start_int, end_int)
+            ) WITHOUT ROWID
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _rebuild(self):
+        """Load block bounds sorted by start (widest first on ties) and link each to its parent"""
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT start_int, end_int, fetched FROM registry_blocks ORDER BY start_int, end_int DESC
+        ''').fetchall()
+        conn.close()
+
+        starts, ends, fetched, parents = array('L'), array('L'), array('d'), array('l')
+        stack: List[int] = []
+        for i, (start, end, ts) in enumerate(rows):
+            while stack and ends[stack[-1]] < start:
+                stack.pop()
+            starts.append(start)
+            ends.append(end)
+            fetched.append(ts)
+            parents.append(stack[-1] if stack and ends[stack[-1]] >= end else -1)
+            stack.append(i)
+
+        self._starts, self._ends, self._fetched, self._parents = starts, ends, fetched, parents
+        self._recent = []
+        self._dirty = False
+        logger.debug(f"Registry index rebuilt with {len(starts)} blocks")
+
+    def _find(self, ip_int: int) -> Optional[Tuple[int, int]]:
+        """Bounds of the most specific fresh block containing ip_int"""
+        cutoff = time.time() - self.max_age
+        best = None
+        i = bisect.bisect_right(self._starts, ip_int) - 1
+        while i >= 0:
+            if self._ends[i] >= ip_int and self._fetched[i] >= cutoff:
+                best = (self._starts[i], self._ends[i])
+                break
+            # Registry blocks are nested or disjoint, so every block enclosing
+            # the address is an ancestor of the last block starting before it
+            i = self._parents[i]
+        for start, end, fetched in self._recent:
+            if start <= ip_int <= end and fetched >= cutoff and (best is None or end - start <= best[1] - best[0]):
+                best = (start, end)
+        return best
+
+    def lookup(self, ip_address: str) -> Optional[Dict[str, Any]]:
+        """Cached record of the smallest known block containing the address"""
+        ip_int = int(ipaddress.IPv4Address(ip_address))
+        with self._lock:
+            if self._dirty:
+                self._rebuild()
+            key = self._find(ip_int)
+            if key is None:
+                return None
+
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('''
+            SELECT record, source FROM registry_blocks WHERE start_int = ? AND end_int = ?
+        ''', key).fetchone()
+        conn.close()
+        if not row:
+            return None
+
+        record = json.loads(row[0])
+        record['network_block'] = f"{ipaddress.IPv4Address(key[0])} - {ipaddress.IPv4Address(key[1])}"
+        record['registry_source'] = row[1]
+        return record
+
+    def add_blocks(self, blocks: Iterable[Tuple[int, int, str, Dict[str, Any]]]) -> int:
+        """Insert or refresh (start_int, end_int, source, record) blocks"""
+        now = time.time()
+        rows = [(start, end, source, json.dumps(record, ensure_ascii=False), now) for start, end, source, record in blocks]
+        if not rows:
+            return 0
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany('INSERT OR REPLACE INTO registry_blocks VALUES (?, ?, ?, ?, ?)', rows)
+        conn.commit()
+        conn.close()
+        with self._lock:
+            # A few blocks at a time (the usual miss-fill pattern) wait in the side list
+            self._recent.extend((start, end, now) for start, end, _, _, _ in rows)
+            if len(self._recent) > RECENT_BLOCKS:
+                self._dirty = True
+        return len(rows)
+
+    def add_whois_response(self, whois_data: str, record: Dict[str, Any], source: str) -> bool:
+        """Cache a parsed WHOIS answer under the block it describes"""
+        block = parse_block_range(whois_data)
+        if not block:
+            return False
+        self.add_blocks([(block[0], block[1], source, record)])
+        return True
+
+    def add_rdap_response(self, rdap: Dict[str, Any], record: Dict[str, Any], source: str) -> bool:
+        """Cache a parsed RDAP answer under the block it describes"""
+        block = parse_rdap_range(rdap)
+        if not block:
+            return False
+        self.add_blocks([(block[0], block[1], source, record)])
+        return True
+
+    def preload_dump(self, path: str, parse_record: Callable[[str], Optional[Dict[str, Any]]] = parse_whois_record,
+                     source: Optional[str] = None, batch_size: int = 5000) -> int:
+        """Bulk-load inetnum objects from an RPSL dump; returns the number of blocks stored"""
+        source = source or path
+        loaded = 0
+        batch = []
+        for obj in iter_rpsl_objects(path):
+            block = parse_block_range(obj)
+            record = parse_record(obj) if block else None
+            if not record:
+                continue
+            batch.append((block[0], block[1], source, record))
+            if len(batch) >= batch_size:
+                loaded += self.add_blocks(batch)
+                batch = []
+        loaded += self.add_blocks(batch)
+        logger.info(f"Preloaded {loaded} registry blocks from {path}")
+        return loaded
+
+    def block_count(self) -> int:
+        conn = sqlite3.connect(self.db_path)
+        count = conn.execute('SELECT COUNT(*) FROM registry_blocks').fetchone()[0]
+        conn.close()
+        return count
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WHOIS network-block cache")
+    sub = parser.add_subparsers(dest='command', required=True)
+    preload_parser = sub.add_parser('preload', help="Load an RPSL inetnum dump (.gz allowed)")
+    preload_parser.add_argument('dump')
+    lookup_parser = sub.add_parser('lookup')
+    lookup_parser.add_argument('ip')
+    parser.add_argument('--db', default='registry_cache.db')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    cache = RegistryCache(args.db)
+
+    if args.command == 'preload':
+        print(json.dumps({'loaded': cache.preload_dump(args.dump), 'total_blocks': cache.block_count()}))
+    elif args.command == 'lookup':
+        print(json.dumps(cache.lookup(args.ip), indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Binary result frames for Python -> Node transfer
+
+Device results are sent as length-prefixed, columnar frames whose layout
+comes from shared/resultSchema.json, the same file server/resultCodec.ts
+reads. All integers are little-endian, timestamps are float64 epoch
+milliseconds (UTC), and every column block carries its own byte length,
+so a reader can decode frame by frame as bytes arrive.
+
+Frame:   magic(4) | type u8 | schema version u16 | payload length u32 | payload
+Devices: row count u32 | per column: block length u32 | block
+"""
+
+import json
+import math
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'shared', 'resultSchema.json')
+
+with open(SCHEMA_PATH, encoding='utf-8') as _f:
+    SCHEMA = json.load(_f)
+
+SCHEMA_VERSION: int = SCHEMA['version']
+MAGIC: bytes = SCHEMA['magic'].encode()
+FRAME_DEVICES: int = SCHEMA['frames']['devices']
+FRAME_RESULT: int = SCHEMA['frames']['result']
+COLUMNS: List[Tuple[str, str]] = [(c['name'], c['type']) for c in SCHEMA['columns']]
+
+_HEADER = struct.Struct('<4sBHI')
+_NULL_LENGTH = 0xFFFFFFFF
+_NULL_I32 = -2 ** 31
+_NULL_BOOL = 255
+
+# Detection fields that have their own column; everything else goes to 'details'
+_TYPED_DETECTION_FIELDS = {
+    'is_miner', 'confidence_score', 'device_type', 'detection_methods',
+    'mining_software', 'hash_rate', 'power_consumption'
+}
+
+def _le(arr: array) -> bytes:
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+def _from_le(typecode: str, data: bytes) -> array:
+    arr = array(typecode)
+    arr.frombytes(data)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
+
+def _timestamp_ms(value: Any) -> float:
+    if value is None:
+        return math.nan
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.timestamp() * 1000.0
+    return float(value) * 1000.0
+
+def device_record(device: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten one detect_miners device into the schema's columns"""
+    detection = device.get('detection_results') or {}
+    geolocation = device.get('geolocation') or {}
+    location = geolocation.get('ip-api') or geolocation.get('ipapi') or {}
+
+    details = {k: v for k, v in detection.items() if k not in _TYPED_DETECTION_FIELDS}
+    if geolocation:
+        details['geolocation'] = geolocation
+
+    return {
+        'ip_address': device.get('ip_address'),
+        'mac_address': device.get('mac_address'),
+        'hostname': device.get('hostname'),
+        'open_ports': device.get('open_ports') or [],
+        'scan_time': device.get('scan_time'),
+        'is_miner': detection.get('is_miner') if detection else None,
+        'confidence_score': detection.get('confidence_score'),
+        'device_type': detection.get('device_type'),
+        'detection_methods': detection.get('detection_methods') or [],
+        'mining_software': detection.get('mining_software'),
+        'hash_rate': detection.get('hash_rate'),
+        'power_consumption': detection.get('power_consumption'),
+        'threat_level': device.get('threat_level'),
+        'latitude': location.get('lat'),
+        'longitude': location.get('lon'),
+        'city': location.get('city'),
+        'details': details or None
+    }
+
+def _pack_strings(values: Iterable[Optional[str]]) -> bytes:
+    lengths = array('I')
+    data = bytearray()
+    for value in values:
+        if value is None:
+            lengths.append(_NULL_LENGTH)
+        else:
+            encoded = str(value).encode('utf-8')
+            lengths.append(len(encoded))
+            data += encoded
+    return _le(lengths) + bytes(data)
+
+def _pack_column(kind: str, values: List[Any]) -> bytes:
+    if kind == 'str':
+        return _pack_strings(values)
+    if kind == 'json':
+        return _pack_strings(
+            None if v is None else json.dumps(v, ensure_ascii=False, separators=(',', ':'), default=str)
+            for v in values
+        )
+    if kind == 'strlist':
+        counts = array('H', (len(v) for v in values))
+        return _le(counts) + _pack_strings(item for v in values for item in v)
+    if kind == 'u16list':
+        counts = array('H', (len(v) for v in values))
+        return _le(counts) + _le(array('H', (item for v in values for item in v)))
+    if kind == 'f64':
+        return _le(array('d', (math.nan if v is None else float(v) for v in values)))
+    if kind == 'ts':
+        return _le(array('d', (_timestamp_ms(v) for v in values)))
+    if kind == 'i32':
+        return _le(array('i', (_NULL_I32 if v is None else int(v) for v in values)))
+    if kind == 'bool':
+        return bytes(_NULL_BOOL if v is None else int(bool(v)) for v in values)
+    raise ValueError(f"Unknown column type {kind}")
+
+def frame(frame_type: int, payload: bytes) -> bytes:
+    return _HEADER.pack(MAGIC, frame_type, SCHEMA_VERSION, len(payload)) + payload
+
+def encode_devices(devices: List[Dict[str, Any]]) -> bytes:
+    """One devices frame for a batch of detect_miners devices"""
+    records = [device_record(d) for d in devices]
+    parts = [struct.pack('<I', len(records))]
+    for name, kind in COLUMNS:
+        block = _pack_column(kind, [r[name] for r in records])
+        parts.append(struct.pack('<I', len(block)))
+        parts.append(block)
+    return frame(FRAME_DEVICES, b''.join(parts))
+
+def encode_result(summary: Dict[str, Any]) -> bytes:
+    """Result frame carrying the scan summary as compact JSON"""
+    return frame(FRAME_RESULT, json.dumps(summary, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8'))
+
+def write_frame(stream: BinaryIO, data: bytes):
+    stream.write(data)
+    stream.flush()
+
+def _unpack_strings(block: bytes, count: int, offset: int = 0) -> Tuple[List[Optional[str]], int]:
+    lengths = _from_le('I', block[offset:offset + 4 * count])
+    pos = offset + 4 * count
+    values = []
+    for length in lengths:
+        if length == _NULL_LENGTH:
+            values.append(None)
+        else:
+            values.append(block[pos:pos + length].decode('utf-8'))
+            pos += length
+    return values, pos
+
+def _unpack_column(kind: str, block: bytes, count: int) -> List[Any]:
+    if kind in ('str', 'json'):
+        values, _ = _unpack_strings(block, count)
+        return [json.loads(v) if kind == 'json' and v is not None else v for v in values]
+    if kind in ('strlist', 'u16list'):
+        counts = _from_le('H', block[:2 * count])
+        if kind == 'strlist':
+            flat, _ = _unpack_strings(block, sum(counts), 2 * count)
+        else:
+            flat = _from_le('H', block[2 * count:]).tolist()
+        values, pos = [], 0
+        for n in counts:
+            values.append(flat[pos:pos + n])
+            pos += n
+        return values
+    if kind in ('f64', 'ts'):
+        return [None if math.isnan(v) else v for v in _from_le('d', block)]
+    if kind == 'i32':
+        return [None if v == _NULL_I32 else v for v in _from_le('i', block)]
+    if kind == 'bool':
+        return [None if v == _NULL_BOOL else bool(v) for v in block]
+    raise ValueError(f"Unknown column type {kind}")
+
+def decode_devices(payload: bytes) -> List[Dict[str, Any]]:
+    """Rows of a devices frame payload as flat records"""
+    (count,) = struct.unpack_from('<I', payload, 0)
+    pos = 4
+    columns = {}
+    for name, kind in COLUMNS:
+        (length,) = struct.unpack_from('<I', payload, pos)
+        pos += 4
+        columns[name] = _unpack_column(kind, payload[pos:pos + length], count)
+        pos += length
+    return [{name: columns[name][i] for name, _ in COLUMNS} for i in range(count)]
+
+class FrameReader:
+    """Incremental frame splitter: feed bytes as they arrive, get complete frames back"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        self._buffer += data
+        frames = []
+        while len(self._buffer) >= _HEADER.size:
+            magic, frame_type, version, length = _HEADER.unpack_from(self._buffer, 0)
+            if magic != MAGIC:
+                raise ValueError("Corrupt result stream: bad frame magic")
+            if version != SCHEMA_VERSION:
+                raise ValueError(f"Result schema version {version} does not match {SCHEMA_VERSION}")
+            end = _HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            frames.append((frame_type, bytes(self._buffer[_HEADER.size:end])))
+            del self._buffer[:end]
+        return frames
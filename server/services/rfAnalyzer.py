@@ -21,9 +21,16 @@ from typing import Dict, List, Tuple, Optional
 import socket
 import struct
 
+from nmapScan import iter_open_hosts
+from probeControl import ProbeController, controller as default_probe_controller
+from signatureDb import SignatureDatabase, signature_db
+
 class RealRFAnalyzer:
-    def __init__(self):
+    def __init__(self, probes: Optional[ProbeController] = None, signatures: Optional[SignatureDatabase] = None):
         self.db_path = "rf_analysis.db"
+        self.probes = probes or default_probe_controller
+        # RF signatures and their harmonic index come from the shared signature database
+        self.signatures = signatures or signature_db
         self.sampling_rate = 2048000  # 2 MHz
         self.center_frequencies = [
             # Common frequencies where mining devices create interference
@@ -34,46 +41,12 @@ class RealRFAnalyzer:
             5800000000,  # 5.8 GHz - WiFi band (mining interference)
         ]
         
-        # Real miner RF signatures database
-        self.miner_signatures = {
-            'antminer_s19': {
-                'switching_frequency': [125000, 250000, 500000],  # Hz
-                'harmonic_pattern': [2, 3, 5, 7],
-                'power_signature': {'min': -60, 'max': -40},  # dBm
-                'bandwidth': 50000,  # Hz
-                'noise_floor_delta': 15  # dB above noise floor
-            },
-            'antminer_s17': {
-                'switching_frequency': [100000, 200000, 400000],
-                'harmonic_pattern': [2, 3, 5],
-                'power_signature': {'min': -65, 'max': -45},
-                'bandwidth': 40000,
-                'noise_floor_delta': 12
-            },
-            'whatsminer_m30': {
-                'switching_frequency': [156000, 312000, 625000],
-                'harmonic_pattern': [2, 4, 6, 8],
-                'power_signature': {'min': -58, 'max': -38},
-                'bandwidth': 60000,
-                'noise_floor_delta': 18
-            },
-            'gpu_rig_6card': {
-                'switching_frequency': [83000, 166000, 333000],
-                'harmonic_pattern': [2, 3, 4, 6],
-                'power_signature': {'min': -70, 'max': -50},
-                'bandwidth': 30000,
-                'noise_floor_delta': 10
-            },
-            'gpu_rig_8card': {
-                'switching_frequency': [125000, 250000, 500000],
-                'harmonic_pattern': [2, 3, 4, 6, 8],
-                'power_signature': {'min': -68, 'max': -48},
-                'bandwidth': 40000,
-                'noise_floor_delta': 13
-            }
-        }
-        
         self.init_database()
+
+    @property
+    def miner_signatures(self) -> Dict[str, Dict]:
+        """RF signatures from the current signature database"""
+        return self.signatures.current().rf_signatures
         
     def init_database(self):
         """Initialize SQLite database for RF analysis results"""
@@ -214,9 +187,9 @@ class RealRFAnalyzer:
         if not peaks:
             return None
             
-        # Check for mining device patterns
-        for device_type, signature in self.miner_signatures.items():
-            confidence = self.match_device_signature(peaks, signature)
+        # Check for mining device patterns through the precompiled harmonic index
+        scores = self.signatures.current().score_rf_peaks(peaks)
+        for device_type, confidence in scores.items():
             if confidence > 0.6:  # 60% confidence threshold
                 return {
                     'device_type': device_type,
@@ -228,40 +201,9 @@ class RealRFAnalyzer:
         
         return None
 
-    def match_device_signature(self, peaks: List[Dict], signature: Dict) -> float:
-        """Match detected peaks against known device signatures"""
-        if not peaks:
-            return 0.0
-            
-        confidence_factors = []
-        
-        # Check switching frequency harmonics
-        switching_freqs = signature['switching_frequency']
-        harmonic_pattern = signature['harmonic_pattern']
-        
-        for peak in peaks:
-            for base_freq in switching_freqs:
-                for harmonic in harmonic_pattern:
-                    expected_freq = base_freq * harmonic
-                    freq_tolerance = base_freq * 0.05  # 5% tolerance
-                    
-                    if abs(peak['frequency'] - expected_freq) < freq_tolerance:
-                        # Check power level
-                        power_range = signature['power_signature']
-                        if power_range['min'] <= peak['power'] <= power_range['max']:
-                            confidence_factors.append(0.8)
-                        else:
-                            confidence_factors.append(0.4)
-                        break
-        
-        # Check noise floor delta
-        if peaks:
-            avg_snr = sum(p['snr'] for p in peaks) / len(peaks)
-            expected_delta = signature['noise_floor_delta']
-            if abs(avg_snr - expected_delta) < 5:  # 5 dB tolerance
-                confidence_factors.append(0.7)
-        
-        return min(1.0, sum(confidence_factors) / len(confidence_factors)) if confidence_factors else 0.0
+    def match_device_signature(self, peaks: List[Dict], device_type: str) -> float:
+        """Match detected peaks against one known device signature"""
+        return self.signatures.current().score_rf_peaks(peaks).get(device_type, 0.0)
 
     def network_based_rf_analysis(self, center_freq: int) -> Dict:
         """
@@ -272,33 +214,28 @@ class RealRFAnalyzer:
         
         try:
             # Analyze network traffic for mining patterns
-            mining_ports = [4028, 4029, 3333, 8333, 9333, 14433, 14444]
-            stratum_patterns = [
-                b'mining.notify',
-                b'mining.submit',
-                b'mining.authorize',
-                b'mining.subscribe'
-            ]
+            signatures = self.signatures.current()
+            mining_ports = signatures.traffic_ports
+            stratum_patterns = signatures.stratum_methods
             
-            # Scan local network for mining traffic
+            # One port scan over every local network and mining port; hosts stream in as found
             local_networks = self.get_local_networks()
             
-            for network in local_networks:
-                for port in mining_ports:
-                    devices = self.scan_network_port(network, port)
-                    for device in devices:
-                        # Analyze traffic patterns
-                        traffic_analysis = self.analyze_device_traffic(device['ip'], port)
-                        if traffic_analysis['is_mining']:
-                            detections.append({
-                                'device_type': 'network_detected_miner',
-                                'ip_address': device['ip'],
-                                'port': port,
-                                'confidence': traffic_analysis['confidence'],
-                                'traffic_pattern': traffic_analysis['pattern'],
-                                'estimated_hashrate': traffic_analysis.get('hashrate'),
-                                'detection_time': datetime.now().isoformat()
-                            })
+            for host in iter_open_hosts(local_networks, mining_ports, probes=self.probes):
+                for open_port in host['ports']:
+                    port = open_port['port']
+                    # Analyze traffic patterns
+                    traffic_analysis = self.analyze_device_traffic(host['ip'], port)
+                    if traffic_analysis['is_mining']:
+                        detections.append({
+                            'device_type': 'network_detected_miner',
+                            'ip_address': host['ip'],
+                            'port': port,
+                            'confidence': traffic_analysis['confidence'],
+                            'traffic_pattern': traffic_analysis['pattern'],
+                            'estimated_hashrate': traffic_analysis.get('hashrate'),
+                            'detection_time': datetime.now().isoformat()
+                        })
             
         except Exception as e:
             print(f"Network analysis error: {e}")
@@ -329,32 +266,14 @@ class RealRFAnalyzer:
         return networks
 
     def scan_network_port(self, network: str, port: int) -> List[Dict]:
-        """Scan network range for open ports"""
-        devices = []
-        
-        try:
-            # Simple port scan using nmap if available
-            cmd = ['nmap', '-p', str(port), '--open', '-T4', network]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-            
-            for line in result.stdout.split('\n'):
-                if 'Nmap scan report for' in line:
-                    ip_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', line)
-                    if ip_match:
-                        devices.append({'ip': ip_match.group(1)})
-                        
-        except:
-            # Fallback to manual scan
-            base_ip = network.split('/')[0].rsplit('.', 1)[0]
-            for i in range(1, 255):
-                ip = f"{base_ip}.{i}"
-                if self.check_port_open(ip, port):
-                    devices.append({'ip': ip})
-        
-        return devices
+        """Scan network range for one open port (nmap XML stream, or the built-in scanner)"""
+        return [{'ip': host['ip']} for host in iter_open_hosts(network, [port], probes=self.probes)]
 
-    def check_port_open(self, ip: str, port: int, timeout: float = 1.0) -> bool:
-        """Check if port is open on given IP"""
+    def check_port_open(self, ip: str, port: int, timeout: Optional[float] = None) -> bool:
+        """Check if port is open on given IP; timeout defaults to the adaptive per-subnet value"""
+        if timeout is None:
+            return self.probes.is_open(ip, port)
+            
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.settimeout(timeout)
@@ -369,7 +288,7 @@ class RealRFAnalyzer:
         try:
             # Connect and analyze traffic
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)
+            sock.settimeout(self.probes.request_timeout(ip))
             sock.connect((ip, port))
             
             # Send stratum mining request
@@ -386,7 +305,7 @@ class RealRFAnalyzer:
             sock.close()
             
             # Analyze response for mining patterns
-            if any(pattern in response.lower() for pattern in ['mining', 'stratum', 'job', 'difficulty']):
+            if any(pattern in response.lower() for pattern in self.signatures.current().stratum_response_keywords):
                 confidence = 0.9
                 pattern = 'stratum_protocol'
                 
@@ -567,6 +486,7 @@ def main():
             'rtl_sdr_available': has_rtl,
             'supported_frequencies': analyzer.center_frequencies,
             'known_signatures': list(analyzer.miner_signatures.keys()),
+            'signature_version': analyzer.signatures.current().version,
             'database_path': analyzer.db_path
         }, indent=2))
         
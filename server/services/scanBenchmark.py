@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark harness for the scan engines against an emulated miner fleet
+
+Reports hosts/s, probes/s, precision and recall for every engine.
+"""
+
+import json
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Set
+
+from minerEmulator import EmulatorFleet, build_fleet
+from probeControl import ProbeController
+
+logger = logging.getLogger(__name__)
+
+def fleet_network(count: int, base: str = '127.77.0.0') -> str:
+    """Smallest CIDR starting at base that holds count hosts"""
+    prefix = 32 - math.ceil(math.log2(count + 2))
+    return f"{base}/{min(prefix, 30)}"
+
+def _detector_engine(network: str, ips: List[str], probes: ProbeController) -> Set[str]:
+    from minerDetector import AdvancedMinerDetector
+
+    class LoopbackDetector(AdvancedMinerDetector):
+        def get_mac_address(self, ip):
+            # No ARP on loopback
+            return None
+
+    detector = LoopbackDetector(probes)
+    ports = [22, 80, 443, 4028, 8080, 9999, 3333, 4444]
+    devices = detector.scan_network_range(network, ports)
+    return {d['ip_address'] for d in devices if (d.get('detection_results') or {}).get('is_miner')}
+
+def _port_scanner_engine(network: str, ips: List[str], probes: ProbeController) -> Set[str]:
+    from networkScanner import NetworkScanner
+
+    scanner = NetworkScanner(probes=probes)
+    miner_ports = {4028, 3333}
+    with ThreadPoolExecutor(max_workers=50) as executor:
+        open_ports = list(executor.map(lambda ip: scanner.fast_port_scan(ip, [22, 80, 443, 4028, 8080, 9999, 3333]), ips))
+    return {ip for ip, ports in zip(ips, open_ports) if miner_ports & set(ports)}
+
+def _stratum_engine(network: str, ips: List[str], probes: ProbeController) -> Set[str]:
+    from rfAnalyzer import RealRFAnalyzer
+
+    analyzer = RealRFAnalyzer(probes)
+
+    def check(ip):
+        if not analyzer.check_port_open(ip, 3333):
+            return False
+        return analyzer.analyze_device_traffic(ip, 3333)['is_mining']
+
+    with ThreadPoolExecutor(max_workers=50) as executor:
+        flags = list(executor.map(check, ips))
+    return {ip for ip, flag in zip(ips, flags) if flag}
+
+def _web_engine(network: str, ips: List[str], probes: ProbeController) -> Set[str]:
+    from webFingerprint import fingerprint_web_many
+
+    results = fingerprint_web_many([(ip, 8080) for ip in ips])
+    return {ip for (ip, _), result in results.items() if result and result['is_miner']}
+
+ENGINES: Dict[str, Callable[[str, List[str], ProbeController], Set[str]]] = {
+    'detector': _detector_engine,
+    'port_scanner': _port_scanner_engine,
+    'stratum': _stratum_engine,
+    'web': _web_engine
+}
+
+def run_benchmark(device_count: int = 200, engines: List[str] = None, latency: float = 0.0,
+                  loss: float = 0.0, seed: int = 1) -> Dict[str, Any]:
+    """Start a fleet, run each engine over it and collect throughput and accuracy"""
+    engines = engines or list(ENGINES)
+    network = fleet_network(device_count)
+    devices = build_fleet(device_count, network, latency=latency, loss=loss, seed=seed)
+    ips = [d.ip for d in devices]
+
+    report = {
+        'fleet': {'network': network, 'devices': device_count, 'latency': latency, 'loss': loss},
+        'engines': {}
+    }
+
+    with EmulatorFleet(devices) as fleet:
+        truth = fleet.miner_ips
+        report['fleet']['miners'] = len(truth)
+
+        for name in engines:
+            probes = ProbeController()
+            before = fleet.stats()
+            started = time.monotonic()
+            try:
+                predicted = ENGINES[name](network, ips, probes)
+            except Exception as e:
+                logger.error(f"Engine {name} failed: {e}")
+                report['engines'][name] = {'error': str(e)}
+                continue
+            elapsed = time.monotonic() - started
+            after = fleet.stats()
+
+            connect_probes = sum(s['probes'] for s in probes.metadata().values())
+            app_requests = after['requests'] - before['requests']
+            true_positives = len(predicted & truth)
+
+            report['engines'][name] = {
+                'elapsed_s': round(elapsed, 3),
+                'hosts_per_s': round(len(ips) / elapsed, 1) if elapsed else None,
+                'probes_per_s': round((connect_probes + app_requests) / elapsed, 1) if elapsed else None,
+                'connect_probes': connect_probes,
+                'app_requests': app_requests,
+                'predicted_miners': len(predicted),
+                'precision': round(true_positives / len(predicted), 3) if predicted else None,
+                'recall': round(true_positives / len(truth), 3) if truth else None
+            }
+
+    return report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark scan engines against an emulated miner fleet")
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--engines', default=','.join(ENGINES), help="Comma separated: " + ', '.join(ENGINES))
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    results = run_benchmark(args.devices, [e.strip() for e in args.engines.split(',') if e.strip()],
+                            args.latency, args.loss, args.seed)
+    print(json.dumps(results, indent=2))
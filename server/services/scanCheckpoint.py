@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checkpoint and resume for long range sweeps
+
+A sweep walks a targetSpace permutation with many probes in flight, so
+targets finish out of order. The checkpoint records the permutation
+cursor (every position below it is done), the few finished positions
+above it, finished shards and the devices found so far. Each save is
+one SQLite transaction every couple of seconds. A restarted sweep with
+the same targets, ports and shard layout resumes at the cursor and never
+re-probes a finished target.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlitePool import SqliteDatabase
+from targetSpace import CyclicPermutation
+
+logger = logging.getLogger(__name__)
+
+def _json_default(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def _load_device(text: str) -> Dict[str, Any]:
+    device = json.loads(text)
+    if isinstance(device.get('scan_time'), str):
+        device['scan_time'] = datetime.fromisoformat(device['scan_time'])
+    return device
+
+def sweep_key(ip_range: str, exclude: Optional[Iterable[str]], ports: Iterable[int], shards: int) -> str:
+    """Identity of a sweep: a checkpoint only applies to the same targets, ports and shard layout"""
+    basis = {'range': ip_range, 'exclude': sorted(exclude or []), 'ports': sorted(ports), 'shards': shards}
+    return hashlib.sha1(json.dumps(basis, sort_keys=True).encode()).hexdigest()[:20]
+
+class ShardProgress:
+    """Cursor bookkeeping for one shard; all calls come from the thread driving the sweep"""
+
+    def __init__(self, store: 'ScanCheckpoint', key: str, shard: int, seed: int, position: int = 0,
+                 completed: Optional[Set[int]] = None, probed: int = 0, ip_range: Optional[str] = None):
+        self.store = store
+        self.key = key
+        self.shard = shard
+        self.seed = seed
+        self.ip_range = ip_range
+        self.position = position
+        self.probed = probed
+        self._completed: Set[int] = set(completed or ())
+        self._outstanding: Set[int] = set()
+        self._next = position
+        self._pending_devices: List[Tuple[str, str]] = []
+        self._saved_at = time.monotonic()
+
+    def remaining(self, permutation: CyclicPermutation) -> Iterator[Tuple[int, int]]:
+        """(position, index) of targets not finished in an earlier run"""
+        for position, index in permutation.iter_indices(self.position):
+            self._next = position + 1
+            if position in self._completed:
+                continue
+            self._outstanding.add(position)
+            yield position, index
+        self._next = permutation.steps
+
+    def complete(self, position: int, device: Optional[Dict[str, Any]]):
+        self._outstanding.discard(position)
+        self._completed.add(position)
+        self.probed += 1
+        if device:
+            self._pending_devices.append((device['ip_address'], json.dumps(device, default=_json_default)))
+
+    def maybe_save(self):
+        if time.monotonic() - self._saved_at >= self.store.interval:
+            self.save()
+
+    def save(self, finished: bool = False):
+        # Everything below the oldest probe still in flight is done
+        cursor = min(self._outstanding) if self._outstanding else self._next
+        self._completed = {p for p in self._completed if p >= cursor}
+        self.position = cursor
+        self.store._save(self, finished, self._pending_devices)
+        self._pending_devices = []
+        self._saved_at = time.monotonic()
+
+class ScanCheckpoint:
+    """Sweep checkpoints in a local SQLite file"""
+
+    def __init__(self, db_path: str = "scan_checkpoint.db", interval: float = 2.0):
+        self.db = SqliteDatabase(db_path)
+        self.interval = interval
+        self.init_database()
+
+    def init_database(self):
+        """Initialize SQLite tables for sweep cursors and partial results"""
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS sweep_checkpoints (
+                sweep_key TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                seed INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                completed TEXT NOT NULL,
+                probed INTEGER NOT NULL,
+                finished INTEGER NOT NULL DEFAULT 0,
+                ip_range TEXT,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (sweep_key, shard)
+            )
+        ''')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS sweep_results (
+                sweep_key TEXT NOT NULL,
+                ip_address TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                device TEXT NOT NULL,
+                PRIMARY KEY (sweep_key, ip_address)
+            )
+        ''')
+
+    def seed_for(self, key: str) -> Optional[int]:
+        """Seed of an interrupted sweep, so a resumed run walks the same permutation"""
+        row = self.db.query_one('SELECT seed FROM sweep_checkpoints WHERE sweep_key = ? LIMIT 1', (key,))
+        return row[0] if row else None
+
+    def shard(self, key: str, shard: int, seed: int, ip_range: Optional[str] = None) -> ShardProgress:
+        """Progress for a shard, resumed from the last checkpoint when there is one"""
+        row = self.db.query_one('''
+            SELECT seed, position, completed, probed FROM sweep_checkpoints WHERE sweep_key = ? AND shard = ?
+        ''', (key, shard))
+        if row and row[0] == seed:
+            logger.info(f"Resuming shard {shard} of sweep {key} at position {row[1]} ({row[3]} targets done)")
+            return ShardProgress(self, key, shard, seed, row[1], set(json.loads(row[2])), row[3], ip_range)
+        if row:
+            logger.info(f"Discarding checkpoint of shard {shard} of sweep {key}: the seed changed")
+            self.db.execute('DELETE FROM sweep_results WHERE sweep_key = ? AND shard = ?', (key, shard))
+        progress = ShardProgress(self, key, shard, seed, ip_range=ip_range)
+        self._save(progress, False, [])
+        return progress
+
+    def finished_shards(self, key: str) -> Set[int]:
+        rows = self.db.query_all('SELECT shard FROM sweep_checkpoints WHERE sweep_key = ? AND finished = 1', (key,))
+        return {row[0] for row in rows}
+
+    def results(self, key: str, shard: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Devices recorded so far, for the whole sweep or one shard"""
+        if shard is None:
+            rows = self.db.query_all('SELECT device FROM sweep_results WHERE sweep_key = ?', (key,))
+        else:
+            rows = self.db.query_all('SELECT device FROM sweep_results WHERE sweep_key = ? AND shard = ?',
+                                     (key, shard))
+        return [_load_device(row[0]) for row in rows]
+
+    def _save(self, progress: ShardProgress, finished: bool, devices: List[Tuple[str, str]]):
+        with self.db.transaction() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO sweep_results (sweep_key, ip_address, shard, device) VALUES (?, ?, ?, ?)
+            ''', [(progress.key, ip, progress.shard, device) for ip, device in devices])
+            conn.execute('''
+                INSERT INTO sweep_checkpoints
+                (sweep_key, shard, seed, position, completed, probed, finished, ip_range, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (sweep_key, shard) DO UPDATE SET
+                    seed = excluded.seed, position = excluded.position, completed = excluded.completed, probed = excluded.probed,
+                    finished = excluded.finished, updated_at = excluded.updated_at
+            ''', (progress.key, progress.shard, progress.seed, progress.position,
+                  json.dumps(sorted(progress._completed)), progress.probed, int(finished),
+                  progress.ip_range, datetime.now().isoformat(sep=' ')))
+
+    def clear(self, key: str, shards: Optional[Iterable[int]] = None):
+        """
+        Drop a sweep's checkpoint once the results have been handed over.
+        Clearing some shards only resets them: their rows keep the sweep's
+        seed, so later runs of any shard still walk the same permutation.
+        """
+        with self.db.transaction() as conn:
+            if shards is None:
+                conn.execute('DELETE FROM sweep_results WHERE sweep_key = ?', (key,))
+                conn.execute('DELETE FROM sweep_checkpoints WHERE sweep_key = ?', (key,))
+                return
+            updated_at = datetime.now().isoformat(sep=' ')
+            for shard in shards:
+                conn.execute('DELETE FROM sweep_results WHERE sweep_key = ? AND shard = ?', (key, shard))
+                conn.execute('''
+                    UPDATE sweep_checkpoints SET position = 0, completed = '[]', probed = 0, finished = 0, updated_at = ?
+                    WHERE sweep_key = ? AND shard = ?
+                ''', (updated_at, key, shard))
+
+    def list_sweeps(self) -> List[Dict[str, Any]]:
+        rows = self.db.query_all('''
+            SELECT c.sweep_key, MAX(c.ip_range), COUNT(*), SUM(c.finished), SUM(c.probed), MAX(c.updated_at),
+                   (SELECT COUNT(*) FROM sweep_results r WHERE r.sweep_key = c.sweep_key)
+            FROM sweep_checkpoints c GROUP BY c.sweep_key
+        ''')
+        return [{'sweep_key': r[0], 'ip_range': r[1], 'shards_started': r[2], 'shards_finished': r[3],
+                 'probed': r[4], 'updated_at': r[5], 'devices': r[6]} for r in rows]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or drop sweep checkpoints")
+    parser.add_argument('--db', default='scan_checkpoint.db')
+    parser.add_argument('--clear', metavar='SWEEP_KEY')
+    args = parser.parse_args()
+
+    store = ScanCheckpoint(args.db)
+    if args.clear:
+        store.clear(args.clear)
+    print(json.dumps(store.list_sweeps(), indent=2))
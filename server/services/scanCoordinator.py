@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Distributed sweep coordinator and workers
+
+The coordinator splits a target set into targetSpace shards (one seed,
+so shards are disjoint) and leases them to worker processes on this or
+other scanner nodes over newline-delimited JSON on TCP or a Unix socket.
+Workers sweep a leased shard with AdvancedMinerDetector, heartbeat while
+they do, and stream the devices back. A lease that misses its heartbeats,
+or whose worker disconnects, goes back to the queue for another worker.
+Results are merged by IP, so a re-leased shard never duplicates devices.
+
+Protocol (one JSON object per line):
+    worker -> {"type": "hello", "worker": id, "token": t}
+    worker -> {"type": "ready"}
+    coord  -> {"type": "lease", "lease": id, "shard": i, "shards": n, "seed": s, "sweep": {...}}
+            | {"type": "wait", "seconds": x} | {"type": "done"}
+    worker -> {"type": "heartbeat", "lease": id}
+    worker -> {"type": "devices", "lease": id, "devices": [...]}
+    worker -> {"type": "complete", "lease": id}
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Device batches can be large; lines up to this size are accepted
+MAX_LINE = 64 * 1024 * 1024
+DEVICE_BATCH = 500
+# A worker that has swept shards stops after this many refused reconnects in a row
+MAX_REFUSED = 3
+
+def _json_default(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, ensure_ascii=False, default=_json_default).encode('utf-8') + b'\n'
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    """('unix', path) or ('tcp', (host, port)) from 'unix:///path', 'tcp://host:port' or 'host:port'"""
+    if address.startswith('unix://'):
+        return 'unix', address[len('unix://'):]
+    if address.startswith('tcp://'):
+        address = address[len('tcp://'):]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '0.0.0.0', int(port))
+
+class Lease:
+    __slots__ = ('lease_id', 'shard', 'worker', 'expires', 'started', 'devices')
+
+    def __init__(self, lease_id: int, shard: int, worker: str, expires: float):
+        self.lease_id = lease_id
+        self.shard = shard
+        self.worker = worker
+        self.expires = expires
+        self.started = time.monotonic()
+        self.devices = 0
+
+class ScanCoordinator:
+    def __init__(self, ip_range: str, ports: List[int], exclude: Optional[List[str]] = None,
+                 shards: int = 64, seed: Optional[int] = None, lease_timeout: float = 30.0,
+                 scan_options: Optional[Dict[str, Any]] = None, token: Optional[str] = None,
+                 emit: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.sweep = {'ip_range': ip_range, 'ports': list(ports), 'exclude': list(exclude or []),
+                      'options': dict(scan_options or {})}
+        self.shards = shards
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.lease_timeout = lease_timeout
+        self.token = token
+        self.emit = emit
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'leases': 0, 'expired': 0, 'workers': 0, 'duplicates': 0}
+        self._pending: Deque[int] = deque(range(shards))
+        self._leases: Dict[int, Lease] = {}
+        self._finished: set = set()
+        self._lease_ids = itertools.count(1)
+        self._connections: Dict[asyncio.StreamWriter, Optional[asyncio.Task]] = {}
+        self._done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return len(self._finished) == self.shards
+
+    def _grant(self, worker: str) -> Optional[Lease]:
+        if not self._pending:
+            return None
+        shard = self._pending.popleft()
+        lease = Lease(next(self._lease_ids), shard, worker, time.monotonic() + self.lease_timeout)
+        self._leases[lease.lease_id] = lease
+        self.stats['leases'] += 1
+        return lease
+
+    def _requeue(self, lease: Lease, reason: str):
+        self._leases.pop(lease.lease_id, None)
+        if lease.shard not in self._finished:
+            logger.warning(f"Shard {lease.shard} re-queued ({reason}; worker {lease.worker})")
+            # Front of the queue, so a lost shard does not hold up the end of the sweep
+            self._pending.appendleft(lease.shard)
+
+    def _accept_devices(self, devices: List[Dict[str, Any]]):
+        fresh = []
+        for device in devices:
+            ip = device.get('ip_address')
+            if ip in self.devices:
+                self.stats['duplicates'] += 1
+                continue
+            self.devices[ip] = device
+            fresh.append(device)
+        if fresh and self.emit:
+            self.emit(fresh)
+
+    async def _reaper(self):
+        while not self._done.is_set():
+            now = time.monotonic()
+            for lease in [l for l in self._leases.values() if l.expires < now]:
+                self.stats['expired'] += 1
+                self._requeue(lease, "lease expired")
+            await asyncio.sleep(min(1.0, self.lease_timeout / 4))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker = None
+        held: Dict[int, Lease] = {}
+        self._connections[writer] = asyncio.current_task()
+        try:
+            hello = json.loads(await reader.readline() or b'{}')
+            if hello.get('type') != 'hello' or (self.token and hello.get('token') != self.token):
+                logger.warning(f"Rejected connection from {writer.get_extra_info('peername')}")
+                return
+            worker = str(hello.get('worker') or writer.get_extra_info('peername'))
+            self.stats['workers'] += 1
+            logger.info(f"Worker {worker} connected")
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                kind = message.get('type')
+                lease = self._leases.get(message.get('lease'))
+
+                if kind == 'ready':
+                    if self.finished:
+                        writer.write(encode_message({'type': 'done'}))
+                    else:
+                        granted = self._grant(worker)
+                        if granted:
+                            held[granted.lease_id] = granted
+                            writer.write(encode_message({
+                                'type': 'lease', 'lease': granted.lease_id, 'shard': granted.shard,
+                                'shards': self.shards, 'seed': self.seed, 'sweep': self.sweep,
+                                'heartbeat': self.lease_timeout / 3
+                            }))
+                        else:
+                            # Everything is leased; wait in case a lease is lost
+                            writer.write(encode_message({'type': 'wait', 'seconds': min(5.0, self.lease_timeout / 3)}))
+                    await writer.drain()
+                elif kind == 'heartbeat' and lease:
+                    lease.expires = time.monotonic() + self.lease_timeout
+                elif kind == 'devices':
+                    # Devices from an expired lease are still real; merging by IP drops repeats
+                    self._accept_devices(message.get('devices') or [])
+                    if lease:
+                        lease.devices += len(message.get('devices') or [])
+                        lease.expires = time.monotonic() + self.lease_timeout
+                elif kind == 'complete':
+                    held.pop(message.get('lease'), None)
+                    if lease:
+                        self._leases.pop(lease.lease_id, None)
+                        self._finished.add(lease.shard)
+                        logger.info(f"Shard {lease.shard} done by {worker} in "
+                                    f"{time.monotonic() - lease.started:.1f} s, {lease.devices} devices "
+                                    f"({len(self._finished)}/{self.shards})")
+                        if self.finished:
+                            self._done.set()
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Worker {worker} connection error: {e}")
+        finally:
+            for lease in held.values():
+                if lease.lease_id in self._leases:
+                    self._requeue(lease, "worker disconnected")
+            self._connections.pop(writer, None)
+            writer.close()
+            if worker:
+                logger.info(f"Worker {worker} disconnected")
+
+    async def run(self, address: str) -> Dict[str, Any]:
+        """Serve leases on address until every shard is finished; returns the merged sweep"""
+        kind, where = parse_address(address)
+        if kind == 'unix':
+            if os.path.exists(where):
+                os.unlink(where)
+            server = await asyncio.start_unix_server(self._handle, where, limit=MAX_LINE)
+        else:
+            server = await asyncio.start_server(self._handle, *where, limit=MAX_LINE)
+        started = time.monotonic()
+        logger.info(f"Coordinating {self.shards} shards of {self.sweep['ip_range']} on {address}")
+        reaper = asyncio.ensure_future(self._reaper())
+        try:
+            if self.shards:
+                await self._done.wait()
+            # Let connected workers ask for more work and hear 'done' before the server goes away
+            handlers = [task for task in self._connections.values() if task]
+            if handlers:
+                _, lingering = await asyncio.wait(handlers, timeout=max(5.0, self.lease_timeout / 3))
+                for writer in list(self._connections):
+                    writer.close()
+                if lingering:
+                    await asyncio.wait(lingering, timeout=1.0)
+        finally:
+            reaper.cancel()
+            server.close()
+            await server.wait_closed()
+            if kind == 'unix' and os.path.exists(where):
+                os.unlink(where)
+        return {
+            'scan_session': {**self.sweep, 'shards': self.shards, 'seed': self.seed, **self.stats,
+                             'duration_s': round(time.monotonic() - started, 3), 'status': 'completed'},
+            'detected_devices': list(self.devices.values()),
+            'total_devices': len(self.devices)
+        }
+
+async def _connect(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    kind, where = parse_address(address)
+    if kind == 'unix':
+        return await asyncio.open_unix_connection(where, limit=MAX_LINE)
+    return await asyncio.open_connection(*where, limit=MAX_LINE)
+
+def default_detector(options: Dict[str, Any]):
+    from minerDetector import AdvancedMinerDetector
+    detector = AdvancedMinerDetector(snmp=options.get('snmp', True), snmp_communities=options.get('snmp_communities'))
+    # Each node paces its own probes within the envelope given for the sweep
+    if options.get('pacing') and detector.probes.pacer:
+        detector.probes.pacer.configure(**options['pacing'])
+    return detector
+
+async def run_worker(address: str, worker_id: Optional[str] = None, token: Optional[str] = None,
+                     detector_factory: Callable[[Dict[str, Any]], Any] = default_detector,
+                     retry: float = 2.0, give_up: float = 60.0) -> int:
+    """
+    Take and sweep leases until the coordinator says the sweep is done; returns
+    shards swept. A worker that misses "done" stops once the coordinator keeps
+    refusing it after some shards, or has been out of reach for give_up seconds.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    loop = asyncio.get_running_loop()
+    swept = 0
+    refused = 0
+    last_contact = time.monotonic()
+    detector = None
+
+    while True:
+        try:
+            reader, writer = await _connect(address)
+        except OSError as e:
+            refused += 1
+            if (swept and refused >= MAX_REFUSED) or time.monotonic() - last_contact > give_up:
+                # The coordinator has finished (or never came up) and shut down
+                logger.info(f"Coordinator at {address} gone ({e}); stopping")
+                if detector:
+                    detector.close()
+                return swept
+            logger.info(f"Coordinator at {address} unavailable ({e}); retrying")
+            await asyncio.sleep(retry)
+            continue
+        refused = 0
+        try:
+            writer.write(encode_message({'type': 'hello', 'worker': worker_id, 'token': token}))
+            while True:
+                writer.write(encode_message({'type': 'ready'}))
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("coordinator closed the connection")
+                last_contact = time.monotonic()
+                message = json.loads(line)
+                if message['type'] == 'done':
+                    if detector:
+                        detector.close()
+                    return swept
+                if message['type'] == 'wait':
+                    await asyncio.sleep(message['seconds'])
+                    continue
+
+                sweep = message['sweep']
+                if detector is None:
+                    detector = detector_factory(sweep['options'])
+
+                async def heartbeat():
+                    while True:
+                        await asyncio.sleep(message['heartbeat'])
+                        writer.write(encode_message({'type': 'heartbeat', 'lease': message['lease']}))
+                        await writer.drain()
+
+                async def send(devices):
+                    writer.write(encode_message({'type': 'devices', 'lease': message['lease'], 'devices': devices}))
+                    await writer.drain()
+
+                lost = []
+
+                def stream(devices):
+                    # Called on the scan thread; waits until the batch is on the wire
+                    try:
+                        asyncio.run_coroutine_threadsafe(send(devices), loop).result()
+                    except (ConnectionError, OSError) as e:
+                        lost.append(e)
+                        raise
+
+                beating = asyncio.ensure_future(heartbeat())
+                try:
+                    # The detector's own thread pool does the probing; the loop keeps heartbeats going
+                    await loop.run_in_executor(None, lambda: detector.scan_network_range(
+                        sweep['ip_range'], sweep['ports'], exclude=sweep['exclude'], seed=message['seed'],
+                        shard=message['shard'], shards=message['shards'], on_devices=stream,
+                        batch_size=DEVICE_BATCH))
+                finally:
+                    beating.cancel()
+                if lost:
+                    raise lost[0]
+                writer.write(encode_message({'type': 'complete', 'lease': message['lease']}))
+                swept += 1
+        except (ConnectionError, OSError) as e:
+            logger.warning(f"Lost coordinator ({e}); reconnecting")
+            await asyncio.sleep(retry)
+        finally:
+            writer.close()
+
+def main():
+    import argparse
+    import subprocess
+    import sys
+
+    parser = argparse.ArgumentParser(description="Distributed miner sweep: coordinator and workers")
+    sub = parser.add_subparsers(dest='command', required=True)
+    coord = sub.add_parser('coordinate', help="Lease shards of a range to workers and merge their results")
+    coord.add_argument('ip_range')
+    coord.add_argument('--ports', default='22,80,443,4028,8080,9999,3333,4444')
+    coord.add_argument('--exclude', action='append', default=[])
+    coord.add_argument('--listen', default='tcp://0.0.0.0:7070', help="tcp://host:port or unix:///path")
+    coord.add_argument('--shards', type=int, default=64)
+    coord.add_argument('--seed', type=int)
+    coord.add_argument('--lease-timeout', type=float, default=30.0)
+    coord.add_argument('--no-snmp', action='store_true')
+    coord.add_argument('--rate', type=float, help="Probes per second per worker node")
+    coord.add_argument('--subnet-rate', type=float, help="Probes per second per /24 per worker node")
+    coord.add_argument('--local-workers', type=int, default=0, help="Also start this many worker processes here")
+    work = sub.add_parser('work', help="Sweep shards leased by a coordinator")
+    work.add_argument('connect', help="tcp://host:port or unix:///path")
+    work.add_argument('--id')
+    work.add_argument('--give-up', type=float, default=60.0,
+                      help="Stop after the coordinator has been unreachable this many seconds")
+    parser.add_argument('--token', default=os.environ.get('SCAN_COORDINATOR_TOKEN'))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'work':
+        swept = asyncio.run(run_worker(args.connect, args.id, args.token, give_up=args.give_up))
+        logger.info(f"Sweep finished; this worker swept {swept} shards")
+        return
+
+    def emit(devices):
+        for device in devices:
+            sys.stdout.write(json.dumps({'type': 'device', **device}, ensure_ascii=False, default=_json_default) + '\n')
+        sys.stdout.flush()
+
+    options = {'snmp': not args.no_snmp}
+    pacing = {key: value for key, value in (('rate', args.rate), ('subnet_rate', args.subnet_rate)) if value}
+    if pacing:
+        options['pacing'] = pacing
+    coordinator = ScanCoordinator(args.ip_range, [int(p) for p in args.ports.split(',')], args.exclude,
+                                  args.shards, args.seed, args.lease_timeout, options,
+                                  args.token, emit)
+    workers = []
+    if args.local_workers:
+        kind, where = parse_address(args.listen)
+        connect = args.listen if kind == 'unix' else f"tcp://{'127.0.0.1' if where[0] == '0.0.0.0' else where[0]}:{where[1]}"
+        env = dict(os.environ, SCAN_COORDINATOR_TOKEN=args.token or '')
+        workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), 'work', connect,
+                                     '--id', f'local-{i}'], env=env) for i in range(args.local_workers)]
+    try:
+        result = asyncio.run(coordinator.run(args.listen))
+    finally:
+        for process in workers:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    print(json.dumps({'type': 'result', 'scan_session': result['scan_session'],
+                      'total_devices': result['total_devices']}, ensure_ascii=False), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-host scan state for incremental miner sweeps
+"""
+
+import hashlib
+import ipaddress
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def device_fingerprint(device: Dict[str, Any]) -> Optional[str]:
+    """Short stable hash of what a host looked like to the detector"""
+    detection = device.get('detection_results') or {}
+    if not device.get('open_ports') and not detection:
+        return None
+
+    basis = {
+        'device_type': detection.get('device_type'),
+        'software': detection.get('mining_software'),
+        'is_miner': detection.get('is_miner', False),
+        'methods': sorted(detection.get('detection_methods', []))
+    }
+    return hashlib.sha1(json.dumps(basis, sort_keys=True).encode()).hexdigest()[:16]
+
+def diff_host_states(previous: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]],
+                     probed: set) -> Dict[str, List[Any]]:
+    """Compare host states before and after a sweep, limited to the addresses probed"""
+    diff = {'new': [], 'gone': [], 'changed': []}
+
+    for ip in probed:
+        before = previous.get(ip)
+        after = current.get(ip)
+        was_alive = bool(before and before['alive'])
+        is_alive = bool(after and after['alive'])
+
+        if is_alive and not was_alive:
+            diff['new'].append(ip)
+        elif was_alive and not is_alive:
+            diff['gone'].append(ip)
+        elif was_alive and is_alive:
+            if (before['open_ports'] != after['open_ports'] or
+                    before['fingerprint'] != after['fingerprint']):
+                diff['changed'].append({
+                    'ip_address': ip,
+                    'before': {'open_ports': before['open_ports'], 'fingerprint': before['fingerprint']},
+                    'after': {'open_ports': after['open_ports'], 'fingerprint': after['fingerprint']}
+                })
+
+    diff['new'].sort(key=lambda ip: int(ipaddress.IPv4Address(ip)))
+    diff['gone'].sort(key=lambda ip: int(ipaddress.IPv4Address(ip)))
+    return diff
+
+class HostStateStore:
+    """Last known state per host plus a rotating sweep cursor per range"""
+
+    def __init__(self, db_path: str = "scan_state.db"):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Initialize SQLite tables for host state and sweep cursors"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS host_state (
+                ip_int INTEGER PRIMARY KEY,
+                ip_address TEXT NOT NULL,
+                alive BOOLEAN NOT NULL,
+                open_ports TEXT NOT NULL,
+                fingerprint TEXT,
+                is_miner BOOLEAN NOT NULL DEFAULT 0,
+                last_seen TEXT,
+                last_probed TEXT NOT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sweep_cursors (
+                ip_range TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                updated TEXT NOT NULL
+            )
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def load_range(self, ip_range: str) -> Dict[str, Dict[str, Any]]:
+        """Load the last known state of every host recorded inside a range"""
+        network = ipaddress.IPv4Network(ip_range, strict=False)
+
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT ip_address, alive, open_ports, fingerprint, is_miner, last_seen, last_probed
+            FROM host_state WHERE ip_int BETWEEN ? AND ?
+        ''', (int(network.network_address), int(network.broadcast_address))).fetchall()
+        conn.close()
+
+        return {
+            row[0]: {
+                'alive': bool(row[1]),
+                'open_ports': json.loads(row[2]),
+                'fingerprint': row[3],
+                'is_miner': bool(row[4]),
+                'last_seen': row[5],
+                'last_probed': row[6]
+            }
+            for row in rows
+        }
+
+    def next_sweep_window(self, ip_range: str, total: int, count: int) -> Tuple[int, int]:
+        """Next slice of host indexes to sweep; the cursor only moves in commit_sweep_window"""
+        if total <= 0:
+            return 0, 0
+        count = min(count, total)
+
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('SELECT position FROM sweep_cursors WHERE ip_range = ?', (ip_range,)).fetchone()
+        conn.close()
+
+        start = row[0] % total if row else 0
+        return start, count
+
+    def commit_sweep_window(self, ip_range: str, total: int, start: int, count: int):
+        """Advance the cursor past a slice once its sweep has been recorded"""
+        if total <= 0:
+            return
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            INSERT OR REPLACE INTO sweep_cursors (ip_range, position, updated)
+            VALUES (?, ?, ?)
+        ''', (ip_range, (start + count) % total, datetime.now().isoformat()))
+        conn.commit()
+        conn.close()
+
+    def record(self, states: Dict[str, Dict[str, Any]]):
+        """Persist host states produced by a sweep"""
+        if not states:
+            return
+
+        rows = [
+            (
+                int(ipaddress.IPv4Address(ip)),
+                ip,
+                state['alive'],
+                json.dumps(state['open_ports']),
+                state['fingerprint'],
+                state['is_miner'],
+                state['last_seen'],
+                state['last_probed']
+            )
+            for ip, state in states.items()
+        ]
+
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany('''
+            INSERT OR REPLACE INTO host_state
+            (ip_int, ip_address, alive, open_ports, fingerprint, is_miner, last_seen, last_probed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def state_from_device(device: Optional[Dict[str, Any]], previous: Optional[Dict[str, Any]],
+                          now: str) -> Dict[str, Any]:
+        """Build a host state row from a scan_host result (None means no response)"""
+        if device is None:
+            return {
+                'alive': False,
+                'open_ports': [],
+                'fingerprint': None,
+                'is_miner': False,
+                'last_seen': previous['last_seen'] if previous else None,
+                'last_probed': now
+            }
+
+        detection = device.get('detection_results') or {}
+        return {
+            'alive': True,
+            'open_ports': sorted(device.get('open_ports', [])),
+            'fingerprint': device_fingerprint(device),
+            'is_miner': bool(detection.get('is_miner')),
+            'last_seen': now,
+            'last_probed': now
+        }
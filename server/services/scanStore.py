@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bounded, persistent store for network scan results
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class ScanResultStore:
+    """Keeps recent scans in an LRU cache and writes every host row through to SQLite"""
+
+    def __init__(self, db_path: str = "scan_results.db", max_cached_scans: int = 16,
+                 max_cached_hosts: int = 20000):
+        self.db_path = db_path
+        self.max_cached_scans = max_cached_scans
+        # Per-scan ceiling; larger scans are served from SQLite only
+        self.max_cached_hosts = max_cached_hosts
+
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.init_database()
+
+    def init_database(self):
+        """Initialize SQLite tables for scan metadata and host rows"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scans (
+                scan_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                metadata TEXT,
+                result_count INTEGER NOT NULL DEFAULT 0,
+                start_time TEXT NOT NULL,
+                end_time TEXT,
+                error TEXT
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_hosts (
+                scan_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (scan_id, seq)
+            )
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def new_scan_id(self) -> str:
+        """Generate a scan id that stays unique for scans started in the same second"""
+        return f"scan_{int(time.time())}_{uuid.uuid4().hex[:12]}"
+
+    def create_scan(self, scan_id: str, metadata: Dict[str, Any], status: str = 'running') -> Dict[str, Any]:
+        """Register a new scan and return its summary record"""
+        record = {
+            'scan_id': scan_id,
+            'status': status,
+            **metadata,
+            'result_count': 0,
+            'start_time': metadata.get('start_time', datetime.now().isoformat()),
+            'end_time': None
+        }
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            INSERT OR REPLACE INTO scans (scan_id, status, metadata, result_count, start_time)
+            VALUES (?, ?, ?, 0, ?)
+        ''', (scan_id, status, json.dumps(metadata, default=str), record['start_time']))
+        conn.commit()
+        conn.close()
+
+        with self._lock:
+            self._cache[scan_id] = {'summary': record, 'results': []}
+            self._cache.move_to_end(scan_id)
+            self._evict()
+
+        return record
+
+    def append_results(self, scan_id: str, results: Iterable[Dict[str, Any]]):
+        """Append a batch of host results to a scan"""
+        results = list(results)
+        if not results:
+            return
+
+        with self._lock:
+            entry = self._cache.get(scan_id)
+            offset = entry['summary']['result_count'] if entry else self._count_results(scan_id)
+
+            rows = [(scan_id, offset + i, json.dumps(result, default=str)) for i, result in enumerate(results)]
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany('INSERT INTO scan_hosts (scan_id, seq, data) VALUES (?, ?, ?)', rows)
+            conn.execute('UPDATE scans SET result_count = ? WHERE scan_id = ?', (offset + len(results), scan_id))
+            conn.commit()
+            conn.close()
+
+            if entry:
+                entry['summary']['result_count'] = offset + len(results)
+                if entry['results'] is not None:
+                    if entry['summary']['result_count'] > self.max_cached_hosts:
+                        # Too large to keep in memory; page from disk from now on
+                        entry['results'] = None
+                    else:
+                        entry['results'].extend(results)
+
+    def finish_scan(self, scan_id: str, status: str, error: Optional[str] = None,
+                    extra: Optional[Dict[str, Any]] = None):
+        """Mark a scan as completed or failed, merging any extra metadata"""
+        end_time = datetime.now().isoformat()
+
+        conn = sqlite3.connect(self.db_path)
+        if extra:
+            row = conn.execute('SELECT metadata FROM scans WHERE scan_id = ?', (scan_id,)).fetchone()
+            metadata = json.loads(row[0]) if row and row[0] else {}
+            metadata.update(extra)
+            conn.execute('UPDATE scans SET metadata = ? WHERE scan_id = ?',
+                         (json.dumps(metadata, default=str), scan_id))
+        conn.execute('UPDATE scans SET status = ?, end_time = ?, error = ? WHERE scan_id = ?',
+                     (status, end_time, error, scan_id))
+        conn.commit()
+        conn.close()
+
+        with self._lock:
+            entry = self._cache.get(scan_id)
+            if entry:
+                entry['summary']['status'] = status
+                entry['summary']['end_time'] = end_time
+                if extra:
+                    entry['summary'].update(extra)
+                if error:
+                    entry['summary']['error'] = error
+
+    def get_scan(self, scan_id: str) -> Optional[Dict[str, Any]]:
+        """Get the summary record of a scan without its host results"""
+        with self._lock:
+            entry = self._cache.get(scan_id)
+            if entry:
+                self._cache.move_to_end(scan_id)
+                return dict(entry['summary'])
+
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('''
+            SELECT scan_id, status, metadata, result_count, start_time, end_time, error
+            FROM scans WHERE scan_id = ?
+        ''', (scan_id,)).fetchone()
+        conn.close()
+
+        if not row:
+            return None
+
+        summary = {
+            'scan_id': row[0],
+            'status': row[1],
+            **(json.loads(row[2]) if row[2] else {}),
+            'result_count': row[3],
+            'start_time': row[4],
+            'end_time': row[5]
+        }
+        if row[6]:
+            summary['error'] = row[6]
+        return summary
+
+    def get_results(self, scan_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get a page of host results, reading from SQLite when the scan is not cached"""
+        offset = max(0, offset)
+        if limit == 0:
+            return []
+
+        with self._lock:
+            entry = self._cache.get(scan_id)
+            if entry and entry['results'] is not None:
+                self._cache.move_to_end(scan_id)
+                end = None if limit is None else offset + limit
+                return entry['results'][offset:end]
+
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT data FROM scan_hosts
+            WHERE scan_id = ? AND seq >= ?
+            ORDER BY seq
+            LIMIT ?
+        ''', (scan_id, offset, -1 if limit is None else limit)).fetchall()
+        conn.close()
+
+        return [json.loads(row[0]) for row in rows]
+
+    def _count_results(self, scan_id: str) -> int:
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('SELECT result_count FROM scans WHERE scan_id = ?', (scan_id,)).fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def _evict(self):
+        """Drop least recently used scans from memory; their rows stay on disk"""
+        while len(self._cache) > self.max_cached_scans:
+            scan_id, entry = next(iter(self._cache.items()))
+            if entry['summary']['status'] == 'running':
+                # Never evict a scan that is still being written
+                self._cache.move_to_end(scan_id)
+                if all(e['summary']['status'] == 'running' for e in self._cache.values()):
+                    break
+                continue
+            self._cache.popitem(last=False)
+            logger.debug(f"Evicted scan {scan_id} from result cache")
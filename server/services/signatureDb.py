@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Versioned miner signature database
+
+Loads signatures/minerSignatures.json once, compiles it into lookup
+structures (port sets, combined regexes, a sorted harmonic index for RF
+peaks) and swaps in a newly compiled snapshot when the file changes on
+disk, so long-running workers pick up new signatures without a restart.
+"""
+
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SIGNATURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'signatures', 'minerSignatures.json')
+
+_TITLE = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+
+def _alternation(words: List[str]) -> str:
+    # Longest first so that overlapping names resolve to the most specific one
+    return '|'.join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+
+class WebFingerprintDb:
+    """Compiled form of the 'web' section"""
+
+    def __init__(self, section: Dict[str, Any], version: str):
+        self.version = version
+        self.min_keywords = section.get('min_keywords', 2)
+        self.max_body_bytes = section.get('max_body_bytes', 65536)
+        self.max_favicon_bytes = section.get('max_favicon_bytes', 32768)
+        self.header_rules = [
+            (rule['header'].lower(), rule['contains'].lower(), rule) for rule in section.get('header_rules', [])
+        ]
+        self.title_rules = [(rule['contains'].lower(), rule) for rule in section.get('title_rules', [])]
+        self.favicons = {k.lower(): v for k, v in section.get('favicon_sha256', {}).items()}
+
+        keywords = [k.lower() for k in section.get('keywords', [])]
+        self.keyword_pattern = re.compile(_alternation(keywords)) if keywords else None
+
+    def match_headers(self, headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        for name, needle, rule in self.header_rules:
+            if needle in headers.get(name, '').lower():
+                return rule
+        return None
+
+    def match_body(self, body: str) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        lowered = body.lower()
+        title_rule = None
+        title = _TITLE.search(lowered)
+        if title:
+            title_rule = next((rule for needle, rule in self.title_rules if needle in title.group(1)), None)
+        found = sorted(set(self.keyword_pattern.findall(lowered))) if self.keyword_pattern else []
+        return title_rule, found
+
+class SnmpSignatureDb:
+    """Compiled form of the 'snmp' section"""
+
+    def __init__(self, section: Dict[str, Any], version: str):
+        self.version = version
+        self.port = section.get('port', 161)
+        self.communities: List[str] = list(section.get('communities', ['public']))
+        self.max_repetitions = section.get('max_repetitions', 16)
+        self.max_walk_rows = section.get('max_walk_rows', 256)
+        self.system_oids: Dict[str, str] = dict(section.get('system_oids', {}))
+        self.vendors: List[Dict[str, Any]] = list(section.get('vendors', []))
+
+        # Every scalar OID fetched in the first GET, mapped back to its field name
+        self.fields: Dict[str, str] = {oid: name for name, oid in self.system_oids.items()}
+        for vendor in self.vendors:
+            for name, oid in vendor.get('oids', {}).items():
+                self.fields.setdefault(oid, name)
+        self.get_oids: List[str] = list(self.fields)
+
+        self._keywords = {k.lower(): v for v in self.vendors for k in v.get('descr_keywords', [])}
+        self.descr_pattern = re.compile(_alternation(list(self._keywords))) if self._keywords else None
+
+    def match(self, sys_descr: Optional[str], sys_object_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Vendor rule by enterprise subtree of sysObjectID, then by sysDescr keyword"""
+        if sys_object_id:
+            for vendor in self.vendors:
+                enterprise = vendor.get('enterprise')
+                if enterprise and (sys_object_id == enterprise or sys_object_id.startswith(enterprise + '.')):
+                    return vendor
+        if sys_descr and self.descr_pattern:
+            match = self.descr_pattern.search(sys_descr.lower())
+            if match:
+                return self._keywords[match.group(0)]
+        return None
+
+class AcousticSignatureDb:
+    """Compiled form of the 'acoustic' section"""
+
+    def __init__(self, section: Dict[str, Any], version: str):
+        self.version = version
+        self.fingerprint_bands = section.get('fingerprint_bands', 48)
+        self.min_frequency = float(section.get('min_frequency', 50))
+        self.max_frequency = float(section.get('max_frequency', 8000))
+        self.blade_pass_range: Tuple[float, float] = tuple(section.get('blade_pass_range', [40, 900]))
+        self.min_tonal_prominence = float(section.get('min_tonal_prominence', 6.0))
+        self.default_blades = section.get('default_blades', 7)
+        self.match_threshold = float(section.get('match_threshold', 0.85))
+        self.models: Dict[str, Dict[str, Any]] = dict(section.get('models', {}))
+
+    def blades(self, model: Optional[str]) -> int:
+        return self.models.get(model, {}).get('blades', self.default_blades)
+
+    def rpm_plausible(self, model: str, rpm: float) -> bool:
+        low, high = self.models.get(model, {}).get('rpm', (0, float('inf')))
+        return low <= rpm <= high
+
+class CompiledSignatures:
+    """Immutable snapshot of one signature database version"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.version = data.get('version', 'unknown')
+
+        ports = data.get('ports', {})
+        self.miner_ports: Dict[int, str] = {int(port): label for port, label in ports.get('miner', {}).items()}
+        self.api_ports: Set[int] = frozenset(ports.get('api', []))
+        self.web_ports: Set[int] = frozenset(ports.get('web', []))
+        self.stratum_ports: Set[int] = frozenset(ports.get('stratum', []))
+        self.pool_connection_ports: Set[int] = frozenset(ports.get('pool_connection', []))
+        self.traffic_ports: List[int] = list(ports.get('traffic', []))
+
+        self.miner_processes: Set[str] = frozenset(data.get('processes', []))
+        # Matches a process name or anywhere in a command line, with or without ".exe"
+        stems = [re.sub(r'\.exe$', '', p.lower()) for p in self.miner_processes]
+        self.process_pattern = re.compile(r'(?<![\w-])(' + _alternation(stems) + r')(?:\.exe)?(?![\w-])',
+                                          re.IGNORECASE) if stems else None
+
+        # Substring automata over lower-cased process names and command lines
+        keywords = [k.lower() for k in data.get('process_keywords', [])]
+        self.process_keyword_pattern = re.compile(_alternation(keywords)) if keywords else None
+        arguments = [a.lower() for a in data.get('process_arguments', [])]
+        self.process_argument_pattern = re.compile(_alternation(arguments)) if arguments else None
+
+        self.mining_algorithms: List[str] = list(data.get('algorithms', []))
+        self.algorithm_pattern = re.compile(r'\b(' + _alternation(self.mining_algorithms) + r')\b',
+                                            re.IGNORECASE) if self.mining_algorithms else None
+
+        self.mining_pools: Set[str] = frozenset(h.lower() for h in data.get('pools', []))
+
+        stratum = data.get('stratum', {})
+        self.stratum_methods: List[bytes] = [m.encode() for m in stratum.get('methods', [])]
+        self.stratum_response_keywords: List[str] = list(stratum.get('response_keywords', []))
+
+        self.mac_vendors: Dict[str, str] = {k.upper(): v for k, v in data.get('mac_vendors', {}).items()}
+
+        rf = data.get('rf', {})
+        self.rf_signatures: Dict[str, Dict[str, Any]] = rf.get('signatures', {})
+        self.harmonic_tolerance = rf.get('harmonic_tolerance', 0.05)
+        self._build_harmonic_index()
+
+        self.web = WebFingerprintDb(data.get('web', {}), self.version)
+        self.snmp = SnmpSignatureDb(data.get('snmp', {}), self.version)
+        self.acoustic = AcousticSignatureDb(data.get('acoustic', {}), self.version)
+
+    def _build_harmonic_index(self):
+        """Sorted (expected frequency, tolerance, device, base index) for every harmonic of every signature"""
+        entries = []
+        for device, signature in self.rf_signatures.items():
+            for base_index, base in enumerate(signature['switching_frequency']):
+                for harmonic in signature['harmonic_pattern']:
+                    entries.append((base * harmonic, base * self.harmonic_tolerance, device, base_index))
+        entries.sort()
+        self._harmonic_freqs = [e[0] for e in entries]
+        self._harmonic_entries = entries
+        self._max_tolerance = max((e[1] for e in entries), default=0.0)
+
+    def harmonic_matches(self, frequency: float) -> Set[Tuple[str, int]]:
+        """(device, base index) pairs with a harmonic within tolerance of frequency"""
+        lo = bisect.bisect_left(self._harmonic_freqs, frequency - self._max_tolerance)
+        hi = bisect.bisect_right(self._harmonic_freqs, frequency + self._max_tolerance)
+        return {
+            (device, base_index)
+            for expected, tolerance, device, base_index in self._harmonic_entries[lo:hi]
+            if abs(frequency - expected) < tolerance
+        }
+
+    def score_rf_peaks(self, peaks: List[Dict[str, Any]]) -> Dict[str, float]:
+        """Confidence per RF signature for a set of spectrum peaks"""
+        if not peaks:
+            return {}
+
+        factors: Dict[str, List[float]] = {device: [] for device in self.rf_signatures}
+        for peak in peaks:
+            for device, _ in self.harmonic_matches(peak['frequency']):
+                power_range = self.rf_signatures[device]['power_signature']
+                factors[device].append(0.8 if power_range['min'] <= peak['power'] <= power_range['max'] else 0.4)
+
+        avg_snr = sum(p['snr'] for p in peaks) / len(peaks)
+        scores = {}
+        for device, signature in self.rf_signatures.items():
+            device_factors = factors[device]
+            if abs(avg_snr - signature['noise_floor_delta']) < 5:
+                device_factors.append(0.7)
+            scores[device] = min(1.0, sum(device_factors) / len(device_factors)) if device_factors else 0.0
+        return scores
+
+    def match_process(self, text: str) -> Optional[str]:
+        """Known miner binary named in a process name or command line"""
+        if not self.process_pattern:
+            return None
+        match = self.process_pattern.search(text)
+        return match.group(1).lower() if match else None
+
+    def classify_process(self, name: str, cmdline: str) -> Tuple[int, List[str]]:
+        """Static (score, reasons) for a process from its name and lowercased command line"""
+        name = name.lower()
+        score, reasons = 0, []
+        if self.match_process(name) or self.match_process(cmdline.split(' ', 1)[0]):
+            score += 50
+            reasons.append('known_miner_process')
+        if self.process_keyword_pattern and self.process_keyword_pattern.search(name):
+            score += 30
+            reasons.append('suspicious_name')
+        if self.process_argument_pattern and self.process_argument_pattern.search(cmdline):
+            score += 35
+            reasons.append('mining_arguments')
+        return score, reasons
+
+    def mac_vendor(self, mac: str) -> Optional[str]:
+        return self.mac_vendors.get(mac[:8].upper().replace('-', ':'))
+
+class SignatureDatabase:
+    """Signature file with mtime-based hot reload"""
+
+    def __init__(self, path: str = SIGNATURES_PATH, check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[CompiledSignatures] = None
+        self._mtime = None
+        self._last_check = 0.0
+
+    def current(self) -> CompiledSignatures:
+        """Latest compiled snapshot; stats the file at most once per check_interval"""
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._last_check < self.check_interval:
+            return self._snapshot
+
+        with self._lock:
+            if self._snapshot is None or now - self._last_check >= self.check_interval:
+                self._last_check = now
+                self._reload_if_changed()
+            return self._snapshot
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            if self._snapshot is None:
+                raise
+            logger.error(f"Signature database unavailable, keeping version {self._snapshot.version}: {e}")
+            return
+        if mtime == self._mtime:
+            return
+
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                snapshot = CompiledSignatures(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if self._snapshot is None:
+                raise
+            # Remember the bad mtime so the error is logged once per edit
+            self._mtime = mtime
+            logger.error(f"Invalid signature database, keeping version {self._snapshot.version}: {e}")
+            return
+
+        if self._snapshot is not None:
+            logger.info(f"Signature database reloaded: {self._snapshot.version} -> {snapshot.version}")
+        self._snapshot = snapshot
+        self._mtime = mtime
+
+# Global instance shared by every detector in the process
+signature_db = SignatureDatabase()
+
+def current_signatures() -> CompiledSignatures:
+    return signature_db.current()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asynchronous SNMP crawler for miner OIDs
+
+One UDP socket (the engine) carries every request; replies are matched
+back to their waiting coroutine by request-id, so thousands of hosts can
+be polled concurrently under a single semaphore. The first SNMPv2c GET
+asks for sysDescr/sysObjectID/sysName and every vendor scalar OID in one
+PDU; hosts identified as miners then get a GETBULK walk of their vendor
+subtree. Replies are parsed into the record consumed by
+AdvancedMinerDetector.detect_miner_signatures.
+"""
+
+import asyncio
+import ipaddress
+import itertools
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from probeControl import ProbeController, controller as default_probe_controller
+from signatureDb import SnmpSignatureDb, current_signatures
+
+logger = logging.getLogger(__name__)
+
+SNMP_V2C = 1
+
+GET_REQUEST = 0xA0
+RESPONSE = 0xA2
+GET_BULK_REQUEST = 0xA5
+
+_INTEGER = 0x02
+_OCTET_STRING = 0x04
+_NULL = 0x05
+_OID = 0x06
+_SEQUENCE = 0x30
+_IP_ADDRESS = 0x40
+_UNSIGNED = {0x41, 0x42, 0x43, 0x46}  # Counter32, Gauge32, TimeTicks, Counter64
+# noSuchObject, noSuchInstance, endOfMibView
+_EXCEPTIONS = {0x80: 'noSuchObject', 0x81: 'noSuchInstance', 0x82: 'endOfMibView'}
+
+class SnmpError(ValueError):
+    pass
+
+# --- BER encoding -----------------------------------------------------------
+
+def _length(n: int) -> bytes:
+    if n < 0x80:
+        return bytes([n])
+    body = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(body)]) + body
+
+def _tlv(tag: int, value: bytes) -> bytes:
+    return bytes([tag]) + _length(len(value)) + value
+
+def _integer(n: int) -> bytes:
+    return _tlv(_INTEGER, n.to_bytes(max(1, (n.bit_length() + 8) // 8), 'big', signed=True))
+
+def _oid(oid: str) -> bytes:
+    arcs = [int(a) for a in oid.strip('.').split('.')]
+    if len(arcs) < 2:
+        raise SnmpError(f"Invalid OID {oid}")
+    body = bytearray([40 * arcs[0] + arcs[1]])
+    for arc in arcs[2:]:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        body += bytes(reversed(chunk))
+    return _tlv(_OID, bytes(body))
+
+def encode_request(pdu_type: int, request_id: int, community: str, oids: Iterable[str],
+                   non_repeaters: int = 0, max_repetitions: int = 0) -> bytes:
+    """SNMPv2c message with NULL-valued varbinds; the two counters are error fields for GET"""
+    varbinds = b''.join(_tlv(_SEQUENCE, _oid(oid) + _tlv(_NULL, b'')) for oid in oids)
+    pdu = _tlv(pdu_type, _integer(request_id) + _integer(non_repeaters) + _integer(max_repetitions)
+               + _tlv(_SEQUENCE, varbinds))
+    return _tlv(_SEQUENCE, _integer(SNMP_V2C) + _tlv(_OCTET_STRING, community.encode()) + pdu)
+
+# --- BER decoding -----------------------------------------------------------
+
+def _read_tlv(data: bytes, pos: int) -> Tuple[int, int, int]:
+    """(tag, value start, value end) of the element at pos"""
+    if pos + 2 > len(data):
+        raise SnmpError("Truncated SNMP message")
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[pos:pos + size], 'big')
+        pos += size
+    if pos + length > len(data):
+        raise SnmpError("Truncated SNMP message")
+    return tag, pos, pos + length
+
+def _decode_oid(value: bytes) -> str:
+    if not value:
+        return ''
+    arcs = [value[0] // 40, value[0] % 40] if value[0] < 80 else [2, value[0] - 80]
+    arc = 0
+    for byte in value[1:]:
+        arc = (arc << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            arcs.append(arc)
+            arc = 0
+    return '.'.join(map(str, arcs))
+
+def _decode_value(tag: int, value: bytes) -> Any:
+    if tag == _INTEGER:
+        return int.from_bytes(value, 'big', signed=True)
+    if tag in _UNSIGNED:
+        return int.from_bytes(value, 'big')
+    if tag == _OCTET_STRING:
+        try:
+            text = value.decode('utf-8')
+            if text.isprintable() or not text:
+                return text
+        except UnicodeDecodeError:
+            pass
+        return value.hex(':')
+    if tag == _OID:
+        return _decode_oid(value)
+    if tag == _IP_ADDRESS and len(value) == 4:
+        return str(ipaddress.IPv4Address(value))
+    if tag == _NULL:
+        return None
+    return value.hex()
+
+def decode_response(data: bytes) -> Tuple[int, int, int, List[Tuple[str, Any, Optional[str]]]]:
+    """(request id, error status, error index, [(oid, value, exception)]) of a Response PDU"""
+    tag, start, end = _read_tlv(data, 0)
+    if tag != _SEQUENCE:
+        raise SnmpError("Not an SNMP message")
+    _, _, pos = _read_tlv(data, start)             # version
+    _, _, pos = _read_tlv(data, pos)               # community
+    pdu_type, pos, pdu_end = _read_tlv(data, pos)
+    if pdu_type != RESPONSE:
+        raise SnmpError(f"Unexpected PDU type {pdu_type:#x}")
+
+    header = []
+    for _ in range(3):
+        _, value_start, value_end = _read_tlv(data, pos)
+        header.append(int.from_bytes(data[value_start:value_end], 'big', signed=True))
+        pos = value_end
+
+    _, pos, list_end = _read_tlv(data, pos)
+    varbinds = []
+    while pos < list_end:
+        _, vb_start, vb_end = _read_tlv(data, pos)
+        _, oid_start, oid_end = _read_tlv(data, vb_start)
+        value_tag, value_start, value_end = _read_tlv(data, oid_end)
+        oid = _decode_oid(data[oid_start:oid_end])
+        if value_tag in _EXCEPTIONS:
+            varbinds.append((oid, None, _EXCEPTIONS[value_tag]))
+        else:
+            varbinds.append((oid, _decode_value(value_tag, data[value_start:value_end]), None))
+        pos = vb_end
+    return header[0], header[1], header[2], varbinds
+
+# --- Engine -----------------------------------------------------------------
+
+class SnmpEngine(asyncio.DatagramProtocol):
+    """Single UDP endpoint that multiplexes all outstanding requests by request-id"""
+
+    def __init__(self, probes: Optional[ProbeController] = None):
+        self.probes = probes
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._pending: Dict[int, Tuple[Tuple[str, int], asyncio.Future]] = {}
+        self._ids = itertools.count(1)
+
+    async def open(self) -> 'SnmpEngine':
+        if self.transport is None:
+            loop = asyncio.get_running_loop()
+            await loop.create_datagram_endpoint(lambda: self, local_addr=('0.0.0.0', 0))
+        return self
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        try:
+            request_id, error_status, error_index, varbinds = decode_response(data)
+        except (SnmpError, IndexError, ValueError) as e:
+            logger.debug(f"Unparseable SNMP reply from {addr[0]}: {e}")
+            return
+        pending = self._pending.get(request_id)
+        # A reply must come from the agent the request went to
+        if pending and pending[0] == addr[:2] and not pending[1].done():
+            pending[1].set_result((error_status, error_index, varbinds))
+
+    def error_received(self, exc):
+        logger.debug(f"SNMP socket error: {exc}")
+
+    async def request(self, ip: str, port: int, community: str, pdu_type: int, oids: List[str],
+                      timeout: float, retries: int = 1, non_repeaters: int = 0,
+                      max_repetitions: int = 0) -> Optional[Tuple[int, int, List[Tuple[str, Any, Optional[str]]]]]:
+        """Send one PDU and wait for its response; None on timeout after all retries"""
+        request_id = next(self._ids) & 0x7FFFFFFF
+        message = encode_request(pdu_type, request_id, community, oids, non_repeaters, max_repetitions)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = ((ip, port), future)
+        try:
+            for attempt in range(retries + 1):
+                if self.probes:
+                    await self.probes.pace_async(ip)
+                self.transport.sendto(message, (ip, port))
+                try:
+                    reply = await asyncio.wait_for(asyncio.shield(future), timeout)
+                except asyncio.TimeoutError:
+                    continue
+                if self.probes:
+                    self.probes.report(ip, attempt + 1)
+                return reply
+            return None
+        finally:
+            self._pending.pop(request_id, None)
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+
+# --- Crawler ----------------------------------------------------------------
+
+class SnmpCrawler:
+    def __init__(self, db: Optional[SnmpSignatureDb] = None, probes: Optional[ProbeController] = None,
+                 concurrency: int = 1024, communities: Optional[List[str]] = None, retries: int = 1):
+        self.db = db or current_signatures().snmp
+        self.probes = probes or default_probe_controller
+        self.engine = SnmpEngine(self.probes)
+        self.concurrency = concurrency
+        self.communities = communities or self.db.communities
+        self.retries = retries
+
+    async def crawl_host(self, ip: str) -> Optional[Dict[str, Any]]:
+        """System and vendor OIDs of one agent; None when nothing answered"""
+        await self.engine.open()
+        timeout = self.probes.request_timeout(ip, service_time=0.5)
+
+        for community in self.communities:
+            reply = await self.engine.request(ip, self.db.port, community, GET_REQUEST, self.db.get_oids,
+                                              timeout, self.retries)
+            if reply is None:
+                continue
+            error_status, _, varbinds = reply
+            if error_status:
+                logger.debug(f"SNMP error status {error_status} from {ip}")
+                continue
+            record = self._parse_scalars(ip, community, varbinds)
+            if record['vendor'] and record.get('walk_root'):
+                record['walk'] = await self._walk(ip, community, record.pop('walk_root'), timeout)
+            else:
+                record.pop('walk_root', None)
+            return record
+        return None
+
+    def _parse_scalars(self, ip: str, community: str, varbinds: List[Tuple[str, Any, Optional[str]]]) -> Dict[str, Any]:
+        values = {self.db.fields[oid]: value for oid, value, exception in varbinds
+                  if exception is None and oid in self.db.fields}
+        vendor = self.db.match(values.get('sys_descr'), values.get('sys_object_id'))
+        return {
+            'ip_address': ip,
+            'community': community,
+            'sys_descr': values.pop('sys_descr', None),
+            'sys_object_id': values.pop('sys_object_id', None),
+            'sys_name': values.pop('sys_name', None),
+            'is_miner': vendor is not None,
+            'vendor': vendor['vendor'] if vendor else None,
+            'device_type': vendor['device_type'] if vendor else None,
+            'hash_rate': values.pop('hash_rate', None),
+            'values': values,
+            'walk_root': vendor.get('walk') if vendor else None,
+            'signature_version': self.db.version
+        }
+
+    async def _walk(self, ip: str, community: str, root: str, timeout: float) -> Dict[str, Any]:
+        """GETBULK through one subtree, max_repetitions rows per round trip"""
+        rows: Dict[str, Any] = {}
+        prefix = root + '.'
+        cursor = root
+        while len(rows) < self.db.max_walk_rows:
+            reply = await self.engine.request(ip, self.db.port, community, GET_BULK_REQUEST, [cursor], timeout,
+                                              self.retries, 0, self.db.max_repetitions)
+            if reply is None or reply[0]:
+                break
+            advanced = False
+            for oid, value, exception in reply[2]:
+                if exception or not oid.startswith(prefix):
+                    return rows
+                rows[oid] = value
+                advanced = advanced or oid != cursor
+                cursor = oid
+            if not advanced:
+                break
+        return rows
+
+    async def crawl_many(self, hosts: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        await self.engine.open()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(ip):
+            async with semaphore:
+                return ip, await self.crawl_host(ip)
+
+        return dict(await asyncio.gather(*(one(ip) for ip in hosts)))
+
+    def close(self):
+        self.engine.close()
+
+def snmp_crawl(hosts: Iterable[str], db: Optional[SnmpSignatureDb] = None, probes: Optional[ProbeController] = None,
+               concurrency: int = 1024, communities: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Blocking concurrent crawl; only hosts whose agent answered are returned"""
+    async def run():
+        crawler = SnmpCrawler(db, probes, concurrency, communities)
+        try:
+            return await crawler.crawl_many(hosts)
+        finally:
+            crawler.close()
+    results = asyncio.run(run())
+    answered = {ip: record for ip, record in results.items() if record}
+    logger.info(f"SNMP crawl done; {len(answered)} agents answered, "
+                f"{sum(r['is_miner'] for r in answered.values())} miners identified")
+    return answered
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Concurrent SNMP crawl for miner OIDs")
+    parser.add_argument('targets', nargs='+', help="IP addresses or CIDR ranges")
+    parser.add_argument('--community', action='append')
+    parser.add_argument('--concurrency', type=int, default=1024)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    hosts = [str(ip) for target in args.targets for ip in ipaddress.IPv4Network(target, strict=False).hosts()]
+    print(json.dumps(snmp_crawl(hosts, concurrency=args.concurrency, communities=args.community), indent=2))
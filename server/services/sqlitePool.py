@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pooled SQLite access layer
+
+One long-lived connection per thread in WAL mode, so repeated statements
+reuse sqlite3's per-connection statement cache instead of reconnecting
+and recompiling. Write-only rows such as audit logs go through a
+write-behind queue that is flushed in batches by a background thread.
+"""
+
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SqliteDatabase:
+    def __init__(self, db_path: str, cached_statements: int = 256, busy_timeout: float = 30.0):
+        self.db_path = db_path
+        self.cached_statements = cached_statements
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+        conn = self.connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                   cached_statements=self.cached_statements, check_same_thread=False)
+            # WAL makes a commit an append, so NORMAL sync is still crash-safe
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self.connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        with self.transaction() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def executemany(self, sql: str, rows: Iterable[Sequence[Any]]) -> int:
+        with self.transaction() as conn:
+            return conn.executemany(sql, rows).rowcount
+
+    def query_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[Tuple]:
+        return self.connection().execute(sql, params).fetchone()
+
+    def query_all(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        return self.connection().execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+class WriteBehindQueue:
+    """Batches INSERT rows off the request path; flushed by a daemon thread"""
+
+    def __init__(self, database: SqliteDatabase, sql: str, batch_size: int = 500, flush_interval: float = 1.0):
+        self.database = database
+        self.sql = sql
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='sqlite-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, row: Sequence[Any]):
+        if self._closed:
+            self.database.execute(self.sql, row)
+        else:
+            self._queue.put(row)
+
+    def _drain(self, first: Optional[Sequence[Any]] = None) -> List[Sequence[Any]]:
+        rows = [first] if first is not None else []
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _write(self, rows: List[Sequence[Any]]):
+        if not rows:
+            return
+        try:
+            self.database.executemany(self.sql, rows)
+        except sqlite3.Error as e:
+            logger.error(f"Write-behind flush of {len(rows)} rows failed: {e}")
+
+    def _run(self):
+        while not self._closed:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        rows = self._drain()
+        while rows:
+            self._write(rows)
+            rows = self._drain()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
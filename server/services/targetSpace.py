@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compiled scan target sets
+
+Compiles unions of CIDRs, address ranges and single addresses, minus
+exclusion lists, into sorted integer intervals, and walks them lazily in
+a full-cycle pseudo-random order: the multiplicative group modulo a
+prime just above the target count, as in ZMap. Memory is proportional to
+the number of intervals, never to the number of addresses. Shard i of n
+takes every n-th element of the cycle, so shards are disjoint and
+together cover the set exactly once, provided they share one seed. A
+sharded walk without an explicit seed uses one derived from the target
+set and shard count, so shards run by separate processes still agree.
+"""
+
+import bisect
+import hashlib
+import ipaddress
+import logging
+import random
+import socket
+import struct
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+Interval = Tuple[int, int]
+
+_pack = struct.Struct('>I').pack
+
+def int_to_ip(value: int) -> str:
+    return socket.inet_ntoa(_pack(value))
+
+def _parse(spec: str, hosts_only: bool) -> Interval:
+    """Inclusive integer interval for 'a.b.c.d', 'a.b.c.d/n', 'a.b.c.d-e.f.g.h' or 'a.b.c.d-h'"""
+    spec = spec.strip()
+    if '-' in spec:
+        first, last = (part.strip() for part in spec.split('-', 1))
+        start = int(ipaddress.IPv4Address(first))
+        if '.' not in last:
+            # Short form: last octet only
+            last = first.rsplit('.', 1)[0] + '.' + last
+        end = int(ipaddress.IPv4Address(last))
+        if end < start:
+            raise ValueError(f"Empty address range: {spec}")
+        return start, end
+    network = ipaddress.IPv4Network(spec, strict=False)
+    start, end = int(network.network_address), int(network.broadcast_address)
+    # Same addresses as network.hosts(): no network/broadcast address except in /31 and /32
+    if hosts_only and network.prefixlen < 31:
+        start, end = start + 1, end - 1
+    return start, end
+
+def _merge(intervals: Iterable[Interval]) -> List[Interval]:
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def _subtract(intervals: List[Interval], holes: List[Interval]) -> List[Interval]:
+    result = []
+    j = 0
+    for start, end in intervals:
+        while j < len(holes) and holes[j][1] < start:
+            j += 1
+        k = j
+        while k < len(holes) and holes[k][0] <= end:
+            if holes[k][0] > start:
+                result.append((start, holes[k][0] - 1))
+            start = max(start, holes[k][1] + 1)
+            k += 1
+        if start <= end:
+            result.append((start, end))
+    return result
+
+def _is_prime(n: int) -> bool:
+    """Deterministic Miller-Rabin for n < 3.3e24"""
+    if n < 2:
+        return False
+    small = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+    for p in small:
+        if n % p == 0:
+            return n == p
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    for a in small:
+        x = pow(a, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(r - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+def _prime_factors(n: int) -> List[int]:
+    factors = []
+    p = 2
+    while p * p <= n:
+        if n % p == 0:
+            factors.append(p)
+            while n % p == 0:
+                n //= p
+        p += 1 if p == 2 else 2
+    if n > 1:
+        factors.append(n)
+    return factors
+
+class CyclicPermutation:
+    """Full-cycle walk over indices 0..size-1 via powers of a generator of (Z/pZ)*"""
+
+    def __init__(self, size: int, seed: Optional[int] = None, shard: int = 0, shards: int = 1):
+        if not 0 <= shard < shards:
+            raise ValueError(f"Shard {shard} out of range for {shards} shards")
+        if seed is None and shards > 1:
+            # Shards with different seeds walk overlapping cosets instead of partitioning the set
+            raise ValueError("A sharded permutation needs a seed shared by all shards")
+        self.size = size
+        self.shard = shard
+        self.shards = shards
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(32)
+        rng = random.Random(self.seed)
+
+        self.prime = size + 1
+        while not _is_prime(self.prime):
+            self.prime += 1
+        order = self.prime - 1
+        factors = _prime_factors(order)
+        while True:
+            generator = rng.randrange(2, self.prime) if self.prime > 3 else self.prime - 1
+            if all(pow(generator, order // q, self.prime) != 1 for q in factors):
+                break
+        self.generator = generator
+        self.start = rng.randrange(1, self.prime) if self.prime > 2 else 1
+        # Cycle positions shard, shard + shards, ... belong to this shard
+        self.step = pow(generator, shards, self.prime)
+        self.steps = len(range(shard, order, shards))
+
+    def element(self, position: int) -> int:
+        """Group element at this shard's position (before filtering)"""
+        return self.start * pow(self.generator, self.shard + position * self.shards, self.prime) % self.prime
+
+    def iter_indices(self, position: int = 0) -> Iterator[Tuple[int, int]]:
+        """(position, index) pairs from position on; elements above size are skipped, so positions can jump"""
+        if position >= self.steps:
+            return
+        x = self.element(position)
+        size, prime, step = self.size, self.prime, self.step
+        for current in range(position, self.steps):
+            if x <= size:
+                yield current, x - 1
+            x = x * step % prime
+
+    def __iter__(self) -> Iterator[int]:
+        return (index for _, index in self.iter_indices())
+
+class TargetSpace:
+    """Set of IPv4 targets as sorted, disjoint integer intervals"""
+
+    def __init__(self, include: Union[str, Iterable[str]], exclude: Union[str, Iterable[str], None] = None,
+                 hosts_only: bool = True):
+        include = [include] if isinstance(include, str) else list(include)
+        exclude = [exclude] if isinstance(exclude, str) else list(exclude or [])
+        self.include = include
+        self.exclude = exclude
+        # Exclusions always cover whole blocks, network and broadcast addresses included
+        holes = _merge(_parse(s, False) for s in exclude)
+        self.intervals = _subtract(_merge(_parse(s, hosts_only) for s in include), holes)
+        self._offsets = []
+        total = 0
+        for start, end in self.intervals:
+            self._offsets.append(total)
+            total += end - start + 1
+        self._size = total
+
+    @classmethod
+    def parse(cls, targets: str, exclude: Union[str, Iterable[str], None] = None) -> 'TargetSpace':
+        """From a comma/whitespace separated target string"""
+        return cls(targets.replace(',', ' ').split(), exclude)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, address: str) -> bool:
+        value = int(ipaddress.IPv4Address(address))
+        i = bisect.bisect_right(self.intervals, (value, float('inf'))) - 1
+        return i >= 0 and self.intervals[i][0] <= value <= self.intervals[i][1]
+
+    def address_int(self, index: int) -> int:
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        i = bisect.bisect_right(self._offsets, index) - 1
+        return self.intervals[i][0] + index - self._offsets[i]
+
+    def __getitem__(self, index: int) -> str:
+        return int_to_ip(self.address_int(index))
+
+    def __iter__(self) -> Iterator[str]:
+        """Addresses in ascending order"""
+        for start, end in self.intervals:
+            for value in range(start, end + 1):
+                yield int_to_ip(value)
+
+    def sweep_seed(self, shards: int) -> int:
+        """Seed that every process splitting this set into shards derives alike"""
+        digest = hashlib.sha1(repr((self.intervals, shards)).encode()).digest()
+        return int.from_bytes(digest[:4], 'big')
+
+    def permutation(self, seed: Optional[int] = None, shard: int = 0, shards: int = 1) -> CyclicPermutation:
+        if seed is None and shards > 1:
+            seed = self.sweep_seed(shards)
+        return CyclicPermutation(self._size, seed, shard, shards)
+
+    def shuffled(self, seed: Optional[int] = None, shard: int = 0, shards: int = 1) -> Iterator[str]:
+        """This shard's addresses in pseudo-random order; the same seed gives the same order"""
+        offsets, starts = self._offsets, [start for start, _ in self.intervals]
+        if len(starts) == 1:
+            first = starts[0]
+            for index in self.permutation(seed, shard, shards):
+                yield int_to_ip(first + index)
+            return
+        for index in self.permutation(seed, shard, shards):
+            i = bisect.bisect_right(offsets, index) - 1
+            yield int_to_ip(starts[i] + index - offsets[i])
+
+    def describe(self) -> str:
+        return f"{len(self)} addresses in {len(self.intervals)} intervals"
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Print a target set in randomized order")
+    parser.add_argument('targets', nargs='+', help="CIDRs, ranges (a.b.c.d-e.f.g.h or a.b.c.d-h) or addresses")
+    parser.add_argument('--exclude', action='append', default=[])
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--shard', type=int, default=0)
+    parser.add_argument('--shards', type=int, default=1)
+    parser.add_argument('--ordered', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    space = TargetSpace(args.targets, args.exclude)
+    logger.info(space.describe())
+    addresses = iter(space) if args.ordered else space.shuffled(args.seed, args.shard, args.shards)
+    try:
+        for address in addresses:
+            sys.stdout.write(address + '\n')
+    except BrokenPipeError:
+        pass
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Continuous telemetry poller for confirmed miners
+
+Keeps a working set of confirmed miner API endpoints, polls hashrate,
+temperatures, fans and chain power on a jittered schedule, and appends
+samples to a compact SQLite time series that is downsampled as it ages.
+"""
+
+import asyncio
+import heapq
+import logging
+import random
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from minerApi import MinerApiClient, parse_miner_info
+
+logger = logging.getLogger(__name__)
+
+# Fallback efficiency (J/TH) when a miner reports no chain power
+DEFAULT_EFFICIENCY_J_PER_TH = 34.0
+
+class TelemetryStore:
+    def __init__(self, db_path: str = "miner_telemetry.db"):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Initialize SQLite tables for the working set, raw samples and rollups"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS telemetry_endpoints (
+                ip_address TEXT NOT NULL,
+                port INTEGER NOT NULL,
+                model TEXT,
+                added INTEGER NOT NULL,
+                PRIMARY KEY (ip_address, port)
+            )
+        ''')
+
+        # Integer epoch seconds and REAL columns keep rows small; WITHOUT ROWID
+        # stores them clustered by endpoint and time
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS telemetry_samples (
+                ip_address TEXT NOT NULL,
+                port INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                hashrate_ghs REAL,
+                temp_max REAL,
+                fan_avg REAL,
+                power_w REAL,
+                PRIMARY KEY (ip_address, port, ts)
+            ) WITHOUT ROWID
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS telemetry_rollups (
+                ip_address TEXT NOT NULL,
+                port INTEGER NOT NULL,
+                resolution INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                samples INTEGER NOT NULL,
+                hashrate_ghs REAL,
+                temp_max REAL,
+                fan_avg REAL,
+                power_w REAL,
+                PRIMARY KEY (ip_address, port, resolution, bucket)
+            ) WITHOUT ROWID
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def add_endpoints(self, endpoints: Iterable[Tuple[str, int, Optional[str]]]):
+        """Add confirmed miners to the polling working set"""
+        now = int(time.time())
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany('''
+            INSERT OR IGNORE INTO telemetry_endpoints (ip_address, port, model, added)
+            VALUES (?, ?, ?, ?)
+        ''', [(ip, port, model, now) for ip, port, model in endpoints])
+        conn.commit()
+        conn.close()
+
+    def remove_endpoint(self, ip: str, port: int):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('DELETE FROM telemetry_endpoints WHERE ip_address = ? AND port = ?', (ip, port))
+        conn.commit()
+        conn.close()
+
+    def endpoints(self) -> List[Tuple[str, int]]:
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('SELECT ip_address, port FROM telemetry_endpoints').fetchall()
+        conn.close()
+        return [(row[0], row[1]) for row in rows]
+
+    def append(self, samples: List[Tuple[str, int, int, Optional[float], Optional[float], Optional[float], Optional[float]]]):
+        """Append (ip, port, ts, hashrate_ghs, temp_max, fan_avg, power_w) rows"""
+        if not samples:
+            return
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany('INSERT OR REPLACE INTO telemetry_samples VALUES (?, ?, ?, ?, ?, ?, ?)', samples)
+        conn.commit()
+        conn.close()
+
+    def downsample(self, raw_retention: int = 86400, resolution: int = 300):
+        """Fold raw samples older than raw_retention seconds into resolution-second buckets"""
+        cutoff = int(time.time()) - raw_retention
+        cutoff -= cutoff % resolution
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            INSERT OR REPLACE INTO telemetry_rollups
+            SELECT ip_address, port, ?, ts - (ts % ?), COUNT(*),
+                   AVG(hashrate_ghs), MAX(temp_max), AVG(fan_avg), AVG(power_w)
+            FROM telemetry_samples
+            WHERE ts < ?
+            GROUP BY ip_address, port, ts - (ts % ?)
+        ''', (resolution, resolution, cutoff, resolution))
+        deleted = conn.execute('DELETE FROM telemetry_samples WHERE ts < ?', (cutoff,)).rowcount
+        conn.commit()
+        conn.close()
+
+        if deleted:
+            logger.info(f"Downsampled {deleted} telemetry samples into {resolution}s buckets")
+
+    def series(self, ip: str, port: int = 4028, since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Rollups followed by raw samples for one endpoint, oldest first"""
+        since = since or 0
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT bucket, hashrate_ghs, temp_max, fan_avg, power_w FROM telemetry_rollups
+            WHERE ip_address = ? AND port = ? AND bucket >= ?
+            UNION ALL
+            SELECT ts, hashrate_ghs, temp_max, fan_avg, power_w FROM telemetry_samples
+            WHERE ip_address = ? AND port = ? AND ts >= ?
+            ORDER BY 1
+        ''', (ip, port, since, ip, port, since)).fetchall()
+        conn.close()
+
+        return [
+            {'ts': row[0], 'hashrate_ghs': row[1], 'temp_max': row[2], 'fan_avg': row[3], 'power_w': row[4]}
+            for row in rows
+        ]
+
+    def power_estimate(self, ip: str, window: int = 3600) -> Optional[float]:
+        """Average measured power over the last window seconds, from any port of the host"""
+        since = int(time.time()) - window
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('''
+            SELECT AVG(power_w), AVG(hashrate_ghs) FROM telemetry_samples
+            WHERE ip_address = ? AND ts >= ?
+        ''', (ip, since)).fetchone()
+        conn.close()
+
+        if not row or (row[0] is None and row[1] is None):
+            return None
+        if row[0] is not None:
+            return round(row[0], 1)
+        return round(row[1] / 1000 * DEFAULT_EFFICIENCY_J_PER_TH, 1)
+
+def sample_from_info(ip: str, port: int, ts: int, info: Dict[str, Any]) -> Tuple:
+    temps = info['temperatures']
+    fans = info['fan_speeds']
+    power = info['chain_power_w']
+    if power is None and info['hash_rate_ghs'] is not None:
+        power = info['hash_rate_ghs'] / 1000 * DEFAULT_EFFICIENCY_J_PER_TH
+    return (
+        ip, port, ts,
+        info['hash_rate_ghs'],
+        max(temps) if temps else None,
+        sum(fans) / len(fans) if fans else None,
+        power
+    )
+
+class TelemetryPoller:
+    """Polls the working set at a fixed cadence with per-endpoint jitter"""
+
+    def __init__(self, store: TelemetryStore, interval: float = 60.0, jitter: float = 0.2,
+                 concurrency: int = 512, downsample_every: float = 3600.0):
+        self.store = store
+        self.interval = interval
+        self.jitter = jitter
+        self.client = MinerApiClient(concurrency=concurrency)
+        self.downsample_every = downsample_every
+        self._schedule: List[Tuple[float, str, int]] = []
+        self._known = set()
+        self._running = False
+
+    def _next_due(self, now: float) -> float:
+        return now + self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _refresh_working_set(self, now: float):
+        current = set(self.store.endpoints())
+        for ip, port in current - self._known:
+            # Spread new endpoints over one interval so they do not poll in lockstep
+            heapq.heappush(self._schedule, (now + random.uniform(0, self.interval), ip, port))
+        self._known = current
+
+    async def run(self, duration: Optional[float] = None):
+        """Poll until stop() is called or duration seconds have passed"""
+        self._running = True
+        started = time.monotonic()
+        last_refresh = last_downsample = 0.0
+
+        while self._running and (duration is None or time.monotonic() - started < duration):
+            now = time.monotonic()
+            if now - last_refresh >= self.interval:
+                self._refresh_working_set(now)
+                last_refresh = now
+            if now - last_downsample >= self.downsample_every:
+                self.store.downsample()
+                last_downsample = now
+
+            due = []
+            while self._schedule and self._schedule[0][0] <= now:
+                _, ip, port = heapq.heappop(self._schedule)
+                if (ip, port) in self._known:
+                    due.append((ip, port))
+
+            if due:
+                await self._poll(due)
+                for ip, port in due:
+                    heapq.heappush(self._schedule, (self._next_due(time.monotonic()), ip, port))
+
+            wait = self._schedule[0][0] - time.monotonic() if self._schedule else self.interval
+            await asyncio.sleep(min(max(wait, 0.05), 1.0))
+
+        self.client.close()
+
+    async def _poll(self, endpoints: List[Tuple[str, int]]):
+        replies = await self.client.poll_many(endpoints)
+        ts = int(time.time())
+        samples = [
+            sample_from_info(ip, port, ts, parse_miner_info(reply))
+            for (ip, port), reply in replies.items() if reply
+        ]
+        self.store.append(samples)
+        logger.info(f"Telemetry: {len(samples)}/{len(endpoints)} miners answered")
+
+    def stop(self):
+        self._running = False
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Continuous telemetry poller for confirmed miners")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run')
+    run_parser.add_argument('--interval', type=float, default=60.0)
+    run_parser.add_argument('--jitter', type=float, default=0.2)
+    run_parser.add_argument('--duration', type=float)
+    power_parser = sub.add_parser('power')
+    power_parser.add_argument('ip')
+    power_parser.add_argument('--window', type=int, default=3600)
+    parser.add_argument('--db', default='miner_telemetry.db')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = TelemetryStore(args.db)
+
+    if args.command == 'run':
+        poller = TelemetryPoller(store, args.interval, args.jitter)
+        try:
+            asyncio.run(poller.run(args.duration))
+        except KeyboardInterrupt:
+            poller.stop()
+    elif args.command == 'power':
+        print(json.dumps({'ip_address': args.ip, 'power_w': store.power_estimate(args.ip, args.window)}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP fingerprinting for miner web interfaces
+
+A small asyncio HTTP/1.1 client that keeps one connection per host alive
+between requests and never reads more than a fixed number of body bytes.
+Matching is done in order of cost: response headers, the page title and a
+single combined keyword regex over the capped body, and finally a favicon
+hash lookup when the page alone is inconclusive.
+"""
+
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from probeControl import ProbeController, controller as default_probe_controller
+from signatureDb import WebFingerprintDb, current_signatures
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_BYTES = 16384
+
+class HttpResponse:
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes, truncated: bool):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.truncated = truncated
+
+class PooledHttpClient:
+    """Minimal keep-alive HTTP/1.1 GET client with byte-capped reads"""
+
+    def __init__(self, probes: Optional[ProbeController] = None):
+        self.probes = probes or default_probe_controller
+        self._idle: Dict[Tuple[str, int], Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = {}
+
+    async def get(self, ip: str, port: int, path: str, max_bytes: int) -> Optional[HttpResponse]:
+        timeout = self.probes.request_timeout(ip, service_time=2.0)
+        key = (ip, port)
+
+        connection = self._idle.pop(key, None)
+        if connection:
+            try:
+                return await asyncio.wait_for(self._request(key, connection, ip, path, max_bytes), timeout)
+            except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                connection[1].close()
+
+        await self.probes.pace_async(ip)
+        try:
+            connection = await asyncio.wait_for(asyncio.open_connection(ip, port, limit=MAX_HEADER_BYTES), timeout)
+            return await asyncio.wait_for(self._request(key, connection, ip, path, max_bytes), timeout)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            return None
+
+    async def _request(self, key: Tuple[str, int], connection, host: str, path: str,
+                       max_bytes: int) -> HttpResponse:
+        reader, writer = connection
+        writer.write((f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: IlamMinerDetection/1.0\r\n"
+                      "Accept: */*\r\nConnection: keep-alive\r\n\r\n").encode())
+        await writer.drain()
+
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        body, complete = await self._read_body(reader, headers, max_bytes)
+        reusable = complete and headers.get('connection', '').lower() != 'close'
+        if reusable:
+            parked = self._idle.get(key)
+            if parked and parked is not connection:
+                parked[1].close()
+            self._idle[key] = connection
+        else:
+            writer.close()
+        return HttpResponse(status, headers, body, not complete)
+
+    async def _read_body(self, reader: asyncio.StreamReader, headers: Dict[str, str],
+                         max_bytes: int) -> Tuple[bytes, bool]:
+        """Read at most max_bytes; the flag says whether the whole body was consumed"""
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            parts = []
+            size = 0
+            while size < max_bytes:
+                chunk_size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+                if chunk_size == 0:
+                    await reader.readline()
+                    return b''.join(parts), True
+                if chunk_size > max_bytes - size:
+                    # The remote picks the chunk size; never buffer past the cap for it
+                    parts.append(await reader.readexactly(max_bytes - size))
+                    break
+                chunk = await reader.readexactly(chunk_size)
+                await reader.readline()
+                parts.append(chunk)
+                size += chunk_size
+            return b''.join(parts), False
+
+        if 'content-length' in headers:
+            length = int(headers['content-length'])
+            body = await reader.readexactly(min(length, max_bytes))
+            return body, length <= max_bytes
+
+        # Close-delimited body
+        body = await reader.read(max_bytes)
+        return body, False
+
+    def close(self):
+        for _, writer in self._idle.values():
+            writer.close()
+        self._idle.clear()
+
+class WebFingerprinter:
+    def __init__(self, db: Optional[WebFingerprintDb] = None, probes: Optional[ProbeController] = None,
+                 concurrency: int = 256):
+        self.db = db or current_signatures().web
+        self.client = PooledHttpClient(probes)
+        self.concurrency = concurrency
+
+    async def fingerprint(self, ip: str, port: int) -> Optional[Dict[str, Any]]:
+        """Classify one web endpoint; None when nothing answered or nothing matched"""
+        response = await self.client.get(ip, port, '/', self.db.max_body_bytes)
+        if response is None:
+            return None
+
+        result = {
+            'is_miner': False,
+            'device_type': 'Web-managed Miner',
+            'vendor': None,
+            'keywords_found': [],
+            'matched_by': None,
+            'signature_version': self.db.version
+        }
+
+        rule = self.db.match_headers(response.headers)
+        if rule:
+            result.update(is_miner=True, device_type=rule['device_type'], vendor=rule['vendor'], matched_by='header')
+            return result
+
+        title_rule, found = self.db.match_body(response.body.decode('utf-8', errors='ignore'))
+        result['keywords_found'] = found
+        if title_rule:
+            result.update(is_miner=True, device_type=title_rule['device_type'], vendor=title_rule['vendor'],
+                          matched_by='title')
+            return result
+        if len(found) >= self.db.min_keywords:
+            result.update(is_miner=True, matched_by='keywords')
+            return result
+
+        if self.db.favicons:
+            favicon = await self.client.get(ip, port, '/favicon.ico', self.db.max_favicon_bytes)
+            if favicon and favicon.status == 200 and favicon.body:
+                match = self.db.favicons.get(hashlib.sha256(favicon.body).hexdigest())
+                if match:
+                    result.update(is_miner=True, device_type=match['device_type'], vendor=match['vendor'],
+                                  matched_by='favicon')
+                    return result
+
+        return result if found else None
+
+    async def fingerprint_many(self, targets: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], Optional[Dict[str, Any]]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(target):
+            async with semaphore:
+                return target, await self.fingerprint(*target)
+
+        return dict(await asyncio.gather(*(one(target) for target in targets)))
+
+    def close(self):
+        self.client.close()
+
+def fingerprint_web(ip: str, port: int, db: Optional[WebFingerprintDb] = None,
+                    probes: Optional[ProbeController] = None) -> Optional[Dict[str, Any]]:
+    """Blocking single-endpoint fingerprint for synchronous callers"""
+    async def run():
+        fingerprinter = WebFingerprinter(db, probes)
+        try:
+            return await fingerprinter.fingerprint(ip, port)
+        finally:
+            fingerprinter.close()
+    return asyncio.run(run())
+
+def fingerprint_web_many(targets: Iterable[Tuple[str, int]], db: Optional[WebFingerprintDb] = None,
+                         concurrency: int = 256) -> Dict[Tuple[str, int], Optional[Dict[str, Any]]]:
+    """Blocking concurrent fingerprint of many endpoints"""
+    async def run():
+        fingerprinter = WebFingerprinter(db, concurrency=concurrency)
+        try:
+            return await fingerprinter.fingerprint_many(targets)
+        finally:
+            fingerprinter.close()
+    return asyncio.run(run())
@@ -31,11 +31,17 @@ import {
   type InsertNetworkTraffic
 } from "@shared/schema";
 import { db } from "./db";
-import { eq, desc, and, gte, lte } from "drizzle-orm";
+import { eq, desc, and, gte, lte, inArray, isNull, sql } from "drizzle-orm";
 import session from "express-session";
 import connectPg from "connect-pg-simple";
 import { pool } from "./db";
 
+// One confirmed device from a scan batch
+export interface ScanIngestItem {
+  miner: InsertMiner;
+  openPorts: number[];
+}
+
 export interface IStorage {
   // User methods  
   getUser(id: number): Promise<User | undefined>;
@@ -55,6 +61,9 @@ export interface IStorage {
   createConnection(connection: InsertConnection): Promise<NetworkConnection>;
   getConnectionsByMiner(minerId: number): Promise<NetworkConnection[]>;
 
+  // Bulk scan ingestion: upsert miners by IP and replace their scanned open ports
+  ingestScanResults(batch: ScanIngestItem[]): Promise<DetectedMiner[]>;
+
   // Scan sessions
   getScanSessions(): Promise<ScanSession[]>;
   createScanSession(session: InsertScanSession): Promise<ScanSession>;
@@ -73,10 +82,12 @@ export interface IStorage {
   // PLC Analysis
   getPlcAnalyses(): Promise<PlcAnalysis[]>;
   createPlcAnalysis(analysis: InsertPlcAnalysis): Promise<PlcAnalysis>;
+  createPlcAnalyses(analyses: InsertPlcAnalysis[]): Promise<PlcAnalysis[]>;
 
   // Acoustic Signatures
   getAcousticSignatures(): Promise<AcousticSignature[]>;
   createAcousticSignature(signature: InsertAcousticSignature): Promise<AcousticSignature>;
+  createAcousticSignatures(signatures: InsertAcousticSignature[]): Promise<AcousticSignature[]>;
 
   // Thermal Signatures
   getThermalSignatures(): Promise<ThermalSignature[]>;
@@ -200,6 +211,66 @@ export class DatabaseStorage implements IStorage {
     return [];
   }
 
+  async ingestScanResults(batch: ScanIngestItem[]): Promise<DetectedMiner[]> {
+    // Last occurrence wins; ON CONFLICT cannot touch the same row twice in one statement
+    const byIp = new Map(batch.map((item) => [item.miner.ipAddress, item]));
+    const items = Array.from(byIp.values());
+    if (items.length === 0) return [];
+
+    return await db.transaction(async (tx) => {
+      const miners = await tx
+        .insert(detectedMiners)
+        .values(items.map((item) => item.miner))
+        .onConflictDoUpdate({
+          target: detectedMiners.ipAddress,
+          set: {
+            macAddress: sql`excluded.mac_address`,
+            hostname: sql`excluded.hostname`,
+            latitude: sql`excluded.latitude`,
+            longitude: sql`excluded.longitude`,
+            city: sql`excluded.city`,
+            detectionMethod: sql`excluded.detection_method`,
+            powerConsumption: sql`excluded.power_consumption`,
+            hashRate: sql`excluded.hash_rate`,
+            deviceType: sql`excluded.device_type`,
+            processName: sql`excluded.process_name`,
+            confidenceScore: sql`excluded.confidence_score`,
+            threatLevel: sql`excluded.threat_level`,
+            notes: sql`excluded.notes`,
+            detectionTime: sql`now()`,
+            isActive: true
+          }
+        })
+        .returning();
+
+      const idByIp = new Map(miners.map((miner) => [miner.ipAddress, miner.id]));
+      const minerIds = miners.map((miner) => miner.id);
+
+      // Scan-derived port rows (no remote end) are replaced rather than appended on every rescan
+      await tx
+        .delete(networkConnections)
+        .where(and(inArray(networkConnections.minerId, minerIds), isNull(networkConnections.remoteAddress)));
+
+      const connections = items.flatMap((item) =>
+        item.openPorts.map((port) => ({
+          localAddress: item.miner.ipAddress,
+          localPort: port,
+          remoteAddress: null,
+          remotePort: null,
+          protocol: 'tcp',
+          status: 'open',
+          processName: null,
+          minerId: idByIp.get(item.miner.ipAddress) ?? null
+        }))
+      );
+      if (connections.length > 0) {
+        await tx.insert(networkConnections).values(connections);
+      }
+
+      return miners;
+    });
+  }
+
   async getScanSessions(): Promise<ScanSession[]> {
     return [];
   }
@@ -237,19 +308,33 @@ export class DatabaseStorage implements IStorage {
   }
 
   async getPlcAnalyses(): Promise<PlcAnalysis[]> {
-      return [];
+    return await db.select().from(plcAnalysis).orderBy(desc(plcAnalysis.timestamp));
   }
 
   async createPlcAnalysis(insertAnalysis: InsertPlcAnalysis): Promise<PlcAnalysis> {
-      return insertAnalysis as PlcAnalysis;
+    const [analysis] = await this.createPlcAnalyses([insertAnalysis]);
+    return analysis;
+  }
+
+  async createPlcAnalyses(analyses: InsertPlcAnalysis[]): Promise<PlcAnalysis[]> {
+    // One multi-row insert per capture; a long capture yields one summary per interval
+    if (analyses.length === 0) return [];
+    return await db.insert(plcAnalysis).values(analyses).returning();
   }
 
   async getAcousticSignatures(): Promise<AcousticSignature[]> {
-      return [];
+    return await db.select().from(acousticSignatures).orderBy(desc(acousticSignatures.recordingTime));
   }
 
   async createAcousticSignature(insertSignature: InsertAcousticSignature): Promise<AcousticSignature> {
-      return insertSignature as AcousticSignature;
+    const [signature] = await this.createAcousticSignatures([insertSignature]);
+    return signature;
+  }
+
+  async createAcousticSignatures(signatures: InsertAcousticSignature[]): Promise<AcousticSignature[]> {
+    // One multi-row insert per request; each recording segment is a row
+    if (signatures.length === 0) return [];
+    return await db.insert(acousticSignatures).values(signatures).returning();
   }
 
   async getThermalSignatures(): Promise<ThermalSignature[]> {
@@ -333,6 +418,9 @@ export class MemStorage implements IStorage {
     async getConnectionsByMiner(minerId: number): Promise<NetworkConnection[]> {
         return [];
     }
+    async ingestScanResults(batch: ScanIngestItem[]): Promise<DetectedMiner[]> {
+        return batch.map((item) => item.miner as DetectedMiner);
+    }
     async getScanSessions(): Promise<ScanSession[]> {
         return [];
     }
@@ -366,12 +454,18 @@ export class MemStorage implements IStorage {
     async createPlcAnalysis(analysis: InsertPlcAnalysis): Promise<PlcAnalysis> {
         return analysis as PlcAnalysis;
     }
+    async createPlcAnalyses(analyses: InsertPlcAnalysis[]): Promise<PlcAnalysis[]> {
+        return analyses as PlcAnalysis[];
+    }
     async getAcousticSignatures(): Promise<AcousticSignature[]> {
         return [];
     }
     async createAcousticSignature(signature: InsertAcousticSignature): Promise<AcousticSignature> {
         return signature as AcousticSignature;
     }
+    async createAcousticSignatures(signatures: InsertAcousticSignature[]): Promise<AcousticSignature[]> {
+        return signatures as AcousticSignature[];
+    }
     async getThermalSignatures(): Promise<ThermalSignature[]> {
         return [];
     }
@@ -94,7 +94,7 @@ export const networkTraffic = pgTable("network_traffic", {
 
 export const detectedMiners = pgTable("detected_miners", {
   id: serial("id").primaryKey(),
-  ipAddress: text("ip_address").notNull(),
+  ipAddress: text("ip_address").notNull().unique(),
   macAddress: text("mac_address"),
   hostname: text("hostname"),
   latitude: real("latitude"),